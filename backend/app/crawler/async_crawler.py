@@ -0,0 +1,308 @@
+"""Asynchronous crawler with per-host politeness scheduling
+
+Fetch workers share one aiohttp connection pool, bounded globally by
+``concurrency`` and per host by ``per_host_concurrency``. URLs come from a
+``Frontier`` that deduplicates in O(1) and releases a host's next URL only
+once ``host_delay`` seconds have passed since its previous request, so many
+hosts are crawled in parallel while each one sees a polite request rate.
+Fetched pages pass through a bounded queue to a parse stage that extracts
+links and hands documents to the store in batches; when parsing or database
+writes fall behind, the full queue stops the fetchers instead of buffering
+pages without limit.
+
+Pages crawled before are requested conditionally with the ETag and
+Last-Modified recorded last time. A 304 Not Modified answer is not parsed or
+stored; the crawl follows the page's stored links instead. A page that is
+downloaded again with the same content is only re-validated by the store.
+"""
+from collections import deque
+from heapq import heappop, heappush
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urldefrag, urlparse
+import asyncio
+import itertools
+import logging
+
+import aiohttp
+
+from app.config import settings
+from app.crawler.crawler import READ_CHUNK_BYTES, conditional_headers, extract_document, response_validators
+from app.database import SessionLocal
+from app.services.document_service import DocumentService
+
+logger = logging.getLogger(__name__)
+
+# Documents handed to the store callback at a time
+STORE_BATCH_SIZE = 50
+
+
+def store_documents(documents: List[Dict]) -> Dict:
+    """Default store: bulk-ingest a batch of crawled documents"""
+    db = SessionLocal()
+    try:
+        # Batches are small; tokenizing in-process beats starting a pool, and
+        # skips tokenizing pages whose content has not changed
+        return DocumentService(db).bulk_create_documents(documents, workers=1)
+    finally:
+        db.close()
+
+
+def load_crawl_state(url: str) -> Optional[Dict]:
+    """Default lookup: what the last crawl of ``url`` recorded, if anything"""
+    db = SessionLocal()
+    try:
+        return DocumentService(db).get_crawl_state(url)
+    finally:
+        db.close()
+
+
+class Frontier:
+    """URL frontier with O(1) dedup and per-host politeness
+
+    URLs are queued FIFO per host. Hosts with queued URLs sit in a heap keyed
+    by the earliest time they may be fetched again.
+    """
+
+    def __init__(self, host_delay: float = 0.0):
+        self.host_delay = host_delay
+        self._seen = set()
+        self._queues: Dict[str, Deque[str]] = {}
+        self._schedule: List[Tuple[float, int, str]] = []
+        self._next_fetch: Dict[str, float] = {}
+        self._order = itertools.count()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, url: str) -> bool:
+        """Queue a URL unless it was seen before, ignoring #fragments"""
+        url = urldefrag(url).url
+        if url in self._seen:
+            return False
+        self._seen.add(url)
+
+        host = urlparse(url).netloc
+        queue = self._queues.get(host)
+        if queue is None:
+            queue = self._queues[host] = deque()
+            heappush(self._schedule, (self._next_fetch.get(host, 0.0), next(self._order), host))
+        queue.append(url)
+        self._size += 1
+        return True
+
+    def pop(self, now: float) -> Tuple[Optional[str], Optional[float]]:
+        """Take the next URL whose host is due at ``now``
+
+        Returns (url, None), or (None, seconds until a host is due), or
+        (None, None) when the frontier is empty.
+        """
+        if not self._schedule:
+            return None, None
+        due, _, host = self._schedule[0]
+        if due > now:
+            return None, due - now
+
+        heappop(self._schedule)
+        queue = self._queues[host]
+        url = queue.popleft()
+        self._size -= 1
+        self._next_fetch[host] = now + self.host_delay
+        if queue:
+            heappush(self._schedule, (now + self.host_delay, next(self._order), host))
+        else:
+            del self._queues[host]
+        return url, None
+
+
+class AsyncCrawler:
+    """Concurrent crawler storing pages through ``store``
+
+    ``store`` is called from a worker thread with lists of {"url", "title",
+    "content", "etag", "last_modified", "links"} documents and may return
+    ``bulk_create_documents`` totals, whose "unchanged" and "near_duplicates"
+    counts are added to ``self.unchanged`` and ``self.near_duplicates`` and
+    the remaining documents to ``self.stored``; without totals the whole
+    batch counts as stored. Documents of a batch whose store raised are
+    counted in ``self.store_failed`` instead. ``lookup`` returns a URL's
+    ``get_crawl_state`` for conditional requests, or None.
+    """
+
+    def __init__(self, seed_urls: Iterable[str], max_pages: int = 50,
+                 concurrency: Optional[int] = None, per_host_concurrency: Optional[int] = None,
+                 host_delay: Optional[float] = None, queue_size: Optional[int] = None,
+                 timeout: Optional[float] = None, max_page_bytes: Optional[int] = None,
+                 store: Callable[[List[Dict]], Optional[Dict]] = store_documents,
+                 lookup: Callable[[str], Optional[Dict]] = load_crawl_state):
+        self.max_pages = max_pages
+        self.concurrency = concurrency or settings.crawler_concurrency
+        self.per_host_concurrency = per_host_concurrency or settings.crawler_per_host_concurrency
+        self.queue_size = queue_size or settings.crawler_queue_size
+        self.timeout = timeout or settings.crawler_timeout
+        self.max_page_bytes = max_page_bytes or settings.crawler_max_page_bytes
+        self.store = store
+        self.lookup = lookup
+        self.frontier = Frontier(settings.crawler_delay if host_delay is None else host_delay)
+        for url in seed_urls:
+            self.frontier.add(url)
+
+        self.visited = set()
+        self.failed = 0
+        # Pages answered 304 Not Modified, re-downloaded with unchanged
+        # content, and collapsed onto a near-duplicate instead of indexed
+        self.not_modified = 0
+        self.unchanged = 0
+        self.near_duplicates = 0
+        # New or changed pages written to the index, and pages whose write failed
+        self.stored = 0
+        self.store_failed = 0
+        # Pages taken from the frontier that are being fetched or parsed
+        self._outstanding = 0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def run(self) -> int:
+        """Crawl from synchronous code; returns the number of pages crawled"""
+        return asyncio.run(self.crawl())
+
+    async def crawl(self) -> int:
+        """Crawl until max_pages pages are stored or no URLs are left"""
+        self._wakeup = asyncio.Event()
+        pages = asyncio.Queue(maxsize=self.queue_size)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            parser = asyncio.create_task(self._parse_pages(pages))
+            fetchers = [
+                asyncio.create_task(self._fetch_pages(session, pages))
+                for _ in range(self.concurrency)
+            ]
+            try:
+                await asyncio.gather(*fetchers)
+                await pages.put(None)
+                await parser
+            finally:
+                for task in (*fetchers, parser):
+                    task.cancel()
+
+        logger.info(f"Crawled {len(self.visited)} pages ({self.not_modified} not modified, "
+                    f"{self.unchanged} unchanged, {self.near_duplicates} near-duplicates, "
+                    f"{self.stored} stored, {self.store_failed} not stored), {self.failed} failed")
+        return len(self.visited)
+
+    def _page_done(self):
+        self._outstanding -= 1
+        self._wakeup.set()
+
+    async def _next_url(self) -> Optional[str]:
+        """Wait for a URL whose host is due; None once the crawl is finished"""
+        loop = asyncio.get_running_loop()
+        while len(self.visited) + self._outstanding < self.max_pages:
+            url, wait = self.frontier.pop(loop.time())
+            if url is not None:
+                self._outstanding += 1
+                return url
+            if wait is None and self._outstanding == 0:
+                # Nothing queued and no page in flight that could add links
+                return None
+
+            # Sleep until a host is due, new links arrive or a page finishes
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        return None
+
+    async def _fetch_pages(self, session: aiohttp.ClientSession, pages: asyncio.Queue):
+        while True:
+            url = await self._next_url()
+            if url is None:
+                return
+            try:
+                crawl_state = await asyncio.to_thread(self.lookup, url)
+            except Exception as e:
+                # Fetch unconditionally rather than lose the page
+                logger.warning(f"Failed to look up the last crawl of {url}: {e}")
+                crawl_state = None
+            try:
+                async with session.get(url, headers=conditional_headers(crawl_state)) as response:
+                    if response.status == 304 and crawl_state:
+                        body = None
+                    else:
+                        content_type = response.headers.get("Content-Type", "")
+                        validators = response_validators(response.headers)
+                        body = await self._read_body(response)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"Failed to crawl {url}: {e}")
+                self.failed += 1
+                self._page_done()
+                continue
+
+            if body is None:
+                # Not modified: nothing to parse or store
+                for link in crawl_state["links"]:
+                    self.frontier.add(link)
+                self.visited.add(url)
+                self.not_modified += 1
+                self._page_done()
+                continue
+            # Blocks while the parse stage is behind
+            await pages.put((url, content_type, body, validators))
+
+    async def _read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        """Read a response body, dropping what follows max_page_bytes"""
+        chunks, size = [], 0
+        async for chunk in response.content.iter_chunked(READ_CHUNK_BYTES):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_page_bytes:
+                logger.info(f"Truncated {response.url} at {self.max_page_bytes} bytes")
+                break
+        return b"".join(chunks)[:self.max_page_bytes]
+
+    async def _parse_pages(self, pages: asyncio.Queue):
+        batch = []
+        while True:
+            item = await pages.get()
+            if item is None:
+                break
+            url, content_type, body, (etag, last_modified) = item
+            try:
+                title, text, links = await asyncio.to_thread(extract_document, url, content_type, body)
+            except Exception as e:
+                logger.warning(f"Failed to parse {url}: {e}")
+                self.failed += 1
+                self._page_done()
+                continue
+
+            for link in links:
+                self.frontier.add(link)
+            self.visited.add(url)
+            batch.append({"url": url, "title": title, "content": text,
+                          "etag": etag, "last_modified": last_modified, "links": links})
+            self._page_done()
+
+            if len(batch) >= STORE_BATCH_SIZE:
+                await self._store(batch)
+                batch = []
+
+        if batch:
+            await self._store(batch)
+
+    async def _store(self, documents: List[Dict]):
+        try:
+            totals = await asyncio.to_thread(self.store, documents)
+        except Exception as e:
+            logger.error(f"Failed to store {len(documents)} crawled documents: {e}")
+            self.store_failed += len(documents)
+            return
+        if not totals:
+            self.stored += len(documents)
+            return
+        unchanged = totals.get("unchanged", 0)
+        near_duplicates = totals.get("near_duplicates", 0)
+        self.unchanged += unchanged
+        self.near_duplicates += near_duplicates
+        # Repeated URLs in a batch are stored once
+        self.stored += totals.get("documents", len(documents)) - unchanged - near_duplicates
@@ -1,14 +1,20 @@
 import os
 import json
 import time
+import logging
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 from app.config import settings
-from app.services.document_service import DocumentService
+from app.services.document_service import DocumentService, content_fingerprint
 from app.database import SessionLocal
+from app.utilts.html_cleaner import decode_body, extract_html
 from app.utilts.tokenizer import tokenize_text
 
+# Bytes read from a streamed response body at a time
+READ_CHUNK_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
 def get_website_name(url: str) -> str | None:
     try:
         # Ensure the URL has a scheme so urlparse works correctly
@@ -21,15 +27,96 @@ def get_website_name(url: str) -> str | None:
         # Strip "www." if present
         return hostname.removeprefix('www.')
     except Exception as e:
-        print(f"Invalid URL: {url} — {e}")
+        logger.warning(f"Invalid URL: {url} — {e}")
         return None
 
+def extract_document(url: str, content_type: str, body):
+    """Return (title, text, same-site links) for a fetched response body
+    
+    ``body`` is the decoded text, or the raw bytes to decode with the
+    charset of ``content_type``.
+    """
+    title = "No Title"
+    text = ""
+    links = []
+    if isinstance(body, bytes):
+        body = decode_body(body, content_type)
+    
+    if "text/html" in content_type:
+        # Main text and links of the page in one parse
+        page = extract_html(body, url)
+        title, text = page.title, page.text
+        links = filter_links(page.links, url)
+    elif "application/json" in content_type:
+        # Parse JSON content
+        try:
+            json_data = json.loads(body)
+            title = f"JSON Response from {get_website_name(url)}"
+            text = json.dumps(json_data, indent=2)
+        except json.JSONDecodeError:
+            title = f"Invalid JSON from {get_website_name(url)}"
+            text = body
+    else:
+        # Handle other content types as plain text
+        title = f"Content from {get_website_name(url)}"
+        text = body
+    
+    return title, text, links
+
+def read_body(response, max_bytes=None):
+    """Read a streamed requests response, dropping what follows max_bytes"""
+    max_bytes = max_bytes or settings.crawler_max_page_bytes
+    chunks, size = [], 0
+    for chunk in response.iter_content(READ_CHUNK_BYTES):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            logger.info(f"Truncated {response.url} at {max_bytes} bytes")
+            break
+    return b"".join(chunks)[:max_bytes]
+
+def conditional_headers(crawl_state):
+    """Request headers revalidating the copy recorded by the last crawl"""
+    headers = {}
+    if crawl_state:
+        if crawl_state.get("etag"):
+            headers["If-None-Match"] = crawl_state["etag"]
+        if crawl_state.get("last_modified"):
+            headers["If-Modified-Since"] = crawl_state["last_modified"]
+    return headers
+
+def response_validators(headers):
+    """Return (etag, last_modified) of a response, dropping values too long to store"""
+    etag = headers.get("ETag")
+    last_modified = headers.get("Last-Modified")
+    return (etag if etag and len(etag) <= 255 else None,
+            last_modified if last_modified and len(last_modified) <= 64 else None)
+
+def filter_links(links, base_url):
+    """Keep unique http(s) links on the same host as base_url"""
+    base_domain = urlparse(base_url).netloc
+    filtered = []
+    for link in links:
+        parsed = urlparse(link)
+        if parsed.scheme in ["http", "https"] and parsed.netloc == base_domain:
+            filtered.append(link)
+    # Sorted so a page with the same links always stores the same list
+    return sorted(set(filtered))
+
 class SimpleCrawler:
     def __init__(self, seed_urls, max_pages=50, delay=1):
         self.visited = set()
         self.to_visit = list(seed_urls)
         self.max_pages = max_pages
         self.delay = delay
+        # Pages answered 304 Not Modified, re-downloaded with unchanged
+        # content, and collapsed onto a near-duplicate instead of indexed
+        self.not_modified = 0
+        self.unchanged = 0
+        self.near_duplicates = 0
+        # New or changed pages written to the index, and pages whose write failed
+        self.stored = 0
+        self.store_failed = 0
         self.db = SessionLocal()
         self.document_service = DocumentService(self.db)
 
@@ -41,37 +128,39 @@ class SimpleCrawler:
                 continue
 
             try:
-                print(f"Crawling: {url}")
-                response = requests.get(url, timeout=5)
-                content_type = response.headers.get("Content-Type", "")
-                
-                title = "No Title"
-                text = ""
-                links = []
-                
-                if "text/html" in content_type:
-                    # Parse HTML content
-                    soup = BeautifulSoup(response.text, "html.parser")
-                    title = soup.title.string if soup.title else "No Title"
-                    text = soup.get_text(separator=" ", strip=True)
-                    links = [urljoin(url, a.get("href")) for a in soup.find_all("a", href=True)]
-                    links = self._filter_links(links, url)
-                elif "application/json" in content_type:
-                    # Parse JSON content
-                    try:
-                        json_data = response.json()
-                        title = f"JSON Response from {get_website_name(url)}"
-                        text = json.dumps(json_data, indent=2)
-                    except json.JSONDecodeError:
-                        title = f"Invalid JSON from {get_website_name(url)}"
-                        text = response.text
+                logger.info(f"Crawling: {url}")
+                crawl_state = self._crawl_state(url)
+                with requests.get(url, timeout=5, headers=conditional_headers(crawl_state),
+                                  stream=True) as response:
+                    not_modified = response.status_code == 304 and crawl_state
+                    if not not_modified:
+                        body = read_body(response)
+                if not_modified:
+                    # Nothing downloaded, parsed or written; follow the stored links
+                    links = crawl_state["links"]
+                    self.not_modified += 1
                 else:
-                    # Handle other content types as plain text
-                    title = f"Content from {get_website_name(url)}"
-                    text = response.text
+                    content_type = response.headers.get("Content-Type", "")
+                    title, text, links = extract_document(url, content_type, body)
+                    unchanged = crawl_state and crawl_state["content_hash"] == content_fingerprint(title, text)
 
-                # Save document to database
-                self._save_doc_to_db(url, title, text)
+                    # Save document to database; unchanged content only
+                    # updates the validators
+                    etag, last_modified = response_validators(response.headers)
+                    try:
+                        document = self._save_doc_to_db(url, title, text, etag, last_modified, links)
+                    except Exception as e:
+                        # Still followed; the page is stored on a later crawl
+                        logger.warning(f"Failed to save document to database: {e}")
+                        self.store_failed += 1
+                    else:
+                        if unchanged:
+                            self.unchanged += 1
+                        elif document is not None and document.url != url:
+                            # Stored as a near-duplicate of this document
+                            self.near_duplicates += 1
+                        else:
+                            self.stored += 1
                 
                 self.to_visit.extend(links)
                 self.visited.add(url)
@@ -79,26 +168,21 @@ class SimpleCrawler:
                 time.sleep(self.delay)
 
             except Exception as e:
-                print(f"Failed to crawl {url}: {e}")
+                logger.warning(f"Failed to crawl {url}: {e}")
         
         # Close database session
         self.db.close()
 
-    def _save_doc_to_db(self, url, title, text):
-        try:
-            # Create document using the correct method signature
-            document = self.document_service.create_document(url, title, text)
-            print(f"Saved document to database: {title}")
-            
-        except Exception as e:
-            print(f"Failed to save document to database: {e}")
+    def _crawl_state(self, url):
+        return self.document_service.get_crawl_state(url)
 
-    def _filter_links(self, links, base_url):
-        base_domain = urlparse(base_url).netloc
-        filtered = []
-        for link in links:
-            parsed = urlparse(link)
-            if parsed.scheme in ["http", "https"] and parsed.netloc == base_domain:
-                filtered.append(link)
-        return list(set(filtered))
+    def _save_doc_to_db(self, url, title, text, etag=None, last_modified=None, links=None):
+        # Create document using the correct method signature
+        document = self.document_service.create_document(
+            url, title, text, etag=etag, last_modified=last_modified, links=links
+        )
+        logger.info(f"Saved document to database: {title}")
+        return document
 
+    def _filter_links(self, links, base_url):
+        return filter_links(links, base_url)
@@ -1,28 +1,82 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, Index, text
+from sqlalchemy import create_engine, event, select, BigInteger, Column, Integer, SmallInteger, String, Text, DateTime, Float, Index, LargeBinary, Sequence, UniqueConstraint, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import func
 from app.config import settings
+from typing import Dict, List, Optional
 import logging
 
 # Configure logging
 logging.basicConfig(level=getattr(logging, settings.log_level))
 logger = logging.getLogger(__name__)
 
+# Async drivers used for the request path, by database backend
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def pool_options(url: str) -> Dict:
+    """Connection pool sizing from settings; SQLite keeps its own pool classes"""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True,
+    }
+
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a database URL for its asyncio counterpart"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
 # Database setup
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+engine = create_engine(settings.database_url, **pool_options(settings.database_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Created on first use so processes that never serve requests (Celery
+# workers, scripts) do not need the async driver installed
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
 Base = declarative_base()
 
+ORDINAL_SEQUENCE = Sequence("documents_ordinal_seq")
+
 
 class Document(Base):
     __tablename__ = "documents"
     
     id = Column(String(255), primary_key=True)
+    # Dense integer id used in postings lists instead of the md5 hex id; a
+    # new one is assigned whenever the document is re-indexed, so published
+    # segments never need a document changed in place (see app.index.segment)
+    ordinal = Column(Integer, ORDINAL_SEQUENCE, nullable=False, unique=True)
     url = Column(String(2048), nullable=False)
     title = Column(String(500), nullable=True)
-    content = Column(Text, nullable=True)
-    html_content = Column(Text, nullable=True)
+    length = Column(Integer, default=0)  # Token count, used for BM25 length normalization
+    # Token counts of the title and URL path fields, see app.index.fields
+    title_length = Column(Integer, default=0)
+    url_length = Column(Integer, default=0)
+    snippet = Column(String(255), nullable=True)  # Result snippet, precomputed at ingestion
+    # Fingerprint of the stored title and content; an update with the same
+    # fingerprint skips tokenization and index work
+    content_hash = Column(String(64), nullable=True)
+    # HTTP validators of the last crawl, sent back as a conditional request
+    etag = Column(String(255), nullable=True)
+    last_modified = Column(String(64), nullable=True)
+    # Same-site links on the page as a JSON list, followed when a re-crawl
+    # gets 304 Not Modified and there is no body to extract them from
+    links = Column(Text, nullable=True)
+    # SimHash of the tokens as a signed 64-bit integer, see app.index.simhash
+    simhash = Column(BigInteger, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -33,20 +87,58 @@ class Document(Base):
     )
 
 
-class Token(Base):
-    __tablename__ = "tokens"
+def allocate_ordinals(connection, count: int = 1) -> int:
+    """First of ``count`` new consecutive document ordinals, on databases without sequences
+
+    Ordinals already handed out in the connection's transaction but not yet
+    inserted are skipped, so documents flushed together get distinct ones.
+    """
+    transaction = connection.get_transaction()
+    pending_in, pending = connection.info.get("allocated_ordinals", (None, 0))
+    first = connection.execute(select(func.max(Document.ordinal))).scalar() or 0
+    if pending_in is transaction:
+        first = max(first, pending)
+    first += 1
+    connection.info["allocated_ordinals"] = (transaction, first + count - 1)
+    return first
+
+
+def next_ordinals(connection, count: int) -> List[int]:
+    """``count`` new document ordinals, from documents_ordinal_seq where sequences exist"""
+    if not count:
+        return []
+    if not connection.dialect.supports_sequences:
+        first = allocate_ordinals(connection, count)
+        return list(range(first, first + count))
+    return list(connection.scalars(
+        select(ORDINAL_SEQUENCE.next_value()).select_from(func.generate_series(1, count))
+    ))
+
+
+@event.listens_for(Document, "before_insert")
+def _assign_ordinal(mapper, connection, target):
+    # documents_ordinal_seq assigns them where sequences exist
+    if target.ordinal is None and not connection.dialect.supports_sequences:
+        target.ordinal = allocate_ordinals(connection)
+
+
+# A term of a document's body: one row per (document, term) with the
+# term's frequency and its occurrences packed (app.index.postings)
+class DocumentTerm(Base):
+    __tablename__ = "document_terms"
     
-    id = Column(Integer, primary_key=True)
-    document_id = Column(String(255), nullable=False)
-    token = Column(String(255), nullable=False)
-    position = Column(Integer, nullable=False)
-    frequency = Column(Integer, default=1)
+    document_ordinal = Column(Integer, primary_key=True)  # Document.ordinal
+    term = Column(String(255), primary_key=True)
+    frequency = Column(Integer, nullable=False)
+    # Token positions, see encode_positions
+    positions = Column(LargeBinary, nullable=False)
+    # Character spans in the document's text, see encode_spans; used for snippets
+    spans = Column(LargeBinary, nullable=True)
+    # The term's most frequent unstemmed form in the document, lowercased
+    surface = Column(String(255), nullable=True)
     
-    # Indexes for faster searches
     __table_args__ = (
-        Index('idx_tokens_document_id', 'document_id'),
-        Index('idx_tokens_token', 'token'),
-        Index('idx_tokens_document_token', 'document_id', 'token'),
+        Index('idx_document_terms_term', 'term'),
     )
 
 
@@ -54,14 +146,76 @@ class SearchIndex(Base):
     __tablename__ = "search_indices"
     
     id = Column(Integer, primary_key=True)
-    term = Column(String(255), nullable=False, unique=True)
+    # Document field the postings are for: body, title or url (app.index.fields)
+    field = Column(String(16), nullable=False, default="body", server_default="body")
+    term = Column(String(255), nullable=False)
     document_frequency = Column(Integer, default=0)
-    tfidf_data = Column(Text, nullable=True)  # JSON string of doc_id -> tfidf_score
-    inverted_index_data = Column(Text, nullable=True)  # JSON string of doc_ids list
+    max_term_frequency = Column(Integer, default=0)  # Upper bound for top-k pruning
+    postings = Column(LargeBinary, nullable=True)  # Encoded doc ordinals and term frequencies, see app.index.postings
+    # Body terms: the term's most frequent unstemmed form, shown as a suggestion
+    surface = Column(String(255), nullable=True)
     
     # Index for faster searches
     __table_args__ = (
         Index('idx_search_indices_term', 'term'),
+        UniqueConstraint('field', 'term', name='uq_search_indices_field_term'),
+    )
+
+
+# Document count and total token count of each field, for BM25's average
+# field length. Recounted by index builds and adjusted as documents are
+# stored and removed, so searches never scan the documents table for them
+class CorpusStats(Base):
+    __tablename__ = "corpus_stats"
+    
+    field = Column(String(16), primary_key=True)
+    document_count = Column(BigInteger, nullable=False, default=0)
+    total_length = Column(BigInteger, nullable=False, default=0)
+
+
+# Extracted text and raw HTML of a document, compressed with the recorded
+# codec (app.utilts.compression). Kept out of the documents table so that
+# scanning and hydrating documents only moves their metadata
+class DocumentBody(Base):
+    __tablename__ = "document_bodies"
+    
+    document_id = Column(String(255), primary_key=True)
+    codec = Column(String(16), nullable=False)
+    content = Column(LargeBinary, nullable=True)
+    html_content = Column(LargeBinary, nullable=True)
+
+
+# LSH banding index over Document.simhash for near-duplicate lookups
+class SimhashBand(Base):
+    __tablename__ = "simhash_bands"
+    
+    band = Column(SmallInteger, primary_key=True)
+    value = Column(Integer, primary_key=True)
+    document_id = Column(String(255), primary_key=True)
+    
+    __table_args__ = (
+        Index('idx_simhash_bands_document_id', 'document_id'),
+    )
+
+
+# A page collapsed onto the indexed document it nearly duplicates. Only what
+# re-crawling it needs is kept; its tokens are neither stored nor indexed
+class NearDuplicate(Base):
+    __tablename__ = "near_duplicates"
+    
+    id = Column(String(255), primary_key=True)  # md5 of the URL, like Document.id
+    url = Column(String(2048), nullable=False)
+    canonical_id = Column(String(255), nullable=False)  # Document.id
+    distance = Column(Integer, nullable=False)  # SimHash bits differing from the canonical document
+    length = Column(Integer, default=0)  # Tokens not stored or indexed
+    content_hash = Column(String(64), nullable=True)
+    etag = Column(String(255), nullable=True)
+    last_modified = Column(String(64), nullable=True)
+    links = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index('idx_near_duplicates_canonical_id', 'canonical_id'),
     )
 
 
@@ -85,6 +239,37 @@ def get_db():
         db.close()
 
 
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        url = settings.async_database_url or async_database_url(settings.database_url)
+        _async_engine = create_async_engine(url, **pool_options(url))
+    return _async_engine
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory
+
+
+async def get_async_db():
+    """Dependency to get an async database session, closed after the request"""
+    async with get_async_session_factory()() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """Close the async engine's pooled connections"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine, _async_session_factory = None, None
+
+
 def init_db():
     """Initialize database tables"""
     try:
@@ -0,0 +1 @@
+# Index storage formats package
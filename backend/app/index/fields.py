@@ -0,0 +1,75 @@
+"""Indexed document fields
+
+Every document is indexed as three fields: ``body`` (the page text, whose
+term frequencies and positions live in the document_terms table),
+``title`` and ``url`` (the tokens of the URL path). Each field has its own postings in search_indices
+and its own length for BM25, so a query can be restricted to one field and
+an unrestricted term is scored per field and summed with the configured
+field boosts (settings.field_boosts).
+
+The title and URL are short, so their tokens are not stored: they are
+re-tokenized from the document when the index is built and when a field
+phrase needs positions.
+"""
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlsplit
+import re
+
+from app.utilts.tokenizer import tokenize_text
+
+BODY = "body"
+TITLE = "title"
+URL = "url"
+FIELDS = (BODY, TITLE, URL)
+# Fields re-tokenized from the document rather than read from the tokens table
+SHORT_FIELDS = (TITLE, URL)
+
+# The tokenizer drops punctuation inside words, which would glue
+# "/search-engine/index.html" into one token, so split the path first
+_URL_SEPARATORS = re.compile(r"[\W_]+")
+# Page extensions say nothing about the page
+_PAGE_EXTENSION = re.compile(r"\.(?:s?html?|php\d?|aspx?|jsp)$", re.IGNORECASE)
+
+
+def url_path_text(url: Optional[str]) -> str:
+    """Words of a URL's path: "/blog/search-engine.html" -> "blog search engine" """
+    if not url:
+        return ""
+    path = _PAGE_EXTENSION.sub("", unquote(urlsplit(url).path))
+    return _URL_SEPARATORS.sub(" ", path).strip()
+
+
+def field_text(field: str, title: Optional[str], url: Optional[str]) -> str:
+    """Text of a short field"""
+    if field == TITLE:
+        return title or ""
+    if field == URL:
+        return url_path_text(url)
+    raise ValueError(f"Not a short field: {field}")
+
+
+def field_tokens(field: str, title: Optional[str], url: Optional[str]) -> List[str]:
+    """Tokens of a short field, in position order"""
+    return tokenize_text(field_text(field, title, url))
+
+
+def short_field_tokens(title: Optional[str], url: Optional[str]) -> Dict[str, List[str]]:
+    """Tokens of each short field, in position order"""
+    return {field: field_tokens(field, title, url) for field in SHORT_FIELDS}
+
+
+def term_frequencies(tokens: List[str]) -> Dict[str, int]:
+    term_freqs = {}
+    for token in tokens:
+        term_freqs[token] = term_freqs.get(token, 0) + 1
+    return term_freqs
+
+
+def field_key(field: str, term: str) -> str:
+    """Segment term dictionary key of a field's term
+
+    Body terms are stored as themselves. Other fields' terms are prefixed
+    with a NUL byte and the field name, which no query prefix contains, so
+    prefix suggestions only ever see body terms.
+    """
+    return term if field == BODY else f"\0{field}\0{term}"
@@ -0,0 +1,63 @@
+"""Index generation counter shared by the processes using an index directory
+
+Every change to what searches can return (a rebuild, a published segment,
+committed document updates) bumps the counter in ``GENERATION`` under the
+index directory. Caches tag entries with the generation they were computed
+at, so API workers, Celery workers and scripts sharing the directory never
+serve results from before a change.
+"""
+from typing import Dict, Tuple
+import fcntl
+import os
+import threading
+import uuid
+
+GENERATION_FILE = "GENERATION"
+_LOCK_FILE = ".GENERATION.lock"
+
+# index_dir -> ((inode, mtime_ns), generation)
+_cached: Dict[str, Tuple[Tuple[int, int], int]] = {}
+_cached_lock = threading.Lock()
+
+
+def _read_generation(index_dir: str) -> int:
+    try:
+        with open(os.path.join(index_dir, GENERATION_FILE)) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def current_generation(index_dir: str) -> int:
+    """Return the current generation, 0 if it was never bumped
+
+    Like the CURRENT segment pointer, the check is one ``stat`` unless the
+    file was replaced since the last call.
+    """
+    try:
+        st = os.stat(os.path.join(index_dir, GENERATION_FILE))
+    except FileNotFoundError:
+        return 0
+    version = (st.st_ino, st.st_mtime_ns)
+
+    cached = _cached.get(index_dir)
+    if cached and cached[0] == version:
+        return cached[1]
+    with _cached_lock:
+        generation = _read_generation(index_dir)
+        _cached[index_dir] = (version, generation)
+    return generation
+
+
+def bump_generation(index_dir: str) -> int:
+    """Atomically increment the generation and return the new value"""
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, _LOCK_FILE), "a") as lock:
+        # Serialize read-increment-write across processes
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        generation = _read_generation(index_dir) + 1
+        tmp_path = os.path.join(index_dir, f".{GENERATION_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(str(generation))
+        os.replace(tmp_path, os.path.join(index_dir, GENERATION_FILE))
+    return generation
@@ -0,0 +1,225 @@
+"""Compact binary encoding for postings lists
+
+A postings list is a sorted sequence of integer document ordinals, each with
+a term frequency. The encoded form is::
+
+    varint   posting count
+    block*   up to BLOCK_SIZE postings each:
+        byte     (delta width code << 4) | tf width code
+        bytes    doc ordinal deltas, little-endian, fixed width
+        bytes    term frequencies, little-endian, fixed width
+
+Deltas are taken from the previous posting (the first from 0) and every
+block picks the narrowest of 1, 2 or 4 bytes that fits its largest value.
+Decoding is one ``array.frombytes`` call per block plus an
+``itertools.accumulate`` pass, so no Python code runs per posting.
+
+Token positions are kept in a separate blob aligned with the postings::
+
+    byte     width code
+    bytes    per posting, its term frequency's worth of position deltas
+             (the first from 0), little-endian, fixed width
+
+The term frequencies already give each posting's number of positions, so the
+positions of any one posting are found from their prefix sum without
+decoding the others. A single posting's positions, as stored per document
+and term in the ``document_terms`` table, use the same format.
+
+Character spans of a term's occurrences in a document are stored alongside::
+
+    byte     width code
+    bytes    per span, its start's delta from the previous start (the
+             first from 0) and its length, little-endian, fixed width
+"""
+from array import array
+from itertools import accumulate, chain
+from typing import List, NamedTuple, Sequence, Tuple
+import sys
+
+BLOCK_SIZE = 128
+
+# Width code -> array typecode
+_TYPECODES = {0: "B", 1: "H", 2: "I"}
+_NEEDS_BYTESWAP = sys.byteorder == "big"
+
+
+class TermInfo(NamedTuple):
+    """Term dictionary entry: collection statistics plus the encoded postings"""
+    document_frequency: int
+    # Largest term frequency in the postings; bounds the term's score for pruning
+    max_term_frequency: int
+    postings: bytes
+    # Quantized BM25 impact per posting, see app.search.ranking; empty when
+    # the reader has no precomputed impacts
+    impacts: bytes = b""
+    max_impact: int = 0
+    # Token positions per posting, see encode_positions; empty when the
+    # reader does not store positions
+    positions: bytes = b""
+    # Most frequent unstemmed form of a body term, for suggestions; empty
+    # when unknown
+    surface: str = ""
+
+
+def _width_code(max_value: int) -> int:
+    if max_value < 1 << 8:
+        return 0
+    if max_value < 1 << 16:
+        return 1
+    if max_value < 1 << 32:
+        return 2
+    raise ValueError(f"Posting value {max_value} does not fit in 32 bits")
+
+
+def _pack(values: Sequence[int], code: int) -> bytes:
+    packed = array(_TYPECODES[code], values)
+    if _NEEDS_BYTESWAP:
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(data: bytes) -> array:
+    """Values packed after a leading width code byte"""
+    values = array(_TYPECODES[data[0]])
+    values.frombytes(memoryview(data)[1:])
+    if _NEEDS_BYTESWAP:
+        values.byteswap()
+    return values
+
+
+def encode_varint(value: int) -> bytes:
+    """Encode a non-negative integer as a LEB128 varint"""
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(data, offset: int = 0) -> Tuple[int, int]:
+    """Decode a LEB128 varint, returning (value, next offset)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_postings(doc_ordinals: Sequence[int], term_freqs: Sequence[int]) -> bytes:
+    """Encode ascending document ordinals and their term frequencies"""
+    if len(doc_ordinals) != len(term_freqs):
+        raise ValueError("doc_ordinals and term_freqs must have the same length")
+
+    out = bytearray(encode_varint(len(doc_ordinals)))
+    previous = None
+    for start in range(0, len(doc_ordinals), BLOCK_SIZE):
+        block_ordinals = doc_ordinals[start:start + BLOCK_SIZE]
+        block_freqs = term_freqs[start:start + BLOCK_SIZE]
+
+        deltas = []
+        for ordinal in block_ordinals:
+            if previous is not None and ordinal <= previous:
+                raise ValueError("doc_ordinals must be strictly ascending")
+            deltas.append(ordinal - (previous or 0))
+            previous = ordinal
+
+        delta_code = _width_code(max(deltas))
+        tf_code = _width_code(max(block_freqs))
+        out.append((delta_code << 4) | tf_code)
+        out += _pack(deltas, delta_code)
+        out += _pack(block_freqs, tf_code)
+
+    return bytes(out)
+
+
+def decode_postings(data: bytes) -> Tuple[array, array]:
+    """Decode postings into ``array('I')`` buffers of ordinals and term frequencies"""
+    if not data:
+        return array("I"), array("I")
+
+    view = memoryview(data)
+    count, offset = decode_varint(view)
+    delta_blocks = []
+    freq_blocks = []
+    remaining = count
+    while remaining:
+        block_len = min(BLOCK_SIZE, remaining)
+        header = view[offset]
+        offset += 1
+        for code, blocks in ((header >> 4, delta_blocks), (header & 0x0F, freq_blocks)):
+            block = array(_TYPECODES[code])
+            end = offset + block_len * block.itemsize
+            block.frombytes(view[offset:end])
+            if _NEEDS_BYTESWAP:
+                block.byteswap()
+            blocks.append(block)
+            offset = end
+        remaining -= block_len
+
+    doc_ordinals = array("I", accumulate(chain.from_iterable(delta_blocks)))
+    term_freqs = array("I", chain.from_iterable(freq_blocks))
+    return doc_ordinals, term_freqs
+
+
+def encode_positions(position_lists: Sequence[Sequence[int]]) -> bytes:
+    """Encode each posting's ascending token positions, in postings order"""
+    deltas = []
+    for positions in position_lists:
+        previous = 0
+        for position in positions:
+            deltas.append(position - previous)
+            previous = position
+    code = _width_code(max(deltas, default=0))
+    return bytes([code]) + _pack(deltas, code)
+
+
+def decode_positions(data: bytes) -> array:
+    """Ascending positions of a single posting encoded by encode_positions"""
+    return array("I", accumulate(_unpack(data)))
+
+
+def concat_positions(blobs: Sequence[bytes]) -> bytes:
+    """Positions of consecutive postings lists, as one encoded blob
+
+    Each posting's deltas start from 0, so the lists only need repacking
+    at the widest of their width codes.
+    """
+    code = max(blob[0] for blob in blobs)
+    return bytes([code]) + b"".join(
+        blob[1:] if blob[0] == code else _pack(_unpack(blob), code) for blob in blobs
+    )
+
+
+def encode_spans(spans: Sequence[Tuple[int, int]]) -> bytes:
+    """Encode (start, end) character spans with ascending starts"""
+    values = []
+    previous = 0
+    for start, end in spans:
+        values.append(start - previous)
+        values.append(end - start)
+        previous = start
+    code = _width_code(max(values, default=0))
+    return bytes([code]) + _pack(values, code)
+
+
+def decode_spans(data: bytes) -> List[Tuple[int, int]]:
+    values = _unpack(data)
+    starts = accumulate(values[0::2])
+    return [(start, start + length) for start, length in zip(starts, values[1::2])]
+
+
+class PositionsView:
+    """Random access to the positions of individual postings of a term"""
+
+    def __init__(self, term_freqs: Sequence[int], data: bytes):
+        self._deltas = _unpack(data)
+        self._starts = array("Q", accumulate(term_freqs, initial=0))
+
+    def positions(self, index: int) -> array:
+        """Ascending positions of the posting at ``index``"""
+        return array("I", accumulate(self._deltas[self._starts[index]:self._starts[index + 1]]))
@@ -0,0 +1,84 @@
+"""Sorted postings runs for partitioned index builds
+
+A run is the partial index of one shard of documents: a file of
+``(term, TermInfo)`` records in ascending term order (code point order, the
+same as UTF-8 byte order), where the postings are an app.index.postings blob
+over that shard's document ordinals only. Shards cover disjoint, ascending
+ordinal ranges, so merging runs is a k-way merge on term in which each term's
+partial postings are concatenated in shard order.
+
+Record layout::
+
+    RECORD_HEADER   term length, document frequency, max term frequency,
+                    postings length
+    bytes           UTF-8 term
+    bytes           postings
+"""
+from array import array
+from heapq import merge
+from itertools import chain, groupby
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Tuple
+import struct
+
+from app.index.postings import TermInfo, decode_postings, encode_postings
+
+RECORD_HEADER = struct.Struct("<IIII")
+_BUFFER_SIZE = 1 << 20
+
+
+def write_run(path: str, terms: Iterable[Tuple[str, TermInfo]]) -> int:
+    """Write (term, TermInfo) records, which must arrive in term order
+
+    Returns the number of records written.
+    """
+    count = 0
+    previous = None
+    with open(path, "wb", buffering=_BUFFER_SIZE) as f:
+        for term, info in terms:
+            if previous is not None and term <= previous:
+                raise ValueError(f"Run terms out of order: {previous!r} then {term!r}")
+            previous = term
+            term_bytes = term.encode("utf-8")
+            f.write(RECORD_HEADER.pack(
+                len(term_bytes), info.document_frequency, info.max_term_frequency, len(info.postings)
+            ))
+            f.write(term_bytes)
+            f.write(info.postings)
+            count += 1
+    return count
+
+
+def read_run(path: str) -> Iterator[Tuple[str, TermInfo]]:
+    """Stream the (term, TermInfo) records of a run"""
+    with open(path, "rb", buffering=_BUFFER_SIZE) as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if not header:
+                return
+            term_len, doc_freq, max_tf, postings_len = RECORD_HEADER.unpack(header)
+            yield f.read(term_len).decode("utf-8"), TermInfo(doc_freq, max_tf, f.read(postings_len))
+
+
+def merge_runs(paths: List[str]) -> Iterator[Tuple[str, TermInfo]]:
+    """K-way merge runs, listed in shard order, into complete term entries
+
+    Only one record per run is held in memory at a time, plus the postings
+    of the term being merged.
+    """
+    # heapq.merge is stable, so equal terms come out in shard (ordinal) order
+    records = merge(*(read_run(path) for path in paths), key=itemgetter(0))
+    for term, parts in groupby(records, key=itemgetter(0)):
+        infos = [info for _, info in parts]
+        if len(infos) == 1:
+            # The term occurs in one shard only: its run entry is already complete
+            yield term, infos[0]
+            continue
+        decoded = [decode_postings(info.postings) for info in infos]
+        doc_ordinals = array("I", chain.from_iterable(ordinals for ordinals, _ in decoded))
+        term_freqs = array("I", chain.from_iterable(freqs for _, freqs in decoded))
+        yield term, TermInfo(
+            len(doc_ordinals),
+            max(info.max_term_frequency for info in infos),
+            encode_postings(doc_ordinals, term_freqs)
+        )
@@ -0,0 +1,606 @@
+"""Read-only, memory-mapped index segments
+
+A segment is a single immutable file holding a snapshot of the search index:
+the encoded postings of every term, a sorted term dictionary and a doc-store
+with the metadata needed to render results. API workers ``mmap`` the current
+segment and answer queries without touching the database.
+
+File layout (all integers little-endian on little-endian hosts)::
+
+    postings      per term: an app.index.postings blob followed by its
+                  impacts, one uint8 BM25 impact per posting (may be empty),
+                  and its token positions blob (may be empty)
+    term_bytes    concatenated UTF-8 terms; title and URL terms are keyed by
+                  app.index.fields.field_key
+    term_entries  TERM_ENTRY records sorted by term bytes
+    term_doc_freqs  uint32 array, document frequency per sorted term
+    rank_tree     uint32 array, app.search.suggest rank tree over
+                  term_doc_freqs, for prefix suggestions
+    surface_bytes   concatenated UTF-8 surface forms of the sorted terms,
+                  empty where unknown or the same as the term
+    surface_offsets uint32 array, term_count + 1 offsets into surface_bytes
+    doc_data      one JSON object per document
+    doc_ordinals  uint32 array, ascending
+    doc_offsets   uint64 array, len(doc_ordinals) + 1 offsets into doc_data
+    meta          JSON: generation, counts, section offsets and the
+                  collection statistics the impacts were computed with
+    footer        uint32 meta length + MAGIC
+
+Publishing writes ``segment-<generation>-<token>.seg`` under a temporary
+name, renames it into place and then atomically replaces the ``CURRENT``
+manifest, so readers only ever open complete segments. The manifest lists
+one file name per line::
+
+    segment-...seg    the base segment, a snapshot of the whole index
+    segment-...seg*   delta segments published since, oldest first
+    deleted-...del    optional: uint32 array of deleted document ordinals
+
+Documents are never changed inside a segment. A re-indexed document gets a
+new ordinal, so an update is a delete plus an add: the old ordinal joins
+the deleted set, which readers skip when ranking and hydrating, and the new
+one is published in the next delta. Ordinals only grow, so every delta
+holds higher ordinals than the segments before it and a term's postings
+across segments concatenate in order. Publishing a new base merges the
+deltas away and drops the deletions it no longer contains.
+"""
+from array import array
+from bisect import bisect_left
+from app.index.fields import BODY, field_key
+from app.index.postings import TermInfo, concat_positions, decode_postings, encode_postings
+from app.search.suggest import build_rank_tree, top_k_range
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple, Union
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SESEG001"
+CURRENT_FILE = "CURRENT"
+# Serializes manifest updates across processes
+_MANIFEST_LOCK_FILE = ".CURRENT.lock"
+# Held while a segment is built and published, see publish_lock
+_PUBLISH_LOCK_FILE = ".PUBLISH.lock"
+FORMAT_VERSION = 7
+
+# term offset, term length, postings offset, postings length, impacts offset,
+# document frequency, max term frequency, max impact, positions offset,
+# positions length
+TERM_ENTRY = struct.Struct("<IIQIQIIBQI")
+FOOTER = struct.Struct(f"<I{len(MAGIC)}s")
+_ALIGNMENT = 8
+# Prefixes whose suggestions a reader keeps; keystrokes repeat the same short prefixes
+SUGGESTION_CACHE_SIZE = 4096
+# Terms whose postings a SegmentSet keeps concatenated across its segments
+MERGED_TERM_CACHE_SIZE = 1024
+
+
+def _pad(f):
+    remainder = f.tell() % _ALIGNMENT
+    if remainder:
+        f.write(b"\0" * (_ALIGNMENT - remainder))
+
+
+def _read_manifest(index_dir: str) -> List[str]:
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE)) as f:
+            return f.read().split()
+    except FileNotFoundError:
+        return []
+
+
+def _read_current_name(index_dir: str) -> Optional[str]:
+    """The base segment's file name"""
+    manifest = _read_manifest(index_dir)
+    return manifest[0] if manifest else None
+
+
+def _generation_of(name: Optional[str]) -> int:
+    if not name:
+        return 0
+    return int(name.split("-")[1])
+
+
+def _split_manifest(manifest: List[str]) -> Tuple[List[str], Optional[str]]:
+    """(segment names, base first; deleted ordinals file name or None)"""
+    segments = [name for name in manifest if name.startswith("segment-")]
+    deleted = next((name for name in manifest if name.startswith("deleted-")), None)
+    return segments, deleted
+
+
+def _read_deleted(index_dir: str, name: Optional[str]) -> array:
+    deleted = array("I")
+    if name:
+        with open(os.path.join(index_dir, name), "rb") as f:
+            deleted.frombytes(f.read())
+    return deleted
+
+
+def _new_name(prefix: str, generation: int, suffix: str) -> str:
+    return f"{prefix}-{generation:08d}-{uuid.uuid4().hex[:8]}.{suffix}"
+
+
+@contextmanager
+def _locked(index_dir: str, lock_file: str):
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, lock_file), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def publish_lock(index_dir: str):
+    """Exclusive lock for building and publishing a segment, across processes
+
+    A delta holds the documents above the last published ordinal, so two
+    publishers must not work from the same manifest at once. Deletions
+    only take the manifest lock and never wait for a build.
+    """
+    return _locked(index_dir, _PUBLISH_LOCK_FILE)
+
+
+def _write_deleted(index_dir: str, generation: int, ordinals: Iterable[int]) -> str:
+    name = _new_name("deleted", generation, "del")
+    tmp_path = os.path.join(index_dir, f".{name}.tmp")
+    with open(tmp_path, "wb") as f:
+        array("I", sorted(ordinals)).tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(index_dir, name))
+    return name
+
+
+def delete_from_segments(index_dir: str, ordinals: Iterable[int]):
+    """Hide documents from the published segments until the next base is published
+
+    Called with the ordinals of deleted and re-indexed documents once their
+    change is committed. Does nothing before a segment is published.
+    """
+    ordinals = set(ordinals)
+    if not ordinals or not _read_manifest(index_dir):
+        return
+    with _locked(index_dir, _MANIFEST_LOCK_FILE):
+        manifest = _read_manifest(index_dir)
+        if not manifest:
+            return
+        segments, deleted_name = _split_manifest(manifest)
+        deleted = set(_read_deleted(index_dir, deleted_name))
+        if ordinals <= deleted:
+            return
+        name = _write_deleted(index_dir, max(map(_generation_of, manifest)) + 1, deleted | ordinals)
+        _set_current(index_dir, segments + [name], manifest)
+
+
+def write_segment(index_dir: str,
+                  terms: Iterable[Tuple[str, TermInfo]],
+                  documents: Iterable[Tuple[int, Dict]],
+                  stats: Optional[Dict] = None,
+                  delta: bool = False) -> str:
+    """Write a new segment and make it current, returning its file name
+
+    ``terms`` yields (term, TermInfo) in any order; ``documents`` yields
+    (ordinal, metadata) in ascending ordinal order. ``stats`` is stored in
+    the segment meta as-is. A ``delta`` is added after the current
+    segments and must only hold ordinals above theirs; otherwise the
+    segment replaces them as the new base.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    generation = max(map(_generation_of, _read_manifest(index_dir)), default=0) + 1
+    name = _new_name("segment", generation, "seg")
+    tmp_path = os.path.join(index_dir, f".{name}.tmp")
+
+    sections = {}
+    try:
+        with open(tmp_path, "wb") as f:
+            # Postings are streamed straight to disk; only the small per-term
+            # dictionary entries are kept in memory for sorting
+            entries = []
+            start = f.tell()
+            for term, info in terms:
+                postings_offset = f.tell() - start
+                f.write(info.postings)
+                impacts_offset = f.tell() - start
+                f.write(info.impacts)
+                surface = info.surface if info.surface != term else ""
+                entries.append((
+                    term.encode("utf-8"), postings_offset, len(info.postings), impacts_offset,
+                    info.document_frequency, info.max_term_frequency, info.max_impact,
+                    f.tell() - start, len(info.positions), surface.encode("utf-8")
+                ))
+                f.write(info.positions)
+            sections["postings"] = (start, f.tell() - start)
+            entries.sort(key=lambda entry: entry[0])
+
+            _pad(f)
+            start = f.tell()
+            term_offsets = []
+            for term_bytes, *_ in entries:
+                term_offsets.append(f.tell() - start)
+                f.write(term_bytes)
+            sections["term_bytes"] = (start, f.tell() - start)
+
+            _pad(f)
+            start = f.tell()
+            for term_offset, (term_bytes, *entry, _) in zip(term_offsets, entries):
+                f.write(TERM_ENTRY.pack(term_offset, len(term_bytes), *entry))
+            sections["term_entries"] = (start, f.tell() - start)
+
+            _pad(f)
+            start = f.tell()
+            surface_offsets = array("I", [0])
+            for entry in entries:
+                f.write(entry[-1])
+                surface_offsets.append(f.tell() - start)
+            sections["surface_bytes"] = (start, f.tell() - start)
+
+            term_doc_freqs = array("I", (entry[4] for entry in entries))
+            for section, values in (("term_doc_freqs", term_doc_freqs),
+                                    ("rank_tree", build_rank_tree(term_doc_freqs)),
+                                    ("surface_offsets", surface_offsets)):
+                _pad(f)
+                start = f.tell()
+                values.tofile(f)
+                sections[section] = (start, f.tell() - start)
+
+            _pad(f)
+            start = f.tell()
+            doc_ordinals = array("I")
+            doc_offsets = array("Q")
+            for ordinal, metadata in documents:
+                doc_ordinals.append(ordinal)
+                doc_offsets.append(f.tell() - start)
+                f.write(json.dumps(metadata, separators=(",", ":")).encode("utf-8"))
+            doc_offsets.append(f.tell() - start)
+            sections["doc_data"] = (start, f.tell() - start)
+
+            for section, values in (("doc_ordinals", doc_ordinals), ("doc_offsets", doc_offsets)):
+                _pad(f)
+                start = f.tell()
+                values.tofile(f)
+                sections[section] = (start, f.tell() - start)
+
+            meta = json.dumps({
+                "version": FORMAT_VERSION,
+                "generation": generation,
+                "byteorder": sys.byteorder,
+                "term_count": len(entries),
+                "doc_count": len(doc_ordinals),
+                "stats": stats or {},
+                "sections": sections,
+            }).encode("utf-8")
+            f.write(meta)
+            f.write(FOOTER.pack(len(meta), MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, os.path.join(index_dir, name))
+        with _locked(index_dir, _MANIFEST_LOCK_FILE):
+            manifest = _read_manifest(index_dir)
+            segments, deleted_name = _split_manifest(manifest)
+            deleted = _read_deleted(index_dir, deleted_name)
+            if delta and segments:
+                segments.append(name)
+            else:
+                segments = [name]
+                # Deletions made while the base was built still apply to it
+                deleted = [ordinal for ordinal in deleted if _contains(doc_ordinals, ordinal)]
+            if deleted:
+                segments.append(_write_deleted(index_dir, generation, deleted))
+            _set_current(index_dir, segments, manifest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    logger.info(f"Published index {'delta ' if delta else ''}segment {name} "
+                f"with {len(entries)} terms and {len(doc_ordinals)} documents")
+    return name
+
+
+def _contains(ordinals: Sequence[int], ordinal: int) -> bool:
+    pos = bisect_left(ordinals, ordinal)
+    return pos < len(ordinals) and ordinals[pos] == ordinal
+
+
+def _set_current(index_dir: str, manifest: List[str], previous: List[str]):
+    """Replace the manifest, holding the manifest lock, and remove files no reader needs
+
+    ``previous`` is the manifest being replaced.
+    """
+    tmp_path = os.path.join(index_dir, f".{CURRENT_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(manifest))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(index_dir, CURRENT_FILE))
+
+    # Keep the previous manifest's files for readers that resolved CURRENT
+    # just before the swap, and segments newer than its base that a
+    # concurrent publisher may be about to add; processes that already
+    # mapped older files keep their mapping after the unlink
+    kept = set(manifest) | set(previous)
+    oldest_kept = _generation_of(previous[0] if previous else None)
+    for fname in os.listdir(index_dir):
+        if fname in kept:
+            continue
+        if (fname.startswith("segment-") and fname.endswith(".seg") and _generation_of(fname) < oldest_kept
+                or fname.startswith("deleted-") and fname.endswith(".del")):
+            try:
+                os.remove(os.path.join(index_dir, fname))
+            except FileNotFoundError:
+                pass
+
+
+class SegmentReader:
+    """Zero-copy reader over a memory-mapped segment file"""
+
+    # Ordinals to skip; a segment read on its own has none
+    deleted: FrozenSet[int] = frozenset()
+
+    @property
+    def segments(self) -> List["SegmentReader"]:
+        """The segments read, like SegmentSet.segments"""
+        return [self]
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        meta_len, magic = FOOTER.unpack_from(view, len(view) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an index segment")
+        meta_start = len(view) - FOOTER.size - meta_len
+        meta = json.loads(bytes(view[meta_start:meta_start + meta_len]))
+        if meta["version"] != FORMAT_VERSION or meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Unsupported segment format in {path}")
+
+        def section(name):
+            start, length = meta["sections"][name]
+            return view[start:start + length]
+
+        self.generation = meta["generation"]
+        self.doc_count = meta["doc_count"]
+        self.term_count = meta["term_count"]
+        self.stats = meta["stats"]
+        self._postings = section("postings")
+        self._term_bytes = section("term_bytes")
+        self._term_entries = section("term_entries")
+        self._term_doc_freqs = section("term_doc_freqs").cast("I")
+        self._rank_tree = section("rank_tree").cast("I")
+        self._surface_bytes = section("surface_bytes")
+        self._surface_offsets = section("surface_offsets").cast("I")
+        self._suggestions: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+        self._doc_data = section("doc_data")
+        self._doc_ordinals = section("doc_ordinals").cast("I")
+        self._doc_offsets = section("doc_offsets").cast("Q")
+
+    def _entry(self, index: int) -> Tuple[int, ...]:
+        return TERM_ENTRY.unpack_from(self._term_entries, index * TERM_ENTRY.size)
+
+    def _term_at(self, index: int) -> bytes:
+        term_offset, term_len = self._entry(index)[:2]
+        return bytes(self._term_bytes[term_offset:term_offset + term_len])
+
+    def _bisect(self, key: bytes) -> int:
+        """Index of the first term >= key"""
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, term: str, field: str = BODY) -> Optional[TermInfo]:
+        """Return the dictionary entry for a term in a field, with postings as a zero-copy view"""
+        key = field_key(field, term).encode("utf-8")
+        lo = self._bisect(key)
+        if lo == self.term_count or self._term_at(lo) != key:
+            return None
+        (_, _, postings_offset, postings_len, impacts_offset, doc_freq, max_tf, max_impact,
+         positions_offset, positions_len) = self._entry(lo)
+        impacts_len = doc_freq if max_impact else 0
+        return TermInfo(
+            doc_freq, max_tf,
+            self._postings[postings_offset:postings_offset + postings_len],
+            self._postings[impacts_offset:impacts_offset + impacts_len],
+            max_impact,
+            self._postings[positions_offset:positions_offset + positions_len]
+        )
+
+    def suggest(self, prefix: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """Return up to ``limit`` (term, document frequency) pairs for terms
+        starting with ``prefix``, most frequent first"""
+        cache_key = (prefix, limit)
+        cached = self._suggestions.get(cache_key)
+        if cached is not None:
+            return cached
+
+        key = prefix.encode("utf-8")
+        # No UTF-8 sequence contains 0xff, so every term with the prefix sorts
+        # before prefix + 0xff and every later term after it
+        lo, hi = self._bisect(key), self._bisect(key + b"\xff")
+        suggestions = [
+            (self._term_at(index).decode("utf-8"), self._term_doc_freqs[index])
+            for index in top_k_range(self._rank_tree, self._term_doc_freqs, lo, hi, limit)
+        ]
+        if len(self._suggestions) >= SUGGESTION_CACHE_SIZE:
+            self._suggestions.clear()
+        self._suggestions[cache_key] = suggestions
+        return suggestions
+
+    def surface(self, term: str) -> str:
+        """Most frequent unstemmed form of a body term, or the term itself"""
+        key = term.encode("utf-8")
+        index = self._bisect(key)
+        if index < self.term_count and self._term_at(index) == key:
+            start, end = self._surface_offsets[index], self._surface_offsets[index + 1]
+            if end > start:
+                return bytes(self._surface_bytes[start:end]).decode("utf-8")
+        return term
+
+    def doc_ordinals(self) -> Sequence[int]:
+        """Ascending ordinals of every document, for queries that only exclude"""
+        return self._doc_ordinals
+
+    def get_documents(self, ordinals: Iterable[int]) -> Dict[int, Dict]:
+        """Return stored metadata for the given document ordinals"""
+        documents = {}
+        for ordinal in ordinals:
+            pos = bisect_left(self._doc_ordinals, ordinal)
+            if pos < len(self._doc_ordinals) and self._doc_ordinals[pos] == ordinal:
+                start, end = self._doc_offsets[pos], self._doc_offsets[pos + 1]
+                documents[ordinal] = json.loads(bytes(self._doc_data[start:end]))
+        return documents
+
+
+def _concat_term_infos(infos: List[TermInfo]) -> TermInfo:
+    """One term's entries in consecutive segments as a single entry"""
+    doc_ordinals, term_freqs = array("I"), array("I")
+    for info in infos:
+        ordinals, freqs = decode_postings(info.postings)
+        doc_ordinals.extend(ordinals)
+        term_freqs.extend(freqs)
+    # Every published segment has impacts; positions may be left to the database
+    has_impacts = all(info.max_impact for info in infos)
+    return TermInfo(
+        sum(info.document_frequency for info in infos),
+        max(info.max_term_frequency for info in infos),
+        encode_postings(doc_ordinals, term_freqs),
+        b"".join(info.impacts for info in infos) if has_impacts else b"",
+        max(info.max_impact for info in infos) if has_impacts else 0,
+        concat_positions([info.positions for info in infos]) if all(info.positions for info in infos) else b"",
+    )
+
+
+class SegmentSet:
+    """A base segment and its delta segments, read as one index without the deleted documents
+
+    Deleted documents keep their postings until the next base is published:
+    they count towards the document count and document frequencies alike,
+    like in the segment they were published in, so IDF never sees a term in
+    more documents than the index holds. They are never ranked or hydrated. Impacts were computed
+    with the collection statistics of each segment's publish; the base's
+    are reported as ``stats``.
+    """
+
+    def __init__(self, segments: List[SegmentReader], deleted: Iterable[int]):
+        self.segments = segments
+        self.deleted = frozenset(deleted)
+        self.generation = segments[-1].generation
+        self.stats = segments[0].stats
+        self.doc_count = sum(segment.doc_count for segment in segments)
+        self._merged: Dict[Tuple[str, str], TermInfo] = {}
+        self._doc_ordinals: Optional[array] = None
+
+    def lookup(self, term: str, field: str = BODY) -> Optional[TermInfo]:
+        """Return the term's entry across segments; postings are copied only when several have it"""
+        merged = self._merged.get((term, field))
+        if merged is not None:
+            return merged
+        infos = [info for info in (segment.lookup(term, field) for segment in self.segments) if info]
+        if len(infos) <= 1:
+            return infos[0] if infos else None
+        merged = _concat_term_infos(infos)
+        if len(self._merged) >= MERGED_TERM_CACHE_SIZE:
+            self._merged.clear()
+        self._merged[(term, field)] = merged
+        return merged
+
+    def suggest(self, prefix: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """Most frequent terms with ``prefix`` among each segment's own suggestions"""
+        candidates = {term for segment in self.segments for term, _ in segment.suggest(prefix, limit)}
+        doc_freqs = {term: self._document_frequency(term) for term in candidates}
+        return sorted(doc_freqs.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def _document_frequency(self, term: str) -> int:
+        infos = (segment.lookup(term) for segment in self.segments)
+        return sum(info.document_frequency for info in infos if info)
+
+    def surface(self, term: str) -> str:
+        for segment in self.segments:
+            surface = segment.surface(term)
+            if surface != term:
+                return surface
+        return term
+
+    def doc_ordinals(self) -> Sequence[int]:
+        """Ascending ordinals of every live document, for queries that only exclude"""
+        if self._doc_ordinals is None:
+            self._doc_ordinals = array("I", (
+                ordinal for segment in self.segments for ordinal in segment.doc_ordinals()
+                if ordinal not in self.deleted
+            ))
+        return self._doc_ordinals
+
+    def get_documents(self, ordinals: Iterable[int]) -> Dict[int, Dict]:
+        """Return stored metadata for the given document ordinals, skipping deleted ones"""
+        wanted = [ordinal for ordinal in ordinals if ordinal not in self.deleted]
+        documents = {}
+        for segment in self.segments:
+            documents.update(segment.get_documents(ordinal for ordinal in wanted if ordinal not in documents))
+        return documents
+
+
+IndexReader = Union[SegmentReader, SegmentSet]
+
+_current_lock = threading.Lock()
+_current: Dict[str, Tuple[Tuple[int, int], IndexReader]] = {}
+
+
+def _open_current(index_dir: str, manifest: List[str],
+                  previous: Optional[IndexReader]) -> IndexReader:
+    """Open the manifest's segments, reusing those ``previous`` already mapped"""
+    segment_names, deleted_name = _split_manifest(manifest)
+    mapped = {}
+    if previous is not None:
+        for segment in previous.segments:
+            mapped[os.path.basename(segment.path)] = segment
+    segments = [mapped.get(name) or SegmentReader(os.path.join(index_dir, name)) for name in segment_names]
+    deleted = _read_deleted(index_dir, deleted_name)
+    if len(segments) == 1 and not deleted:
+        return segments[0]
+    return SegmentSet(segments, deleted)
+
+
+def get_current_segment(index_dir: str) -> Optional[IndexReader]:
+    """Return a reader for the current segments, reopening it after a publish
+
+    A lone base segment is returned as is; with deltas or deletions the
+    segments are read through a SegmentSet. The check is a single ``stat``
+    of the CURRENT file, cheap enough to run on every request.
+    """
+    try:
+        st = os.stat(os.path.join(index_dir, CURRENT_FILE))
+    except FileNotFoundError:
+        return None
+    version = (st.st_ino, st.st_mtime_ns)
+
+    cached = _current.get(index_dir)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with _current_lock:
+        cached = _current.get(index_dir)
+        if cached and cached[0] == version:
+            return cached[1]
+        manifest = _read_manifest(index_dir)
+        if not manifest:
+            return None
+        try:
+            reader = _open_current(index_dir, manifest, cached[1] if cached else None)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to open index segments {manifest}: {e}")
+            return cached[1] if cached else None
+        _current[index_dir] = (version, reader)
+        logger.info(f"Opened index segments {', '.join(manifest)}")
+        return reader
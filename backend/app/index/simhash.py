@@ -0,0 +1,96 @@
+"""SimHash fingerprints and an LSH banding index for near-duplicate detection
+
+A document's fingerprint is the 64-bit SimHash of its set of word shingles
+(runs of SHINGLE_SIZE consecutive tokens): each bit is set when most
+shingle hashes have it set, so documents sharing most of their shingles
+differ in few bits. Documents within MAX_DISTANCE bits are near-duplicates.
+
+To find them without comparing against every document, fingerprints are
+split into MAX_DISTANCE + 1 bands. Two fingerprints at most MAX_DISTANCE
+bits apart cannot differ in every band, so looking up the documents that
+share at least one band value exactly yields every near-duplicate; the
+candidates are then checked by their full Hamming distance.
+"""
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+# Hamming distance up to which two fingerprints are near-duplicates
+MAX_DISTANCE = 3
+BANDS = MAX_DISTANCE + 1
+BAND_BITS = FINGERPRINT_BITS // BANDS
+_BAND_MASK = (1 << BAND_BITS) - 1
+_SIGN_BIT = 1 << (FINGERPRINT_BITS - 1)
+
+
+def _shingles(tokens: Sequence[str]) -> Iterable[str]:
+    if len(tokens) <= SHINGLE_SIZE:
+        return (" ".join(tokens),)
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def simhash(tokens: Sequence[str]) -> Optional[int]:
+    """Unsigned 64-bit SimHash of a token sequence; None for no tokens"""
+    if not tokens:
+        return None
+    digest_size = FINGERPRINT_BITS // 8
+    digests = b"".join(
+        hashlib.blake2b(shingle.encode(), digest_size=digest_size).digest()
+        for shingle in _shingles(tokens)
+    )
+    # All shingle hashes as one bit string: every FINGERPRINT_BITS-th
+    # character from an offset is one bit position across all of them,
+    # so bits are counted in C rather than per hash and bit in Python
+    bits = format(int.from_bytes(digests, "big"), f"0{len(digests) * 8}b")
+    majority = len(digests) / digest_size / 2
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        fingerprint = (fingerprint << 1) | (bits[bit::FINGERPRINT_BITS].count("1") > majority)
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def bands(fingerprint: int) -> List[Tuple[int, int]]:
+    """(band number, band value) pairs of a fingerprint"""
+    return [(band, (fingerprint >> (band * BAND_BITS)) & _BAND_MASK) for band in range(BANDS)]
+
+
+def to_signed(fingerprint: int) -> int:
+    """Fingerprint as a signed 64-bit integer, for BIGINT columns"""
+    return fingerprint - (1 << FINGERPRINT_BITS) if fingerprint & _SIGN_BIT else fingerprint
+
+
+def from_signed(value: int) -> int:
+    return value & ((1 << FINGERPRINT_BITS) - 1)
+
+
+class BandIndex:
+    """In-memory banding index, for fingerprints not yet in the database"""
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[int, int], List[Tuple[Hashable, int]]] = {}
+
+    def add(self, key: Hashable, fingerprint: int):
+        for band in bands(fingerprint):
+            self._buckets.setdefault(band, []).append((key, fingerprint))
+
+    def candidates(self, fingerprint: int) -> Dict[Hashable, int]:
+        """key -> fingerprint of everything sharing a band with ``fingerprint``"""
+        found = {}
+        for band in bands(fingerprint):
+            found.update(self._buckets.get(band, ()))
+        return found
+
+
+def nearest(fingerprint: int, candidates: Dict[Hashable, int]) -> Optional[Tuple[Hashable, int]]:
+    """(key, distance) of the closest candidate within MAX_DISTANCE, if any"""
+    best = None
+    for key, other in candidates.items():
+        distance = hamming_distance(fingerprint, other)
+        if distance <= MAX_DISTANCE and (best is None or distance < best[1]):
+            best = (key, distance)
+    return best
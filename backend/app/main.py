@@ -1,10 +1,14 @@
-from fastapi import FastAPI, Query, Body, Depends, HTTPException
+from fastapi import FastAPI, Query, Body, Depends, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from typing import Optional
 from app.config import settings
-from app.database import init_db, check_db_connection
+from app.database import init_db, check_db_connection, dispose_async_engine
+from app.index.segment import get_current_segment
+from app.metrics import render_metrics
 from app.services.document_service import DocumentService, get_document_service
-from app.services.index_service import IndexService, get_index_service
+from app.services.index_service import AsyncIndexService, IndexService, get_async_index_service, get_index_service
 from app.search.redis_search import search_redis_query
+from app.search.result_cache import get_result_cache
 from tasks import rebuild_index_task, crawl_and_index_task
 from scripts.run_crawler import crawl_and_store
 import redis
@@ -39,24 +43,34 @@ async def startup_event():
             logger.error("Database connection failed")
             raise Exception("Database connection failed")
         logger.info("Database initialized successfully")
+        
+        # Map the published index segment, if any, before serving traffic
+        if settings.use_segment_index and get_current_segment(settings.index_dir) is None:
+            logger.info("No index segment published yet; searching the database")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await dispose_async_engine()
+
 @app.get("/")
 def read_root():
     return {"message": "Search Engine Backend is running"}
 
 @app.get("/search")
-def search_query(
+async def search_query(
     q: str = Query(...), 
     op: str = Query("AND"),
-    index_service: IndexService = Depends(get_index_service)
+    ranking: Optional[str] = Query(None, pattern="^(tfidf|bm25)$"),
+    highlight: Optional[bool] = Query(None),
+    index_service: AsyncIndexService = Depends(get_async_index_service)
 ):
     try:
-        logger.info(f"Searching for: '{q}' with operation: {op}")
-        results = index_service.search(q, op)
-        logger.info(f"Found {len(results)} results for query: '{q}'")
+        logger.debug(f"Searching for: '{q}' with operation: {op}")
+        results = await index_service.search(q, op, ranking=ranking, highlight=highlight)
+        logger.debug(f"Found {len(results)} results for query: '{q}'")
         return {"results": results, "count": len(results)}
     except Exception as e:
         logger.error(f"Search error: {e}")
@@ -83,15 +97,18 @@ def run_crawler(
     index_service: IndexService = Depends(get_index_service)
 ):
     try:
-        # Crawl and store documents
-        crawl_and_store(urls)
+        # Crawl and store documents; each stored page updates the index incrementally
+        crawl_stats = crawl_and_store(urls)
         
-        # Rebuild index
-        result = index_service.rebuild_index()
+        # Publish new and changed pages to segment readers as a delta
+        if crawl_stats["stored"]:
+            index_service.publish_changes()
         
         return {
-            "status": "Crawled and index rebuilt",
-            "index_result": result
+            "status": "Crawled and indexed",
+            "documents_crawled": crawl_stats["crawled"],
+            "documents_stored": crawl_stats["stored"],
+            "documents_failed": crawl_stats["store_failed"]
         }
     except Exception as e:
         logger.error(f"Crawl error: {e}")
@@ -146,23 +163,33 @@ def health_check():
         }
 
 @app.get("/stats")
-def get_stats(index_service: IndexService = Depends(get_index_service)):
+async def get_stats(index_service: AsyncIndexService = Depends(get_async_index_service)):
     """Get search engine statistics"""
     try:
-        stats = index_service.get_index_stats()
+        stats = await index_service.get_index_stats()
+        # Hit/miss counters are per API worker process
+        cache = get_result_cache()
+        stats["result_cache"] = cache.stats() if cache is not None else {"enabled": False}
         return stats
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
         raise HTTPException(status_code=500, detail="Failed to get statistics")
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics: search latency by stage, SQL statements per search,
+    result cache lookups and index build durations"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/suggestions")
-def get_suggestions(
+async def get_suggestions(
     q: str = Query(...),
-    index_service: IndexService = Depends(get_index_service)
+    index_service: AsyncIndexService = Depends(get_async_index_service)
 ):
     """Get search suggestions based on indexed terms"""
     try:
-        suggestions = index_service.get_search_suggestions(q)
+        suggestions = await index_service.get_search_suggestions(q)
         return {"suggestions": suggestions}
     except Exception as e:
         logger.error(f"Error getting suggestions: {e}")
@@ -183,7 +210,7 @@ def debug_index(index_service: IndexService = Depends(get_index_service)):
     """Debug endpoint to check index status"""
     try:
         from app.database import SearchIndex, Document
-        db = next(get_db())
+        db = index_service.db
         
         total_docs = db.query(Document).count()
         total_terms = db.query(SearchIndex).count()
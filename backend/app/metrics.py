@@ -0,0 +1,132 @@
+"""Prometheus metrics: search latency by stage, database load, result cache,
+index builds and near-duplicates skipped at ingestion, served by the API's
+``/metrics`` endpoint
+
+A search runs inside a ``SearchTimer``. Each ``mark(stage)`` closes the
+stage that began at the previous mark, so instrumenting a search costs one
+``perf_counter`` call per stage, and the histograms are only touched once
+when the timer exits. SQL statements are counted by an engine event
+listener into the timer of the search running in the current context,
+which ``AsyncSession.run_sync`` and the threadpool both carry over.
+
+Metrics are per process. To aggregate API workers and Celery workers on a
+host, point PROMETHEUS_MULTIPROC_DIR at a shared, empty directory before
+they start; ``/metrics`` then reports all of them.
+"""
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+import logging
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds; searches and their stages range from microseconds (cache hits)
+# to seconds (database fallback over a large corpus)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BUILD_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+SEARCH_SECONDS = Histogram(
+    "search_seconds", "Search latency", ["backend"], buckets=LATENCY_BUCKETS
+)
+SEARCH_STAGE_SECONDS = Histogram(
+    "search_stage_seconds", "Search latency by stage", ["backend", "stage"], buckets=LATENCY_BUCKETS
+)
+SEARCH_DB_STATEMENTS = Histogram(
+    "search_db_statements", "SQL statements executed per search", ["backend"], buckets=STATEMENT_BUCKETS
+)
+RESULT_CACHE_LOOKUPS = Counter(
+    "search_result_cache_lookups", "Result cache lookups by outcome: hit, redis_hit or miss", ["result"]
+)
+INDEX_BUILD_SECONDS = Histogram(
+    "index_build_seconds", "Index build duration by stage: build, publish or rebuild", ["stage"],
+    buckets=BUILD_BUCKETS
+)
+NEAR_DUPLICATE_DOCUMENTS = Counter(
+    "ingest_near_duplicate_documents", "Ingested documents collapsed onto a near-duplicate instead of indexed"
+)
+NEAR_DUPLICATE_TOKENS = Counter(
+    "ingest_near_duplicate_tokens", "Tokens neither stored nor indexed because their document was a near-duplicate"
+)
+
+# Labelled children by label values; labels() itself costs about a microsecond
+_children: Dict[Tuple, object] = {}
+
+
+def _child(metric, *labels):
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children.setdefault(key, metric.labels(*labels))
+    return child
+
+
+_current_timer: ContextVar[Optional["SearchTimer"]] = ContextVar("search_timer", default=None)
+
+
+class SearchTimer:
+    """Per-stage timing of one search, recorded when the ``with`` block exits
+
+    ``mark(stage)`` attributes the time since the previous mark (or the
+    start) to ``stage``; marking a stage again adds to it.
+    """
+
+    def __init__(self, backend: str):
+        self.backend = backend
+        self.stages: Dict[str, float] = {}
+        self.statements = 0
+        self.started = self.last = 0.0
+        self._token = None
+
+    def __enter__(self) -> "SearchTimer":
+        self._token = _current_timer.set(self)
+        self.started = self.last = perf_counter()
+        return self
+
+    def mark(self, stage: str):
+        now = perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def __exit__(self, *exc_info):
+        elapsed = perf_counter() - self.started
+        _current_timer.reset(self._token)
+        _child(SEARCH_SECONDS, self.backend).observe(elapsed)
+        for stage, seconds in self.stages.items():
+            _child(SEARCH_STAGE_SECONDS, self.backend, stage).observe(seconds)
+        _child(SEARCH_DB_STATEMENTS, self.backend).observe(self.statements)
+        if logger.isEnabledFor(logging.DEBUG):
+            stages = " ".join(f"{stage}={seconds * 1e3:.2f}ms" for stage, seconds in self.stages.items())
+            logger.debug(f"{self.backend} search took {elapsed * 1e3:.2f}ms "
+                         f"({stages}, {self.statements} SQL statements)")
+        return False
+
+
+def mark_stage(stage: str):
+    """Close ``stage`` of the search running in this context, if it is timed"""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.mark(stage)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.statements += 1
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition body and content type for the ``/metrics`` endpoint"""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
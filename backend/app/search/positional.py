@@ -0,0 +1,56 @@
+"""Phrase and proximity clauses of a search query
+
+``"quick brown fox"`` matches documents where the terms occur at consecutive
+positions, and ``quick NEAR/3 fox`` those where the two terms occur within 3
+positions of each other, in either order. Both are evaluated in two steps: a
+document-level intersection of the clause terms' postings finds candidates,
+then only those candidates have their positions checked (see
+app.search.query_plan). The query syntax is parsed by app.search.query_parser.
+
+Positions count indexed tokens, so stopwords neither occupy a position in a
+document nor in a phrase: ``"state of the art"`` matches "state-of-the-art"
+and "state art" alike.
+"""
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+
+class PositionalClause(NamedTuple):
+    """Terms that must occur close together in a matching document
+
+    A phrase (``ordered``) needs its terms at consecutive positions; a NEAR
+    clause needs its two terms at most ``distance`` positions apart.
+    """
+    terms: Tuple[str, ...]
+    ordered: bool
+    distance: int = 1
+    # None matches the clause in any field
+    field: Optional[str] = None
+
+    def matches(self, positions: Sequence[Sequence[int]]) -> bool:
+        """Check the clause against each term's positions in one document"""
+        if self.ordered:
+            return phrase_match(positions)
+        return near_match(positions[0], positions[1], self.distance)
+
+
+def phrase_match(positions: Sequence[Sequence[int]]) -> bool:
+    """True if some position p has term i at p + i for every term i"""
+    starts = set(positions[0])
+    for offset, term_positions in enumerate(positions[1:], 1):
+        starts.intersection_update(position - offset for position in term_positions)
+        if not starts:
+            return False
+    return bool(starts)
+
+
+def near_match(first: Sequence[int], second: Sequence[int], distance: int) -> bool:
+    """True if two ascending position lists have entries at most ``distance`` apart"""
+    i = j = 0
+    while i < len(first) and j < len(second):
+        if abs(first[i] - second[j]) <= distance:
+            return True
+        if first[i] < second[j]:
+            i += 1
+        else:
+            j += 1
+    return False
@@ -0,0 +1,257 @@
+"""Boolean query language
+
+Queries combine terms with ``AND``, ``OR`` and ``NOT`` (upper case),
+parentheses, ``"quoted phrases"``, ``a NEAR/k b`` and field prefixes such as
+``title:term``, ``url:"a b"`` or ``body:(a OR b)``; a term without one
+matches in any field (see app.index.fields). Adjacent operands without an operator are
+joined with the request's default operation, so ``quick fox`` keeps meaning
+"quick AND fox" (or OR) as before. ``AND`` binds tighter than ``OR`` and
+``NOT`` applies to the operand that follows it. Without an operator before
+it, ``NOT`` excludes from the whole group whatever the default: with OR,
+``fox dog NOT cat`` is "(fox OR dog) AND NOT cat".
+
+``parse_query`` returns a normalized tree of ``Term``, ``PositionalClause``,
+``And``, ``Or`` and ``Not`` nodes: words are tokenized like documents, words
+that are only stopwords drop out, nested nodes of the same kind are flattened
+and children are deduplicated and sorted, so equivalent queries produce equal
+(and hashable) trees. Malformed input never raises; stray operators and
+unbalanced parentheses are ignored.
+"""
+from dataclasses import dataclass
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+import re
+
+from app.index.fields import FIELDS
+from app.search.positional import PositionalClause
+from app.utilts.tokenizer import tokenize_text
+
+_LEXEME = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"?|([^\s()"]+))')
+_NEAR = re.compile(r'NEAR/(\d+)$')
+_KEYWORDS = ("AND", "OR", "NOT")
+
+
+class Term(NamedTuple):
+    term: str
+    # None matches the term in any field
+    field: Optional[str] = None
+
+
+# Operators are frozen dataclasses rather than tuples so that equality and
+# hashing tell And((a, b)) from Or((a, b)), as the result cache needs
+@dataclass(frozen=True)
+class And:
+    children: Tuple["Node", ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    children: Tuple["Node", ...]
+
+
+@dataclass(frozen=True)
+class Not:
+    child: "Node"
+
+
+Node = Union[Term, PositionalClause, And, Or, Not]
+
+
+def _normalize(kind, children) -> Optional[Node]:
+    flat = []
+    for child in children:
+        if child is None:
+            continue
+        flat.extend(child.children if type(child) is kind else (child,))
+    flat = sorted(set(flat), key=repr)
+    if not flat:
+        return None
+    return flat[0] if len(flat) == 1 else kind(tuple(flat))
+
+
+def _lex(query: str) -> Iterator[Tuple[str, str]]:
+    """Yield (kind, text) with kind one of ( ) phrase word"""
+    for match in _LEXEME.finditer(query):
+        lparen, rparen, phrase, word = match.groups()
+        if lparen:
+            yield "(", lparen
+        elif rparen:
+            yield ")", rparen
+        elif phrase is not None:
+            yield "phrase", phrase
+        elif word:
+            yield "word", word
+
+
+class _Parser:
+    def __init__(self, query: str, default_op: str):
+        self.lexemes: List[Tuple[str, str]] = list(_lex(query))
+        self.pos = 0
+        self.default_op = "AND" if default_op == "AND" else "OR"
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.lexemes[self.pos] if self.pos < len(self.lexemes) else None
+
+    def peek_keyword(self) -> Optional[str]:
+        lexeme = self.peek()
+        if lexeme and lexeme[0] == "word" and lexeme[1] in _KEYWORDS:
+            return lexeme[1]
+        return None
+
+    def at_operand(self) -> bool:
+        lexeme = self.peek()
+        return lexeme is not None and lexeme[0] != ")" and self.peek_keyword() not in ("AND", "OR")
+
+    def parse(self) -> Optional[Node]:
+        nodes = []
+        while self.peek() is not None:
+            nodes.append(self.parse_or())
+            # Skip a stray ")" or operator and keep going
+            if self.peek() is not None:
+                self.pos += 1
+        return _normalize(And if self.default_op == "AND" else Or, nodes)
+
+    def parse_or(self) -> Optional[Node]:
+        nodes = []
+        excluded = []
+        while True:
+            keyword = self.peek_keyword()
+            if keyword == "NOT" and self.default_op == "OR":
+                # Implicit NOT excludes from the whole group, not one operand
+                excluded.append(self.parse_unary())
+            elif keyword == "OR" and nodes:
+                self.pos += 1
+                nodes.append(self.parse_and())
+            elif not nodes or (self.default_op == "OR" and self.at_operand()):
+                nodes.append(self.parse_and())
+            else:
+                break
+        return _normalize(And, [_normalize(Or, nodes), *excluded])
+
+    def parse_and(self) -> Optional[Node]:
+        nodes = [self.parse_unary()]
+        while True:
+            if self.peek_keyword() == "AND":
+                self.pos += 1
+            elif not (self.default_op == "AND" and self.at_operand()):
+                break
+            nodes.append(self.parse_unary())
+        return _normalize(And, nodes)
+
+    def parse_unary(self) -> Optional[Node]:
+        if self.peek_keyword() == "NOT":
+            self.pos += 1
+            child = self.parse_unary()
+            return Not(child) if child is not None else None
+        return self.parse_near()
+
+    def parse_near(self) -> Optional[Node]:
+        node = self.parse_primary()
+        while True:
+            lexeme = self.peek()
+            near = _NEAR.match(lexeme[1]) if lexeme and lexeme[0] == "word" else None
+            if not near:
+                return node
+            self.pos += 1
+            other = self.parse_primary()
+            if isinstance(node, Term) and isinstance(other, Term) and node.field == other.field:
+                node = PositionalClause((node.term, other.term), ordered=False,
+                                        distance=int(near.group(1)), field=node.field)
+            else:
+                # NEAR only relates two single terms; otherwise require both
+                node = _normalize(And, [node, other])
+
+    def parse_primary(self, field: Optional[str] = None) -> Optional[Node]:
+        lexeme = self.peek()
+        if lexeme is None or lexeme[0] == ")" or self.peek_keyword() in ("AND", "OR"):
+            return None
+        kind, text = lexeme
+        self.pos += 1
+
+        if kind == "(":
+            node = self.parse_group(field)
+            if self.peek() is not None and self.peek()[0] == ")":
+                self.pos += 1
+            return node
+        if kind == "phrase":
+            return _phrase(tokenize_text(text), field)
+
+        name, colon, rest = text.partition(":")
+        if colon and name.lower() in FIELDS:
+            if rest:
+                return _phrase(tokenize_text(rest), name.lower())
+            # "field:" applies to the phrase or group that follows
+            return self.parse_primary(name.lower())
+        return _phrase(tokenize_text(text), field)
+
+    def parse_group(self, field: Optional[str]) -> Optional[Node]:
+        node = self.parse_or()
+        return _with_field(node, field) if field is not None else node
+
+
+def _phrase(terms: List[str], field: Optional[str]) -> Optional[Node]:
+    if not terms:
+        return None
+    if len(terms) == 1:
+        return Term(terms[0], field)
+    return PositionalClause(tuple(terms), ordered=True, field=field)
+
+
+def _with_field(node: Optional[Node], field: str) -> Optional[Node]:
+    """Apply a field prefix to the terms of a parenthesized group"""
+    if node is None:
+        return None
+    if isinstance(node, Term):
+        return node._replace(field=field)
+    if isinstance(node, PositionalClause):
+        return node._replace(field=field)
+    if isinstance(node, Not):
+        return Not(_with_field(node.child, field))
+    return _normalize(type(node), [_with_field(child, field) for child in node.children])
+
+
+def parse_query(query: str, default_op: str = "AND") -> Optional[Node]:
+    """Parse a query into a normalized tree; None if it has no searchable terms
+
+    ``default_op`` joins adjacent operands. The legacy ``NOT`` operation
+    matches documents containing none of the query's terms.
+    """
+    if default_op == "NOT":
+        node = _Parser(query, "OR").parse()
+        return Not(node) if node is not None else None
+    return _Parser(query, default_op).parse()
+
+
+def positive_terms(node: Optional[Node]) -> List[str]:
+    """Terms a matching document contains, for highlighting; skips NOT subtrees"""
+    terms = []
+
+    def walk(node):
+        if isinstance(node, Term):
+            terms.append(node.term)
+        elif isinstance(node, PositionalClause):
+            terms.extend(node.terms)
+        elif isinstance(node, (And, Or)):
+            for child in node.children:
+                walk(child)
+
+    walk(node)
+    return list(dict.fromkeys(terms))
+
+
+def query_terms(node: Optional[Node]) -> List[str]:
+    """Every distinct term in the tree, NOT subtrees included"""
+    terms = []
+
+    def walk(node):
+        if isinstance(node, Term):
+            terms.append(node.term)
+        elif isinstance(node, PositionalClause):
+            terms.extend(node.terms)
+        elif isinstance(node, Not):
+            walk(node.child)
+        elif isinstance(node, (And, Or)):
+            for child in node.children:
+                walk(child)
+
+    walk(node)
+    return list(dict.fromkeys(terms))
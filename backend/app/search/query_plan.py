@@ -0,0 +1,441 @@
+"""Execution plans for parsed boolean queries
+
+``compile_plan`` turns a query tree (see app.search.query_parser) into a tree
+of document-at-a-time cursors over postings ordered by document ordinal:
+
+- AND leapfrogs its children from the one with the fewest postings, every
+  skip a galloping search (``TermCursor.advance_to``), so an intersection
+  costs about as much as its rarest term.
+- NOT is a streaming exclusion: the positive clause proposes documents and
+  each excluded clause is only advanced to them. Only a query with nothing
+  but exclusions runs over every document, and with all scores 0 it stops
+  after the first k.
+- Phrases and NEAR clauses are two-phase: the intersection of their terms
+  proposes candidates with a score bound and positions are checked best
+  bound first, only until no remaining candidate can enter the top k.
+- A term or clause without a field is the OR of it in each of the source's
+  fields, so its score is the sum of the field scores.
+
+Cursors share ``TermCursor``'s interface: ``doc``, ``next``, ``advance_to``,
+``reset``, ``cost`` (postings to walk), ``upper_bound``, plus ``bound`` (a
+score bound at the current document, before any check), ``matches`` (the
+check), ``score`` (the exact score of a match), ``verifies`` (whether
+``matches`` can fail) and ``prefetch`` (a hint of documents to be checked). Plans of plain terms are handed to
+the WAND top-k in app.search.wand.
+
+``evaluate_postings`` evaluates the same trees set-at-a-time over in-memory
+{doc: score} postings, for backends without ordinal postings.
+"""
+from typing import AbstractSet, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from app.index.fields import BODY
+from app.search.positional import PositionalClause
+from app.search.query_parser import And, Node, Not, Or, Term
+from app.search.wand import END, TermCursor, _TopK, top_k_and, top_k_or
+
+# Positions of a term at a cursor's current document; a reader may also
+# have prefetch(doc_ordinals) to load a batch of documents at once
+PositionsReader = Callable[[TermCursor], Sequence[int]]
+# Largest batch of candidates checked between plan resets
+VERIFY_BATCH_SIZE = 1000
+
+
+class AllDocsCursor(TermCursor):
+    """Every document, scoring 0: the positive side of a purely negative clause"""
+
+    __slots__ = ()
+
+    def __init__(self, ordinals: Sequence[int]):
+        super().__init__(ordinals, (), 0.0, 0.0)
+
+    def score(self) -> float:
+        return 0.0
+
+    bound = score
+
+
+class AndCursor:
+    """Documents on which every child is positioned"""
+
+    def __init__(self, children: List):
+        # Lead with the child that has the fewest postings
+        self.children = sorted(children, key=lambda child: child.cost)
+        self.lead, self.others = self.children[0], self.children[1:]
+        self.cost = self.lead.cost
+        self.upper_bound = sum(child.upper_bound for child in children)
+        self.verifies = any(child.verifies for child in children)
+        self.doc = END
+        self._align()
+
+    def _align(self):
+        lead = self.lead
+        while lead.doc != END:
+            target = lead.doc
+            for cursor in self.others:
+                cursor.advance_to(target)
+                if cursor.doc != target:
+                    break
+            else:
+                self.doc = target
+                return
+            if cursor.doc == END:
+                break
+            lead.advance_to(cursor.doc)
+        self.doc = END
+
+    def next(self):
+        self.lead.next()
+        self._align()
+
+    def advance_to(self, target: int):
+        if self.doc < target:
+            self.lead.advance_to(target)
+            self._align()
+
+    def reset(self):
+        for child in self.children:
+            child.reset()
+        self._align()
+
+    def prefetch(self, doc_ordinals: Sequence[int]):
+        for child in self.children:
+            child.prefetch(doc_ordinals)
+
+    def bound(self) -> float:
+        return sum(child.bound() for child in self.children)
+
+    def matches(self) -> bool:
+        return all(child.matches() for child in self.children)
+
+    def score(self) -> float:
+        return sum(child.score() for child in self.children)
+
+
+class OrCursor:
+    """Documents on which any child is positioned"""
+
+    def __init__(self, children: List):
+        self.children = children
+        self.cost = sum(child.cost for child in children)
+        self.upper_bound = sum(child.upper_bound for child in children)
+        self.verifies = any(child.verifies for child in children)
+        self.doc = min(child.doc for child in children)
+
+    # next, advance_to and score run per document of e.g. a term matched in
+    # several fields, so they are plain loops rather than generators
+    def next(self):
+        doc, first = self.doc, END
+        for child in self.children:
+            if child.doc == doc:
+                child.next()
+            if child.doc < first:
+                first = child.doc
+        self.doc = first
+
+    def advance_to(self, target: int):
+        if self.doc < target:
+            first = END
+            for child in self.children:
+                child.advance_to(target)
+                if child.doc < first:
+                    first = child.doc
+            self.doc = first
+
+    def reset(self):
+        for child in self.children:
+            child.reset()
+        self.doc = min(child.doc for child in self.children)
+
+    def prefetch(self, doc_ordinals: Sequence[int]):
+        for child in self.children:
+            child.prefetch(doc_ordinals)
+
+    def bound(self) -> float:
+        return sum(child.bound() for child in self.children if child.doc == self.doc)
+
+    def matches(self) -> bool:
+        return any(child.doc == self.doc and child.matches() for child in self.children)
+
+    def score(self) -> float:
+        doc, total = self.doc, 0.0
+        for child in self.children:
+            if child.doc == doc and (not child.verifies or child.matches()):
+                total += child.score()
+        return total
+
+
+class AndNotCursor:
+    """Documents of ``positive`` on which no ``negatives`` child matches"""
+
+    def __init__(self, positive, negatives: List):
+        self.positive = positive
+        self.negatives = negatives
+        self.cost = positive.cost
+        self.upper_bound = positive.upper_bound
+        self.verifies = positive.verifies
+        self.doc = END
+        self._skip_excluded()
+
+    def _skip_excluded(self):
+        positive = self.positive
+        while positive.doc != END:
+            doc = positive.doc
+            for negative in self.negatives:
+                negative.advance_to(doc)
+                if negative.doc == doc and negative.matches():
+                    break
+            else:
+                self.doc = doc
+                return
+            positive.next()
+        self.doc = END
+
+    def next(self):
+        self.positive.next()
+        self._skip_excluded()
+
+    def advance_to(self, target: int):
+        if self.doc < target:
+            self.positive.advance_to(target)
+            self._skip_excluded()
+
+    def reset(self):
+        self.positive.reset()
+        for negative in self.negatives:
+            negative.reset()
+        self._skip_excluded()
+
+    def prefetch(self, doc_ordinals: Sequence[int]):
+        self.positive.prefetch(doc_ordinals)
+        for negative in self.negatives:
+            negative.prefetch(doc_ordinals)
+
+    def bound(self) -> float:
+        return self.positive.bound()
+
+    def matches(self) -> bool:
+        return self.positive.matches()
+
+    def score(self) -> float:
+        return self.positive.score()
+
+
+class PositionalCursor(AndCursor):
+    """Documents containing every clause term, checked against their positions"""
+
+    def __init__(self, clause: PositionalClause, cursors: Dict[str, TermCursor],
+                 positions: Dict[str, PositionsReader]):
+        super().__init__(list(cursors.values()))
+        self.clause = clause
+        self.cursors = cursors
+        self.positions = positions
+        self.verifies = True
+        self._checked = (END, False)
+
+    def prefetch(self, doc_ordinals: Sequence[int]):
+        for reader in self.positions.values():
+            if hasattr(reader, "prefetch"):
+                reader.prefetch(doc_ordinals)
+
+    def matches(self) -> bool:
+        # OR and exclusion may ask twice for the same document
+        doc, matched = self._checked
+        if doc != self.doc:
+            matched = self.clause.matches([
+                self.positions[term](self.cursors[term]) for term in self.clause.terms
+            ])
+            self._checked = (self.doc, matched)
+        return matched
+
+
+class PlanSource:
+    """What a plan needs from an index; implemented by the search backends"""
+
+    # Fields a term or clause without a field prefix is matched in
+    fields: Tuple[str, ...] = (BODY,)
+
+    def term_cursor(self, term: str, field: str) -> Optional[TermCursor]:
+        """Scoring cursor over a term's postings, None if the term is not indexed"""
+        raise NotImplementedError
+
+    def positions(self, term: str, field: str, cursor: TermCursor) -> PositionsReader:
+        """Reader of the term's positions at ``cursor``'s document"""
+        raise NotImplementedError
+
+    def all_docs(self) -> Sequence[int]:
+        """Ascending ordinals of every document"""
+        raise NotImplementedError
+
+
+def compile_plan(node: Optional[Node], source: PlanSource):
+    """Build the cursor tree for a query; None when nothing can match
+
+    As the search always has, AND skips plain terms missing from the index;
+    a phrase or NEAR clause with a missing term matches nothing.
+    """
+    if node is None:
+        return None
+    if isinstance(node, Term):
+        if node.field is None:
+            return _any_field([source.term_cursor(node.term, field) for field in source.fields])
+        return source.term_cursor(node.term, node.field)
+    if isinstance(node, PositionalClause):
+        if node.field is None:
+            return _any_field([_positional_cursor(node._replace(field=field), source) for field in source.fields])
+        return _positional_cursor(node, source)
+    if isinstance(node, Not):
+        return _exclude(AllDocsCursor(source.all_docs()), [compile_plan(node.child, source)])
+    if isinstance(node, And):
+        positives = [child for child in node.children if not isinstance(child, Not)]
+        cursors = []
+        for child in positives:
+            cursor = compile_plan(child, source)
+            if cursor is not None:
+                cursors.append(cursor)
+            elif not isinstance(child, Term):
+                return None
+        if positives and not cursors:
+            return None
+        negatives = [compile_plan(child.child, source) for child in node.children if isinstance(child, Not)]
+        if not cursors:
+            positive = AllDocsCursor(source.all_docs())
+        else:
+            positive = AndCursor(cursors) if len(cursors) > 1 else cursors[0]
+        return _exclude(positive, negatives)
+    cursors = [cursor for cursor in (compile_plan(child, source) for child in node.children) if cursor is not None]
+    if not cursors:
+        return None
+    return OrCursor(cursors) if len(cursors) > 1 else cursors[0]
+
+
+def _any_field(cursors: List):
+    cursors = [cursor for cursor in cursors if cursor is not None]
+    if not cursors:
+        return None
+    return OrCursor(cursors) if len(cursors) > 1 else cursors[0]
+
+
+def _exclude(positive, negatives: List):
+    negatives = [negative for negative in negatives if negative is not None]
+    return AndNotCursor(positive, negatives) if negatives else positive
+
+
+def _positional_cursor(clause: PositionalClause, source: PlanSource) -> Optional[PositionalCursor]:
+    cursors = {}
+    for term in dict.fromkeys(clause.terms):
+        cursor = source.term_cursor(term, clause.field)
+        if cursor is None:
+            return None
+        cursors[term] = cursor
+    positions = {term: source.positions(term, clause.field, cursor) for term, cursor in cursors.items()}
+    return PositionalCursor(clause, cursors, positions)
+
+
+def top_k(plan, k: int, deleted: AbstractSet[int] = frozenset()) -> List[Tuple[int, float]]:
+    """Return the k highest scoring matches of a plan, best first, never one in ``deleted``"""
+    if plan is None or k <= 0:
+        return []
+    if _term_cursors(plan) is not None:
+        return top_k_or(_term_cursors(plan), k, deleted)
+    if type(plan) is AndCursor and all(_term_cursors(child) is not None for child in plan.children):
+        # A term matched in several fields joins the intersection as one OR
+        return top_k_and(plan.children, k, deleted)
+    if type(plan) is OrCursor and all(_term_cursors(child) is not None for child in plan.children):
+        return top_k_or([cursor for child in plan.children for cursor in _term_cursors(child)], k, deleted)
+    if plan.verifies:
+        return _top_k_best_first(plan, k, deleted)
+
+    top = _TopK(k, deleted)
+    while plan.doc != END:
+        threshold = top.threshold
+        if plan.upper_bound <= threshold:
+            break
+        # Documents are visited in ordinal order, so a later tie cannot enter
+        if plan.bound() > threshold and plan.matches():
+            top.offer(plan.doc, plan.score())
+        plan.next()
+    return top.results()
+
+
+def _term_cursors(cursor) -> Optional[List[TermCursor]]:
+    """The term cursors a plain term's cursor sums, over one field or several"""
+    if type(cursor) is TermCursor:
+        return [cursor]
+    if type(cursor) is OrCursor and all(type(child) is TermCursor for child in cursor.children):
+        return cursor.children
+    return None
+
+
+def _top_k_best_first(plan, k: int, deleted: AbstractSet[int]) -> List[Tuple[int, float]]:
+    """Top k of a plan with positional checks, checking the best candidates first
+
+    Candidates and their score bounds come from the postings alone. They are
+    then checked in descending bound order, a growing batch at a time (in
+    ordinal order within a batch, after a reset of the plan), until no
+    remaining bound can enter the top k. A common phrase thus checks about
+    as many documents as it returns.
+    """
+    candidates = []
+    while plan.doc != END:
+        if plan.doc not in deleted:
+            candidates.append((plan.bound(), -plan.doc))
+        plan.next()
+    candidates.sort(reverse=True)
+
+    top = _TopK(k, deleted)
+    start, batch_size = 0, max(k, 16) * 4
+    while start < len(candidates):
+        if len(top.heap) == k and candidates[start] <= top.heap[0]:
+            break
+        batch = sorted(-neg_doc for _, neg_doc in candidates[start:start + batch_size])
+        start += batch_size
+        batch_size = min(batch_size * 2, VERIFY_BATCH_SIZE)
+        plan.reset()
+        plan.prefetch(batch)
+        for doc in batch:
+            plan.advance_to(doc)
+            if plan.doc == doc and plan.matches():
+                top.offer(doc, plan.score())
+    return top.results()
+
+
+def evaluate_postings(node: Optional[Node], postings: Mapping[str, Dict[Hashable, float]],
+                      all_docs: Callable[[], Iterable[Hashable]]) -> Dict[Hashable, float]:
+    """Evaluate a query set-at-a-time over {doc: score} postings per term
+
+    Scores are summed over matching terms. Intersections probe the smaller
+    side, exclusions filter the positive side, and ``all_docs`` is called
+    only for a clause with nothing but exclusions. There are no positions, so
+    phrases and NEAR clauses match like an AND of their terms.
+    """
+    if node is None:
+        return {}
+    if isinstance(node, Term):
+        return postings.get(node.term) or {}
+    if isinstance(node, PositionalClause):
+        return evaluate_postings(And(tuple(Term(term) for term in dict.fromkeys(node.terms))), postings, all_docs)
+    if isinstance(node, Not):
+        excluded = evaluate_postings(node.child, postings, all_docs)
+        return {doc: 0.0 for doc in all_docs() if doc not in excluded}
+    if isinstance(node, Or):
+        scores = {}
+        for child in node.children:
+            for doc, score in evaluate_postings(child, postings, all_docs).items():
+                scores[doc] = scores.get(doc, 0.0) + score
+        return scores
+
+    positives = sorted(
+        (evaluate_postings(child, postings, all_docs) for child in node.children if not isinstance(child, Not)),
+        key=len
+    )
+    negatives = [evaluate_postings(child.child, postings, all_docs)
+                 for child in node.children if isinstance(child, Not)]
+    if positives:
+        smallest, others = positives[0], positives[1:]
+        scores = {
+            doc: score + sum(other[doc] for other in others)
+            for doc, score in smallest.items() if all(doc in other for other in others)
+        }
+    else:
+        scores = {doc: 0.0 for doc in all_docs()}
+    return {doc: score for doc, score in scores.items() if not any(doc in negative for negative in negatives)}
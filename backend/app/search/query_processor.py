@@ -1,8 +1,11 @@
 import os
 import json
-from collections import defaultdict
+import heapq
 from typing import List, Dict
-from app.utilts.tokenizer import tokenize_text
+from app.search.query_parser import parse_query, positive_terms
+from app.search.query_plan import evaluate_postings
+from app.search.snippets import Match, densest_window, render_snippet, snippet_range
+from app.utilts.tokenizer import tokenize_with_offsets
 import redis
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
@@ -22,50 +25,46 @@ def load_docs():
 
 docs = load_docs()
 
-def generate_snippet(doc, terms):
-    full_path = os.path.join(DOC_PATH.replace("/tokens", "/docs"), f"{doc['id']}.json")
-    with open(full_path) as f:
-        original = json.load(f)["text"]
-    for term in terms:
-        if term in original:
-            idx = original.lower().index(term)
-            start = max(0, idx - 50)
-            end = min(len(original), idx + 50)
-            return original[start:end] + "..."
-    return original[:100] + "..."
+def generate_snippet(doc, terms, text_cache):
+    # Original text is read once per document per request
+    if doc['id'] not in text_cache:
+        full_path = os.path.join(DOC_PATH.replace("/tokens", "/docs"), f"{doc['id']}.json")
+        with open(full_path) as f:
+            text_cache[doc['id']] = json.load(f)["text"]
+    original = text_cache[doc['id']]
 
-def search(query: str, op: str = "AND") -> List[Dict]:
-    tokens = tokenize_text(query)
-    scores = defaultdict(float)
-    doc_sets = []
-
-    for token in tokens:
-        if token in tfidf_index:
-            doc_sets.append(set(tfidf_index[token].keys()))
-            for doc_id, score in tfidf_index[token].items():
-                scores[doc_id] += score
+    terms = set(terms)
+    matches = [
+        Match(position, token, start, end)
+        for position, (token, start, end) in enumerate(tokenize_with_offsets(original))
+        if token in terms
+    ]
+    if not matches:
+        return original[:100] + "..."
+    first, last = densest_window(matches)
+    window = matches[first:last]
+    start, end = snippet_range(window)
+    snippet, _ = render_snippet(original[start:end], start, window, end >= len(original))
+    return snippet
 
-    if not doc_sets:
+def search(query: str, op: str = "AND") -> List[Dict]:
+    query_tree = parse_query(query, op)
+    if query_tree is None:
         return []
+    tokens = positive_terms(query_tree)
 
-    if op == "AND":
-        matched_docs = set.intersection(*doc_sets)
-    elif op == "OR":
-        matched_docs = set.union(*doc_sets)
-    elif op == "NOT":
-        all_docs = set(docs.keys())
-        matched_docs = all_docs - set.union(*doc_sets)
-    else:
-        matched_docs = set.union(*doc_sets)
+    # NOT subtracts from the positive clause; only a query of exclusions
+    # alone starts from every document
+    scores = evaluate_postings(query_tree, tfidf_index, lambda: map(str, docs))
 
-    # Return top 10 sorted by TF-IDF score
-    ranked = sorted(matched_docs, key=lambda d: scores[str(d)], reverse=True)
-    
+    # Return top 10 by TF-IDF score without sorting every match
+    ranked = heapq.nlargest(10, scores, key=scores.get)
 
     results = []
-    for doc_id in ranked[:10]:
+    text_cache = {}
+    for doc_id in ranked:
         doc = docs[int(doc_id)]
-        snippet = generate_snippet(doc, tokens)
+        snippet = generate_snippet(doc, tokens, text_cache)
         results.append({
             "id": doc["id"],
             "title": doc["title"],
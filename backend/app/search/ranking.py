@@ -0,0 +1,57 @@
+"""Ranking functions and precomputed BM25 impacts
+
+BM25 scores a posting as ``idf * tf * (k1 + 1) / (tf + K_d)`` where the
+per-document norm ``K_d = k1 * (1 - b + b * length / avg_length)`` depends
+only on the document. When a segment is published the term-frequency part
+of every posting is precomputed and quantized to one byte (an *impact*), so
+query-time scoring is a lookup and a multiply-add per posting with the
+term's IDF folded into a single multiplier.
+"""
+from array import array
+from typing import Dict, Sequence, Tuple
+import math
+
+RANKINGS = ("tfidf", "bm25")
+
+# Impacts are stored as uint8 levels of tf * (k1 + 1) / (tf + K_d), which
+# lies in [0, k1 + 1)
+IMPACT_LEVELS = 255
+
+
+def tfidf_idf(total_docs: int, doc_freq: int) -> float:
+    return math.log(total_docs / doc_freq) if doc_freq else 0.0
+
+
+def bm25_idf(total_docs: int, doc_freq: int) -> float:
+    # The "+ 1" keeps IDF positive for terms in more than half the documents
+    return math.log(1 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def doc_norm(length: int, avg_length: float, k1: float, b: float) -> float:
+    """Per-document BM25 length normalisation K_d"""
+    return k1 * (1 - b + b * length / avg_length) if avg_length else k1
+
+
+def impact_scale(k1: float) -> float:
+    """Score units represented by one impact level"""
+    return (k1 + 1) / IMPACT_LEVELS
+
+
+def bm25_tf_weights(doc_ordinals: Sequence[int], term_freqs: Sequence[int],
+                    doc_norms: Dict[int, float], k1: float) -> array:
+    """Unquantized BM25 term-frequency weights for a postings list"""
+    return array("d", (
+        tf * (k1 + 1) / (tf + doc_norms.get(ordinal, k1))
+        for ordinal, tf in zip(doc_ordinals, term_freqs)
+    ))
+
+
+def quantize_impacts(doc_ordinals: Sequence[int], term_freqs: Sequence[int],
+                     doc_norms: Dict[int, float], k1: float) -> Tuple[bytes, int]:
+    """Return one impact byte per posting and the largest impact"""
+    scale = impact_scale(k1)
+    impacts = array("B", (
+        min(IMPACT_LEVELS, max(1, round(weight / scale)))
+        for weight in bm25_tf_weights(doc_ordinals, term_freqs, doc_norms, k1)
+    ))
+    return impacts.tobytes(), max(impacts, default=0)
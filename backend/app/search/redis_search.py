@@ -1,51 +1,221 @@
+"""Search backend serving TF-IDF postings from Redis
+
+Key layout:
+
+    postings:{term}   sorted set, doc id -> TF-IDF score (set_ops mode)
+    tfidf:{term}      hash, doc id -> TF-IDF score (hash mode)
+    meta:{doc_id}     hash with the result fields title, url and snippet
+    docs              set of all doc ids
+
+Loading writes keys through pipelines in batches. Queries use the boolean
+language of app.search.query_parser. A query makes two round trips: one
+pipeline for the postings and one for the metadata of the page of results.
+With ``set_ops`` the query tree is compiled to ZINTERSTORE/ZUNIONSTORE and
+ZDIFFSTORE (Redis >= 6.2) over scratch keys, so combination and scoring run
+inside Redis and only the top results cross the network; otherwise the
+postings hashes are fetched and combined in Python. NOT subtracts from the
+positive clause it sits in; only a query made of exclusions alone reads the
+``docs`` set. Redis holds no positions, so phrases match as AND.
+"""
+from heapq import nlargest
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+import uuid
+
 import redis
-from app.utilts.tokenizer import tokenize_text
-import json
-# Redis connection
-r = redis.Redis(host="localhost", port=6379, decode_responses=True)
-
-def search_redis_query(query: str, op="AND") -> list[dict]:
-    tokens = tokenize_text(query)
-    scores = {}
-    doc_sets = []
-
-    for token in tokens:
-        tfidf_postings = r.hgetall(f"tfidf:{token}")
-        doc_sets.append(set(tfidf_postings.keys()))
-        for doc_id, score in tfidf_postings.items():
-            scores[doc_id] = scores.get(doc_id, 0) + float(score)
-
-    if not doc_sets:
-        return []
-
-    # Combine based on op
-    if op == "AND":
-        matched = set.intersection(*doc_sets)
-    elif op == "OR":
-        matched = set.union(*doc_sets)
-    elif op == "NOT":
-        all_docs = r.smembers("docs")
-        matched = set(all_docs) - set.union(*doc_sets)
-    else:
-        matched = set.union(*doc_sets)
-
-    # Sort by TF-IDF score
-    ranked = sorted(matched, key=lambda d: scores.get(d, 0), reverse=True)
-    results = []
-    for doc_id in ranked[:10]:
-        title = r.get(f"title:{doc_id}")
-
-        doc_json = r.get(f"doc:{doc_id}")
-        url = json.loads(doc_json)["url"] if doc_json else None
-
-        snippet_raw = r.get(f"tokens:{doc_id}")
-        snippet = snippet_raw[:100] + "..." if snippet_raw else "Snippet not available"
-
-        results.append({
-            "id": doc_id,
-            "title": title,
-            "url": url,
-            "snippet": snippet
-        })
-
-    return results
+
+from app.config import settings
+from app.metrics import SearchTimer, mark_stage
+from app.search.positional import PositionalClause
+from app.search.query_parser import And, Node, Not, Or, Term, parse_query, query_terms
+from app.search.query_plan import evaluate_postings
+
+META_FIELDS = ("title", "url", "snippet")
+DOCS_KEY = "docs"
+
+
+def postings_key(term: str) -> str:
+    return f"postings:{term}"
+
+
+def hash_postings_key(term: str) -> str:
+    return f"tfidf:{term}"
+
+
+def meta_key(doc_id: str) -> str:
+    return f"meta:{doc_id}"
+
+
+def _batches(items: Iterable, size: int):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def top_scores(scores: Dict[str, float], limit: int) -> List[Tuple[str, float]]:
+    """Highest scores first; ties go to the larger doc id, as in ZREVRANGE"""
+    return nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+class RedisIndex:
+    """Loads the search index into Redis and answers queries from it"""
+
+    def __init__(self, client: Optional[redis.Redis] = None, set_ops: Optional[bool] = None):
+        self.client = client or redis.Redis.from_url(settings.redis_url, decode_responses=True)
+        self.set_ops = settings.redis_set_ops if set_ops is None else set_ops
+
+    def load_postings(self, postings: Iterable[Tuple[str, Dict[str, float]]],
+                      batch_size: Optional[int] = None) -> int:
+        """Replace the postings of each (term, {doc_id: score}); returns terms loaded"""
+        batch_size = batch_size or settings.redis_load_batch_size
+        count = 0
+        for batch in _batches(postings, batch_size):
+            pipe = self.client.pipeline(transaction=False)
+            for term, scores in batch:
+                key = postings_key(term) if self.set_ops else hash_postings_key(term)
+                pipe.delete(key)
+                if not scores:
+                    continue
+                if self.set_ops:
+                    pipe.zadd(key, scores)
+                else:
+                    pipe.hset(key, mapping=scores)
+            pipe.execute()
+            count += len(batch)
+        return count
+
+    def load_doc_freqs(self, doc_freqs: Dict[str, int], batch_size: Optional[int] = None):
+        """Store df:{term} document frequencies with one MSET per batch"""
+        batch_size = batch_size or settings.redis_load_batch_size
+        for batch in _batches(doc_freqs.items(), batch_size):
+            self.client.mset({f"df:{term}": freq for term, freq in batch})
+
+    def load_documents(self, documents: Iterable[Dict], batch_size: Optional[int] = None) -> int:
+        """Store result metadata for documents with an "id" and META_FIELDS"""
+        batch_size = batch_size or settings.redis_load_batch_size
+        count = 0
+        for batch in _batches(documents, batch_size):
+            pipe = self.client.pipeline(transaction=False)
+            for doc in batch:
+                pipe.hset(meta_key(doc["id"]), mapping={field: doc.get(field) or "" for field in META_FIELDS})
+            pipe.sadd(DOCS_KEY, *(doc["id"] for doc in batch))
+            pipe.execute()
+            count += len(batch)
+        return count
+
+    def search(self, query: str, op: str = "AND", limit: int = 10) -> List[Dict]:
+        """Top results for a query
+        
+        Timed stages (see app.metrics): ``parse``, then ``rank`` for the
+        server-side set operations, or ``fetch`` and ``combine`` for the
+        client-side evaluation, then ``hydrate``.
+        """
+        query_tree = parse_query(query, op)
+        mark_stage("parse")
+        if query_tree is None:
+            return []
+        if self.set_ops:
+            ranked = self._top_server_side(query_tree, limit)
+            mark_stage("rank")
+        else:
+            ranked = self._top_client_side(query_tree, limit)
+        results = self._hydrate(ranked)
+        mark_stage("hydrate")
+        return results
+
+    def _top_server_side(self, query_tree: Node, limit: int) -> List[Tuple[str, float]]:
+        if isinstance(query_tree, Term):
+            return self.client.zrevrange(postings_key(query_tree.term), 0, limit - 1, withscores=True)
+
+        # Combine into scratch keys, read the top and drop them in one MULTI
+        pipe = self.client.pipeline(transaction=True)
+        scratch = []
+        key = self._store(pipe, query_tree, scratch)
+        if not scratch:
+            # Nothing to combine, such as a phrase of one repeated term:
+            # every queued command writes a scratch key, so none are queued
+            return self.client.zrevrange(key, 0, limit - 1, withscores=True)
+        pipe.zrevrange(key, 0, limit - 1, withscores=True)
+        pipe.delete(*scratch)
+        return pipe.execute()[-2]
+
+    def _store(self, pipe, node: Node, scratch: List[str]) -> str:
+        """Queue the commands that leave ``node``'s scored documents in a key"""
+        if isinstance(node, Term):
+            return postings_key(node.term)
+        if isinstance(node, PositionalClause):
+            # No positions in Redis: a phrase matches like an AND of its terms
+            node = And(tuple(Term(term) for term in dict.fromkeys(node.terms)))
+            if len(node.children) == 1:
+                return postings_key(node.children[0].term)
+
+        key = f"search:{uuid.uuid4().hex}"
+        scratch.append(key)
+        if isinstance(node, Not):
+            pipe.zdiffstore(key, [DOCS_KEY, self._store(pipe, node.child, scratch)])
+        elif isinstance(node, Or):
+            pipe.zunionstore(key, [self._store(pipe, child, scratch) for child in node.children], aggregate="SUM")
+        else:
+            # Exclusions are subtracted from the positive clause only
+            positives = [self._store(pipe, child, scratch) for child in node.children if not isinstance(child, Not)]
+            negatives = [self._store(pipe, child.child, scratch) for child in node.children if isinstance(child, Not)]
+            if len(positives) > 1:
+                pipe.zinterstore(key, positives, aggregate="SUM")
+                positive = key
+            else:
+                positive = positives[0] if positives else DOCS_KEY
+            if negatives:
+                pipe.zdiffstore(key, [positive, *negatives])
+            elif positive != key:
+                return positive
+        return key
+
+    def _top_client_side(self, query_tree: Node, limit: int) -> List[Tuple[str, float]]:
+        terms = query_terms(query_tree)
+        pipe = self.client.pipeline(transaction=False)
+        for term in terms:
+            pipe.hgetall(hash_postings_key(term))
+        postings = {
+            term: {doc_id: float(score) for doc_id, score in reply.items()}
+            for term, reply in zip(terms, pipe.execute())
+        }
+        mark_stage("fetch")
+        # Only a clause with nothing but exclusions needs every document
+        all_docs = lambda: self.client.smembers(DOCS_KEY)
+        ranked = top_scores(evaluate_postings(query_tree, postings, all_docs), limit)
+        mark_stage("combine")
+        return ranked
+
+    def _hydrate(self, ranked: List[Tuple[str, float]]) -> List[Dict]:
+        if not ranked:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for doc_id, _ in ranked:
+            pipe.hmget(meta_key(doc_id), META_FIELDS)
+        results = []
+        for (doc_id, _), (title, url, snippet) in zip(ranked, pipe.execute()):
+            results.append({
+                "id": doc_id,
+                "title": title,
+                "url": url,
+                "snippet": snippet or "Snippet not available"
+            })
+        return results
+
+
+_redis_index: Optional[RedisIndex] = None
+
+
+def get_redis_index() -> RedisIndex:
+    global _redis_index
+    if _redis_index is None:
+        _redis_index = RedisIndex()
+    return _redis_index
+
+
+def search_redis_query(query: str, op="AND", limit: int = 10) -> list[dict]:
+    with SearchTimer("redis"):
+        return get_redis_index().search(query, op, limit)
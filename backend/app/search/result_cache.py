@@ -0,0 +1,157 @@
+"""Search result cache with index-generation-aware invalidation
+
+Results are cached per (normalized query tree, limit, ranking, highlight) in
+an in-process LRU and, optionally, in Redis so that API workers share them.
+Every entry is stored under the index generation read before the search ran
+(see app.index.generation); once the index changes lookups use the new
+generation, so stale entries are never returned and simply age out of the
+LRU or expire in Redis.
+"""
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import threading
+
+import redis
+
+from app.config import settings
+from app.index.generation import bump_generation, current_generation
+from app.metrics import RESULT_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "search-cache"
+_CACHE_HITS = RESULT_CACHE_LOOKUPS.labels("hit")
+_CACHE_REDIS_HITS = RESULT_CACHE_LOOKUPS.labels("redis_hit")
+_CACHE_MISSES = RESULT_CACHE_LOOKUPS.labels("miss")
+
+
+def cache_key(query: Hashable, limit: int, ranking: str, highlight: bool) -> Tuple:
+    """Key a parsed query (see app.search.query_parser), whose normal form
+    already makes reordered or repeated terms share an entry"""
+    return (query, limit, ranking, bool(highlight))
+
+
+def _copy(results: List[Dict]) -> List[Dict]:
+    # Callers may annotate result dicts; keep the cached ones intact
+    return [dict(result) for result in results]
+
+
+class ResultCache:
+    """Two-tier result cache: an in-process LRU in front of optional Redis"""
+
+    def __init__(self, max_entries: Optional[int] = None, redis_client: Optional[redis.Redis] = None,
+                 redis_ttl: Optional[int] = None):
+        self.max_entries = settings.search_cache_size if max_entries is None else max_entries
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl or settings.search_cache_redis_ttl
+        self._entries: "OrderedDict[Tuple, List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, key: Tuple) -> str:
+        # key is (generation, query key)
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return f"{REDIS_KEY_PREFIX}:{digest}"
+
+    def get(self, key: Hashable, generation: int) -> Optional[List[Dict]]:
+        key = (generation, key)
+        with self._lock:
+            results = self._entries.get(key)
+            if results is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                _CACHE_HITS.inc()
+                return _copy(results)
+
+        if self.redis is not None:
+            try:
+                cached = self.redis.get(self._redis_key(key))
+            except redis.RedisError as e:
+                logger.warning(f"Result cache lookup failed: {e}")
+                cached = None
+            if cached is not None:
+                results = json.loads(cached)
+                self._put_local(key, results)
+                with self._lock:
+                    self.redis_hits += 1
+                _CACHE_REDIS_HITS.inc()
+                return _copy(results)
+
+        with self._lock:
+            self.misses += 1
+        _CACHE_MISSES.inc()
+        return None
+
+    def put(self, key: Hashable, generation: int, results: List[Dict]):
+        key = (generation, key)
+        results = _copy(results)
+        self._put_local(key, results)
+        if self.redis is not None:
+            try:
+                self.redis.set(self._redis_key(key), json.dumps(results), ex=self.redis_ttl)
+            except (redis.RedisError, TypeError, ValueError) as e:
+                logger.warning(f"Result cache store failed: {e}")
+
+    def _put_local(self, key: Tuple, results: List[Dict]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        generation = current_generation(settings.index_dir)
+        with self._lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0,
+                "generation": generation,
+            }
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Process-wide result cache, or None when both tiers are disabled"""
+    global _result_cache
+    if settings.search_cache_size <= 0 and not settings.search_cache_redis:
+        return None
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                client = None
+                if settings.search_cache_redis:
+                    client = redis.Redis.from_url(settings.redis_url, socket_timeout=0.1)
+                _result_cache = ResultCache(redis_client=client)
+    return _result_cache
+
+
+def index_generation() -> int:
+    return current_generation(settings.index_dir)
+
+
+def invalidate_results():
+    """Bump the index generation after a change searches can observe"""
+    try:
+        bump_generation(settings.index_dir)
+    except OSError as e:
+        logger.error(f"Failed to bump the index generation, other processes may serve stale results: {e}")
+        if _result_cache is not None:
+            _result_cache.clear()
@@ -0,0 +1,171 @@
+"""Query-aware result snippets with highlight spans
+
+Snippets are built from the query terms' occurrences in a document, read from
+the ``document_terms`` table: each term's positions together with its
+character spans in the document's text. One sliding pass over the occurrences finds the densest
+window of matches, so the work per result grows with the number of matching
+postings rather than with the length of the document. The text itself is
+read from the compressed ``document_bodies`` table, one query per page of
+results, and only the blocks holding the characters around each window are
+decompressed.
+"""
+from sqlalchemy.orm import Session
+from app.database import Document, DocumentBody, DocumentTerm
+from app.index.postings import decode_positions, decode_spans
+from app.utilts.compression import decompress_text
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+# Token positions a snippet window may span
+WINDOW_TOKENS = 30
+# Characters of document text shown per snippet
+SNIPPET_CHARS = 200
+ELLIPSIS = "..."
+
+
+class Match(NamedTuple):
+    """One occurrence of a query term in a document"""
+    position: int
+    term: str
+    start: int
+    end: int
+
+
+def densest_window(matches: Sequence[Match], window: int = WINDOW_TOKENS) -> Tuple[int, int]:
+    """Return the [first, last) slice of ``matches`` forming the best window
+
+    ``matches`` must be sorted by position. Windows span fewer than ``window``
+    positions and are ranked by distinct query terms, then by number of
+    matches; ties keep the earliest window.
+    """
+    best, best_key = (0, 0), (0, 0)
+    counts = {}
+    first = 0
+    for last, match in enumerate(matches):
+        counts[match.term] = counts.get(match.term, 0) + 1
+        while match.position - matches[first].position >= window:
+            term = matches[first].term
+            counts[term] -= 1
+            if not counts[term]:
+                del counts[term]
+            first += 1
+        key = (len(counts), last + 1 - first)
+        if key > best_key:
+            best, best_key = (first, last + 1), key
+    return best
+
+
+def snippet_range(window: Sequence[Match], max_chars: int = SNIPPET_CHARS) -> Tuple[int, int]:
+    """Character range [start, end) of document text to show around a window"""
+    start, end = window[0].start, window[-1].end
+    if end - start >= max_chars:
+        return start, start + max_chars
+    start = max(0, start - (max_chars - (end - start)) // 2)
+    return start, start + max_chars
+
+
+def render_snippet(fragment: str, offset: int, window: Sequence[Match],
+                   at_end: bool) -> Tuple[str, List[Tuple[int, int]]]:
+    """Trim a text fragment to whole words and locate the highlighted matches
+
+    ``fragment`` is the document text starting at character ``offset`` and
+    ``at_end`` tells whether it runs to the end of the document. Returns the
+    snippet and (start, end) highlight spans within it.
+    """
+    head, tail = 0, len(fragment)
+    if offset > 0:
+        space = fragment.find(" ", 0, max(window[0].start - offset, 0))
+        if space != -1:
+            head = space + 1
+    if not at_end:
+        space = fragment.rfind(" ", max(window[-1].end - offset, head), tail)
+        if space != -1:
+            tail = space
+
+    body = fragment[head:tail]
+    stripped = body.lstrip()
+    shift = offset + head + len(body) - len(stripped)
+    body = stripped.rstrip()
+    prefix = ELLIPSIS if shift > 0 else ""
+    suffix = "" if at_end and tail == len(fragment) else ELLIPSIS
+
+    highlights = []
+    for match in window:
+        start, end = match.start - shift, match.end - shift
+        if start >= 0 and end <= len(body):
+            highlights.append((start + len(prefix), end + len(prefix)))
+    return prefix + body + suffix, highlights
+
+
+class SnippetBuilder:
+    """Builds query-aware snippets for a page of search results
+
+    Create one builder per request: fetched compressed bodies are cached for
+    the builder's lifetime.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._body_cache: Dict[str, Tuple[str, bytes]] = {}
+
+    def _term_matches(self, doc_ids: List[str], terms: List[str]) -> Dict[str, List[Match]]:
+        """Positions and character spans of the query terms, one query for the page"""
+        rows = self.db.query(
+            Document.id, DocumentTerm.term, DocumentTerm.positions, DocumentTerm.spans
+        ).join(Document, Document.ordinal == DocumentTerm.document_ordinal).filter(
+            Document.id.in_(doc_ids),
+            DocumentTerm.term.in_(terms),
+            DocumentTerm.spans.isnot(None)
+        )
+
+        matches = {}
+        for doc_id, term, positions, spans in rows:
+            matches.setdefault(doc_id, []).extend(
+                Match(position, term, start, end)
+                for position, (start, end) in zip(decode_positions(positions), decode_spans(spans))
+            )
+        for doc_matches in matches.values():
+            doc_matches.sort()
+        return matches
+
+    def _fetch_text(self, ranges: Dict[str, Tuple[int, int]]) -> Dict[str, str]:
+        """The requested character ranges of each document's text"""
+        missing = [doc_id for doc_id in ranges if doc_id not in self._body_cache]
+        if missing:
+            rows = self.db.query(DocumentBody.document_id, DocumentBody.codec, DocumentBody.content).filter(
+                DocumentBody.document_id.in_(missing)
+            )
+            for doc_id, codec, content in rows:
+                self._body_cache[doc_id] = (codec, content)
+
+        fragments = {}
+        for doc_id, (start, end) in ranges.items():
+            codec, content = self._body_cache.get(doc_id, (None, None))
+            fragments[doc_id] = decompress_text(content, codec, start, end) or ""
+        return fragments
+
+    def highlight(self, results: List[Dict], terms: Sequence[str]) -> List[Dict]:
+        """Replace result snippets with query-aware ones and add highlight spans
+
+        Documents without stored token offsets keep their precomputed snippet.
+        """
+        if not results or not terms:
+            return results
+
+        doc_matches = self._term_matches([result["id"] for result in results], list(set(terms)))
+        windows, ranges = {}, {}
+        for doc_id, matches in doc_matches.items():
+            first, last = densest_window(matches)
+            windows[doc_id] = matches[first:last]
+            ranges[doc_id] = snippet_range(windows[doc_id])
+        fragments = self._fetch_text(ranges)
+
+        for result in results:
+            window = windows.get(result["id"])
+            result["highlights"] = []
+            if window:
+                start, end = ranges[result["id"]]
+                fragment = fragments[result["id"]]
+                result["snippet"], result["highlights"] = render_snippet(
+                    fragment, start, window, len(fragment) < end - start
+                )
+        return results
@@ -0,0 +1,72 @@
+"""Top-k autocomplete over a sorted term dictionary
+
+Terms sharing a prefix form a contiguous range of a sorted dictionary, so
+suggesting is two binary searches plus a top-k by document frequency within
+that range. The top-k uses a rank tree: an implicit segment tree whose nodes
+hold the index of the most frequent term below them. A heap of
+(best term, range) pairs is split around each term taken, so the cost is
+O(k log n) for any prefix, including one-letter prefixes that cover most of
+the dictionary.
+
+The tree is stored in the index segment (see app.index.segment) and built
+when the segment is published.
+"""
+from array import array
+from heapq import heappop, heappush
+from typing import List, Sequence
+
+
+def _better(doc_freqs: Sequence[int], a: int, b: int) -> int:
+    """More frequent term, the alphabetically first one on ties"""
+    if doc_freqs[a] != doc_freqs[b]:
+        return a if doc_freqs[a] > doc_freqs[b] else b
+    return a if a < b else b
+
+
+def build_rank_tree(doc_freqs: Sequence[int]) -> array:
+    """Build the rank tree over per-term document frequencies
+
+    Node ``i`` covers children ``2i`` and ``2i + 1``; leaf ``n + i`` is term
+    ``i``. Node 0 is unused.
+    """
+    n = len(doc_freqs)
+    tree = array("I", bytes(4 * 2 * n))
+    tree[n:] = array("I", range(n))
+    for i in range(n - 1, 0, -1):
+        tree[i] = _better(doc_freqs, tree[2 * i], tree[2 * i + 1])
+    return tree
+
+
+def range_best(tree: Sequence[int], doc_freqs: Sequence[int], lo: int, hi: int) -> int:
+    """Index of the most frequent term in [lo, hi); the range must be non-empty"""
+    n = len(doc_freqs)
+    best = lo
+    lo += n
+    hi += n
+    while lo < hi:
+        if lo & 1:
+            best = _better(doc_freqs, best, tree[lo])
+            lo += 1
+        if hi & 1:
+            hi -= 1
+            best = _better(doc_freqs, best, tree[hi])
+        lo >>= 1
+        hi >>= 1
+    return best
+
+
+def top_k_range(tree: Sequence[int], doc_freqs: Sequence[int], lo: int, hi: int, k: int) -> List[int]:
+    """Indexes of the k most frequent terms in [lo, hi), most frequent first"""
+    if lo >= hi or k <= 0:
+        return []
+    best = range_best(tree, doc_freqs, lo, hi)
+    heap = [(-doc_freqs[best], best, lo, hi)]
+    result = []
+    while heap and len(result) < k:
+        _, best, lo, hi = heappop(heap)
+        result.append(best)
+        for start, end in ((lo, best), (best + 1, hi)):
+            if start < end:
+                index = range_best(tree, doc_freqs, start, end)
+                heappush(heap, (-doc_freqs[index], index, start, end))
+    return result
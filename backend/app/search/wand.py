@@ -0,0 +1,181 @@
+"""Document-at-a-time top-k retrieval with WAND dynamic pruning
+
+Each query term contributes a ``TermCursor`` over its decoded postings. The
+cursor knows an upper bound on the score it can add to any document, derived
+from the maximum term weight stored alongside the postings. WAND keeps the
+current k best documents in a min-heap and skips every document whose summed
+upper bounds cannot beat the heap's minimum, jumping cursors forward with
+binary search instead of scoring each posting.
+"""
+from bisect import bisect_left
+from heapq import heappush, heapreplace
+from typing import AbstractSet, List, Sequence, Tuple
+
+END = float("inf")
+# Largest galloping step before advance_to falls back to a binary search
+GALLOP_LIMIT = 32
+
+
+class TermCursor:
+    """Cursor over one term's postings, ordered by document ordinal"""
+
+    __slots__ = ("ordinals", "weights", "multiplier", "upper_bound", "pos", "doc")
+
+    def __init__(self, ordinals: Sequence[int], weights: Sequence[float],
+                 multiplier: float, upper_bound: float):
+        self.ordinals = ordinals
+        self.weights = weights
+        self.multiplier = multiplier
+        self.upper_bound = upper_bound
+        self.pos = 0
+        self.doc = ordinals[0] if len(ordinals) else END
+
+    # Plain postings need no per-document check (see app.search.query_plan)
+    verifies = False
+
+    @property
+    def cost(self) -> int:
+        return len(self.ordinals)
+
+    def reset(self):
+        self.pos = 0
+        self.doc = self.ordinals[0] if len(self.ordinals) else END
+
+    def prefetch(self, doc_ordinals: Sequence[int]):
+        pass
+
+    def score(self) -> float:
+        return self.weights[self.pos] * self.multiplier
+
+    # A term matches wherever it has a posting, so its score is exact
+    bound = score
+
+    def matches(self) -> bool:
+        return True
+
+    def next(self):
+        self.pos += 1
+        self.doc = self.ordinals[self.pos] if self.pos < len(self.ordinals) else END
+
+    def advance_to(self, target: int):
+        """Move to the first posting with ordinal >= target
+
+        Gallops 1, 2, 4, ... postings ahead so that a short skip of g
+        postings costs O(log g); past GALLOP_LIMIT postings, where a binary
+        search over the rest costs about the same, it binary searches.
+        """
+        if self.doc >= target:
+            return
+        ordinals = self.ordinals
+        n = len(ordinals)
+        lo, hi = self.pos + 1, n
+        probe, step = lo, 1
+        while probe < n and step <= GALLOP_LIMIT:
+            if ordinals[probe] >= target:
+                hi = probe + 1
+                break
+            lo = probe + 1
+            probe += step
+            step <<= 1
+        self.pos = bisect_left(ordinals, target, lo, hi)
+        self.doc = ordinals[self.pos] if self.pos < n else END
+
+
+class _TopK:
+    """Min-heap of the k best (score, ordinal) pairs; ties prefer lower ordinals
+
+    Ordinals in ``deleted`` are never admitted, so documents deleted since
+    the postings were written cannot take a place in the top k.
+    """
+
+    def __init__(self, k: int, deleted: AbstractSet[int] = frozenset()):
+        self.k = k
+        self.deleted = deleted
+        self.heap = []
+
+    @property
+    def threshold(self) -> float:
+        # Until the heap is full every match is admitted, including zero scores
+        return self.heap[0][0] if len(self.heap) == self.k else -1.0
+
+    def offer(self, ordinal: int, score: float):
+        if ordinal in self.deleted:
+            return
+        entry = (score, -ordinal)
+        if len(self.heap) < self.k:
+            heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapreplace(self.heap, entry)
+
+    def results(self) -> List[Tuple[int, float]]:
+        return [(-neg_ordinal, score) for score, neg_ordinal in sorted(self.heap, reverse=True)]
+
+
+def top_k_or(cursors: List[TermCursor], k: int,
+             deleted: AbstractSet[int] = frozenset()) -> List[Tuple[int, float]]:
+    """Return the k highest scoring documents matching any term, best first"""
+    top = _TopK(k, deleted)
+    if k <= 0:
+        return []
+    cursors = [cursor for cursor in cursors if cursor.doc != END]
+
+    while cursors:
+        cursors.sort(key=lambda cursor: cursor.doc)
+        threshold = top.threshold
+
+        # Pivot: first cursor at which the summed upper bounds can beat the threshold
+        bound = 0.0
+        pivot = None
+        for i, cursor in enumerate(cursors):
+            bound += cursor.upper_bound
+            if bound > threshold:
+                pivot = i
+                break
+        if pivot is None:
+            break
+        pivot_doc = cursors[pivot].doc
+
+        if cursors[0].doc == pivot_doc:
+            # Every cursor up to the pivot is on the pivot document: score it
+            score = 0.0
+            for cursor in cursors:
+                if cursor.doc != pivot_doc:
+                    break
+                score += cursor.score()
+                cursor.next()
+            top.offer(pivot_doc, score)
+        else:
+            # Documents before the pivot cannot make the top k
+            for cursor in cursors[:pivot]:
+                cursor.advance_to(pivot_doc)
+
+        cursors = [cursor for cursor in cursors if cursor.doc != END]
+
+    return top.results()
+
+
+def top_k_and(cursors: List[TermCursor], k: int,
+              deleted: AbstractSet[int] = frozenset()) -> List[Tuple[int, float]]:
+    """Return the k highest scoring documents matching every term, best first"""
+    top = _TopK(k, deleted)
+    if k <= 0 or not cursors or any(cursor.doc == END for cursor in cursors):
+        return []
+
+    # Drive the intersection from the rarest term and leapfrog the others
+    cursors = sorted(cursors, key=lambda cursor: cursor.cost)
+    lead, others = cursors[0], cursors[1:]
+    while lead.doc != END:
+        target = lead.doc
+        for cursor in others:
+            cursor.advance_to(target)
+            if cursor.doc != target:
+                break
+        else:
+            top.offer(target, sum(cursor.score() for cursor in cursors))
+            lead.next()
+            continue
+        if cursor.doc == END:
+            break
+        lead.advance_to(cursor.doc)
+
+    return top.results()
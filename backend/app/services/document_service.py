@@ -1,51 +1,301 @@
 from sqlalchemy.orm import Session
-from app.database import Document, Token, get_db
-from app.utilts.tokenizer import tokenize_text
+from sqlalchemy import func, insert, select, tuple_, update
+from app.config import settings
+from app.database import (
+    Document, DocumentBody, DocumentTerm, NearDuplicate, SessionLocal, SimhashBand, allocate_ordinals,
+    next_ordinals
+)
+from app.index.fields import FIELDS, SHORT_FIELDS, TITLE, URL, short_field_tokens, term_frequencies
+from app.index.postings import decode_positions, encode_positions, encode_spans
+from app.index.segment import delete_from_segments
+from app.index.simhash import BandIndex, bands, from_signed, nearest, simhash, to_signed
+from app.metrics import NEAR_DUPLICATE_DOCUMENTS, NEAR_DUPLICATE_TOKENS
+from app.search.result_cache import invalidate_results
+from app.services.index_service import IndexService, document_lengths
+from app.utilts.compression import compress_text, decompress_text, get_codec
+from app.utilts.tokenizer import tokenize_with_offsets
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+import io
 import json
 import hashlib
-from typing import List, Dict, Optional
+import os
+import time
+from typing import List, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Leading characters of a document shown as its default result snippet
+SNIPPET_CHARS = 200
+
+# document_terms columns written by COPY / executemany, in row tuple order
+TERM_COLUMNS = ("document_ordinal", "term", "frequency", "positions", "spans", "surface")
+# Rows per executemany round trip on databases without COPY
+TERM_INSERT_BATCH_SIZE = 10000
+
+
+def make_snippet(text: str) -> str:
+    """Build a result snippet from the start of a document's text
+    
+    Built from the original text rather than the tokens, which are stemmed.
+    """
+    snippet = " ".join(text[:2 * SNIPPET_CHARS].split())
+    if len(snippet) > SNIPPET_CHARS:
+        snippet = snippet[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "..."
+    return snippet
+
+
+def content_fingerprint(title: Optional[str], content: Optional[str],
+                        html_content: Optional[str] = None) -> str:
+    """Hash of the fields a document is indexed and displayed from"""
+    digest = hashlib.sha256()
+    for value in (title, content, html_content):
+        # Length-prefixed so that moving text between fields changes the hash
+        data = (value or "").encode("utf-8", "surrogatepass")
+        digest.update(b"%d:" % len(data))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _encode_links(links: Optional[List[str]]) -> Optional[str]:
+    return json.dumps(links) if links is not None else None
+
+
+def _crawl_fields(document: Dict) -> Dict:
+    """Crawl columns of a document row from a bulk ingestion dict"""
+    return {
+        "etag": document.get("etag"),
+        "last_modified": document.get("last_modified"),
+        "links": _encode_links(document.get("links")),
+    }
+
+
+def _body_row(doc_id: str, content: Optional[str], html_content: Optional[str], codec: str) -> Dict:
+    """document_bodies row of a document's text and HTML"""
+    return {
+        "document_id": doc_id,
+        "codec": codec,
+        "content": compress_text(content, codec),
+        "html_content": compress_text(html_content, codec),
+    }
+
+
+def _field_term_freqs(title: Optional[str], url: Optional[str]) -> Dict[str, Dict[str, int]]:
+    """Return field -> term -> frequency counts of a document's title and URL"""
+    return {field: term_frequencies(tokens) for field, tokens in short_field_tokens(title, url).items()}
+
+
+def _document_terms(tokens: List[Tuple[str, int, int]]) -> Dict[str, Tuple[List[int], List[Tuple[int, int]]]]:
+    """Return term -> (positions, character spans) of a document's tokens"""
+    terms = {}
+    for position, (token, start, end) in enumerate(tokens):
+        occurrences = terms.get(token)
+        if occurrences is None:
+            occurrences = terms[token] = ([], [])
+        occurrences[0].append(position)
+        occurrences[1].append((start, end))
+    return terms
+
+
+def _surface_form(text: str, spans: List[Tuple[int, int]]) -> str:
+    """Most frequent lowercased spelling of a term's occurrences, the first on ties"""
+    if len(spans) == 1:
+        start, end = spans[0]
+        return text[start:end].lower()
+    return Counter(text[start:end].lower() for start, end in spans).most_common(1)[0][0]
+
+
+class AnalyzedContent(NamedTuple):
+    """A document's content reduced to what is stored and indexed"""
+    length: int  # Token count
+    # SimHash of the tokens; None without tokens or near-duplicate detection
+    fingerprint: Optional[int]
+    # (term, frequency, encoded positions, encoded character spans, surface form)
+    terms: List[Tuple[str, int, bytes, bytes, str]]
+
+
+def analyze_content(content: Optional[str], fingerprint: bool = True) -> AnalyzedContent:
+    """Tokenize content and encode its document_terms rows
+    
+    Runs in the ingestion process pool, so the writing process only has
+    database work left.
+    """
+    content = content or ""
+    tokens = tokenize_with_offsets(content)
+    terms = [
+        (term, len(positions), encode_positions((positions,)), encode_spans(spans), _surface_form(content, spans))
+        for term, (positions, spans) in _document_terms(tokens).items()
+    ]
+    return AnalyzedContent(
+        len(tokens), simhash([token for token, _, _ in tokens]) if fingerprint else None, terms
+    )
+
+
+def _term_frequencies(analyzed: AnalyzedContent) -> Dict[str, int]:
+    return {term: frequency for term, frequency, *_ in analyzed.terms}
+
+
+def _term_surfaces(analyzed: Iterable[AnalyzedContent]) -> Dict[str, str]:
+    return {term: surface for content in analyzed for term, *_, surface in content.terms}
+
+
+def _term_rows(ordinal: int, analyzed: AnalyzedContent) -> List[Tuple]:
+    """Return document_terms rows for a document"""
+    return [(ordinal, *row) for row in analyzed.terms]
+
+
+def _index_changes(old_ordinals: Dict[str, int], ordinals: Dict[str, int],
+                   old_term_freqs: Dict[str, Dict[str, int]],
+                   new_term_freqs: Dict[str, Dict[str, int]]) -> Dict[str, Dict[int, int]]:
+    """Return term -> {doc ordinal: new frequency} for a batch of documents
+    
+    Changed documents leave the postings under ``old_ordinals`` and join
+    them under their new ``ordinals``.
+    """
+    changes = {}
+    for doc_id, ordinal in old_ordinals.items():
+        for term in old_term_freqs.get(doc_id, {}):
+            changes.setdefault(term, {})[ordinal] = 0
+    for doc_id, ordinal in ordinals.items():
+        for term, frequency in new_term_freqs[doc_id].items():
+            changes.setdefault(term, {})[ordinal] = frequency
+    return changes
+
+
+def _unpublish(ordinals: Iterable[int]):
+    """Hide the committed deletion or replacement of documents from the published segments"""
+    try:
+        delete_from_segments(settings.index_dir, ordinals)
+    except OSError as e:
+        logger.error(f"Failed to record deleted documents, segments serve them until the next publish: {e}")
+
+
+def _count_near_duplicates(documents: int, tokens: int):
+    if documents:
+        NEAR_DUPLICATE_DOCUMENTS.inc(documents)
+        NEAR_DUPLICATE_TOKENS.inc(tokens)
+
+
+# Escapes for the COPY text format; integers and hex bytea never need them
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 
 class DocumentService:
     def __init__(self, db: Session):
         self.db = db
     
-    def create_document(self, url: str, title: str, content: str, html_content: str = None) -> Document:
-        """Create a new document in the database"""
+    def create_document(self, url: str, title: str, content: str, html_content: str = None,
+                        etag: str = None, last_modified: str = None,
+                        links: List[str] = None) -> Document:
+        """Create a new document in the database and index its tokens
+        
+        ``etag``, ``last_modified`` and ``links`` record the crawl response
+        for the next conditional re-crawl. When the document exists with the
+        same title and content only they are updated: nothing is tokenized,
+        the index is untouched and cached results stay valid. A near-duplicate
+        of an indexed document is recorded against it without storing or
+        indexing its tokens, and that canonical document is returned.
+        """
         try:
             # Generate document ID from URL
             doc_id = hashlib.md5(url.encode()).hexdigest()
+            content_hash = content_fingerprint(title, content, html_content)
+            crawl_state = {"etag": etag, "last_modified": last_modified, "links": _encode_links(links)}
+            
+            # Check if document already exists, indexed or as a near-duplicate
+            document = self.db.query(Document).filter(Document.id == doc_id).first()
+            duplicate = None
+            if document is None:
+                duplicate = self.db.query(NearDuplicate).filter(NearDuplicate.id == doc_id).first()
+            known = document or duplicate
+            if known is not None and known.content_hash == content_hash:
+                changed = False
+                for column, value in crawl_state.items():
+                    if getattr(known, column) != value:
+                        setattr(known, column, value)
+                        changed = True
+                if changed:
+                    self.db.commit()
+                logger.debug(f"Unchanged document: {url}")
+                return document or self.get_document(duplicate.canonical_id)
             
-            # Check if document already exists
-            existing_doc = self.db.query(Document).filter(Document.id == doc_id).first()
-            if existing_doc:
-                # Update existing document
-                existing_doc.title = title
-                existing_doc.content = content
-                existing_doc.html_content = html_content
+            replaced_ordinal = document.ordinal if document is not None else None
+            analyzed = analyze_content(content, settings.near_duplicate_detection)
+            fingerprints, duplicates = self._find_near_duplicates({doc_id: analyzed})
+            if doc_id in duplicates:
+                canonical_id, distance = duplicates[doc_id]
+                if document is not None:
+                    # Indexed on its own until now
+                    self._remove_document(document)
+                if duplicate is None:
+                    duplicate = NearDuplicate(id=doc_id, url=url)
+                    self.db.add(duplicate)
+                duplicate.canonical_id = canonical_id
+                duplicate.distance = distance
+                duplicate.length = analyzed.length
+                duplicate.content_hash = content_hash
+                for column, value in crawl_state.items():
+                    setattr(duplicate, column, value)
                 self.db.commit()
-                logger.info(f"Updated existing document: {url}")
-                return existing_doc
+                if document is not None:
+                    _unpublish([replaced_ordinal])
+                    invalidate_results()
+                _count_near_duplicates(1, analyzed.length)
+                logger.info(f"Near-duplicate of {canonical_id}, not indexed: {url}")
+                return self.get_document(canonical_id)
             
-            # Create new document
-            document = Document(
-                id=doc_id,
-                url=url,
-                title=title,
-                content=content,
-                html_content=html_content
-            )
-            self.db.add(document)
+            old_field_freqs = {}
+            existed = document is not None
+            if duplicate is not None:
+                self.db.delete(duplicate)
+            if document:
+                # Update existing document, noting the title and URL terms it had
+                old_field_freqs = _field_term_freqs(document.title, document.url)
+                document.title = title
+            else:
+                # Create new document
+                document = Document(
+                    id=doc_id,
+                    url=url,
+                    title=title
+                )
+                self.db.add(document)
+            self.db.merge(DocumentBody(**_body_row(doc_id, content, html_content, get_codec())))
+            document.content_hash = content_hash
+            for column, value in crawl_state.items():
+                setattr(document, column, value)
+            document.simhash = to_signed(fingerprints[doc_id]) if doc_id in fingerprints else None
+            
+            # Assign the document ordinal, then store terms and update the
+            # affected index terms
+            self.db.flush()
+            self._store_terms(document, content, analyzed, old_field_freqs, is_new=not existed)
+            self._store_fingerprints(fingerprints, [doc_id] if existed else [])
+            if existed:
+                # Pages collapsed onto the old content are fetched and
+                # compared afresh on their next crawl
+                self.db.query(NearDuplicate).filter(
+                    NearDuplicate.canonical_id == doc_id
+                ).delete(synchronize_session=False)
             self.db.commit()
+            if existed:
+                _unpublish([replaced_ordinal])
+            invalidate_results()
             self.db.refresh(document)
             
-            # Tokenize and store tokens
-            self._store_tokens(doc_id, content)
-            
-            logger.info(f"Created new document: {url}")
+            logger.info(f"Stored document: {url}")
             return document
             
         except Exception as e:
@@ -53,40 +303,447 @@ class DocumentService:
             logger.error(f"Error creating document {url}: {e}")
             raise
     
-    def _store_tokens(self, doc_id: str, content: str):
-        """Store tokenized content in the database"""
+    def get_crawl_state(self, url: str) -> Optional[Dict]:
+        """Content hash, HTTP validators and links recorded by the last crawl of ``url``"""
+        doc_id = hashlib.md5(url.encode()).hexdigest()
+        row = None
+        for model in (Document, NearDuplicate):
+            row = self.db.query(
+                model.content_hash, model.etag, model.last_modified, model.links
+            ).filter(model.id == doc_id).first()
+            if row is not None:
+                break
+        if row is None:
+            return None
+        return {
+            "content_hash": row.content_hash,
+            "etag": row.etag,
+            "last_modified": row.last_modified,
+            "links": json.loads(row.links) if row.links else [],
+        }
+    
+    def _get_term_frequencies(self, ordinal: int) -> Dict[str, int]:
+        """Get stored term -> frequency counts for a document"""
+        rows = self.db.query(DocumentTerm.term, DocumentTerm.frequency).filter(
+            DocumentTerm.document_ordinal == ordinal
+        ).all()
+        return dict(rows)
+    
+    def _store_terms(self, document: Document, content: Optional[str], analyzed: AnalyzedContent,
+                     old_field_freqs: Optional[Dict[str, Dict[str, int]]] = None, is_new: bool = False):
+        """Store a document's terms and apply the index deltas; the caller commits
+        
+        ``analyzed`` is ``content`` as analyze_content returned it and
+        ``old_field_freqs`` the title and URL term counts the document was
+        indexed with before this update. ``is_new`` adds the document to
+        the corpus stats rather than updating its lengths there. An
+        existing document is re-indexed under a new ordinal.
+        """
+        old_ordinal = document.ordinal
+        old_lengths = {field: 0 for field in FIELDS} if is_new else document_lengths(document)
+        
+        # Remove existing terms for this document
+        old_term_freqs = self._get_term_frequencies(old_ordinal)
+        self.db.query(DocumentTerm).filter(DocumentTerm.document_ordinal == old_ordinal).delete()
+        if not is_new:
+            document.ordinal = next_ordinals(self.db.connection(), 1)[0]
+        ordinal = document.ordinal
+        
+        # Store terms with their positions and character spans
+        self._write_terms(_term_rows(ordinal, analyzed))
+        token_freq = _term_frequencies(analyzed)
+        
+        document.length = analyzed.length
+        document.snippet = make_snippet(content or "")
+        index_service = IndexService(self.db)
+        index_service.apply_document_delta(ordinal, old_term_freqs, token_freq,
+                                           surfaces=_term_surfaces([analyzed]), old_ordinal=old_ordinal)
+        
+        # Title and URL terms are short enough to recount rather than store
+        field_tokens = short_field_tokens(document.title, document.url)
+        document.title_length = len(field_tokens[TITLE])
+        document.url_length = len(field_tokens[URL])
+        for field in SHORT_FIELDS:
+            index_service.apply_document_delta(
+                ordinal, (old_field_freqs or {}).get(field, {}),
+                term_frequencies(field_tokens[field]), field, old_ordinal=old_ordinal
+            )
+        new_lengths = document_lengths(document)
+        index_service.apply_length_deltas(
+            int(is_new), {field: new_lengths[field] - old_lengths[field] for field in FIELDS}
+        )
+    
+    def _find_near_duplicates(self, analyzed: Dict[str, AnalyzedContent]
+                              ) -> Tuple[Dict[str, int], Dict[str, Tuple[str, int]]]:
+        """Match fingerprinted documents against the indexed ones
+        
+        Returns doc id -> SimHash of the documents to index and doc id ->
+        (canonical doc id, distance) of the near-duplicates. Each document is
+        matched against indexed documents outside ``analyzed`` and against
+        the documents before it that are not duplicates themselves. With
+        detection disabled nothing is fingerprinted.
+        """
+        if not settings.near_duplicate_detection:
+            return {}, {}
+        fingerprints = {
+            doc_id: content.fingerprint for doc_id, content in analyzed.items() if content.fingerprint is not None
+        }
+        duplicates = {}
+        if not fingerprints:
+            return fingerprints, duplicates
+        
+        # Candidates sharing a band with any of the documents, in one query
+        band_index = BandIndex()
+        band_values = {band for fingerprint in fingerprints.values() for band in bands(fingerprint)}
+        for doc_id, fingerprint in self.db.query(Document.id, Document.simhash).join(
+            SimhashBand, SimhashBand.document_id == Document.id
+        ).filter(
+            tuple_(SimhashBand.band, SimhashBand.value).in_(list(band_values)),
+            Document.id.notin_(list(analyzed))
+        ).distinct():
+            band_index.add(doc_id, from_signed(fingerprint))
+        
+        for doc_id, fingerprint in fingerprints.items():
+            match = nearest(fingerprint, band_index.candidates(fingerprint))
+            if match is not None:
+                duplicates[doc_id] = match
+            else:
+                band_index.add(doc_id, fingerprint)
+        for doc_id in duplicates:
+            del fingerprints[doc_id]
+        return fingerprints, duplicates
+    
+    def _store_fingerprints(self, fingerprints: Dict[str, int], replaced_ids: List[str]):
+        """Band the fingerprints of indexed documents, replacing those of ``replaced_ids``"""
+        if replaced_ids:
+            self.db.query(SimhashBand).filter(
+                SimhashBand.document_id.in_(replaced_ids)
+            ).delete(synchronize_session=False)
+        rows = [
+            {"band": band, "value": value, "document_id": doc_id}
+            for doc_id, fingerprint in fingerprints.items()
+            for band, value in bands(fingerprint)
+        ]
+        if rows:
+            self.db.execute(insert(SimhashBand), rows)
+    
+    def _remove_document(self, document: Document):
+        """Take a document out of the index and delete it; the caller commits
+        
+        Pages collapsed onto it are forgotten, so the next crawl fetches and
+        indexes them again.
+        """
+        doc_id = document.id
+        old_term_freqs = self._get_term_frequencies(document.ordinal)
+        index_service = IndexService(self.db)
+        index_service.apply_document_delta(document.ordinal, old_term_freqs, {})
+        for field, term_freqs in _field_term_freqs(document.title, document.url).items():
+            index_service.apply_document_delta(document.ordinal, term_freqs, {}, field)
+        index_service.apply_length_deltas(-1, {field: -length for field, length in document_lengths(document).items()})
+        self.db.query(DocumentTerm).filter(DocumentTerm.document_ordinal == document.ordinal).delete()
+        self.db.query(SimhashBand).filter(SimhashBand.document_id == doc_id).delete()
+        self.db.query(DocumentBody).filter(DocumentBody.document_id == doc_id).delete()
+        self.db.query(NearDuplicate).filter(NearDuplicate.canonical_id == doc_id).delete()
+        self.db.delete(document)
+    
+    def _write_terms(self, rows: List[Tuple]):
+        """Insert document_terms rows with COPY on PostgreSQL, batched executemany elsewhere"""
+        if not rows:
+            return
+        
+        if self.db.get_bind().dialect.name == "postgresql":
+            buffer = io.StringIO()
+            # bytea in hex format, its backslash escaped for the text format
+            buffer.writelines(
+                f"{ordinal}\t{term.translate(_COPY_ESCAPES)}\t{frequency}\t\\\\x{positions.hex()}\t\\\\x{spans.hex()}"
+                f"\t{surface.translate(_COPY_ESCAPES)}\n"
+                for ordinal, term, frequency, positions, spans, surface in rows
+            )
+            buffer.seek(0)
+            # The raw connection is the one holding the session's transaction
+            cursor = self.db.connection().connection.cursor()
+            try:
+                cursor.copy_expert(
+                    f"COPY {DocumentTerm.__tablename__} ({', '.join(TERM_COLUMNS)}) FROM STDIN", buffer
+                )
+            finally:
+                cursor.close()
+            return
+        
+        statement = DocumentTerm.__table__.insert()
+        for start in range(0, len(rows), TERM_INSERT_BATCH_SIZE):
+            self.db.connection().execute(statement, [
+                dict(zip(TERM_COLUMNS, row)) for row in rows[start:start + TERM_INSERT_BATCH_SIZE]
+            ])
+    
+    def bulk_create_documents(self, documents: Iterable[Dict], batch_size: Optional[int] = None,
+                              workers: Optional[int] = None) -> Dict:
+        """Create or update many documents, one transaction per batch
+        
+        ``documents`` yields dicts with ``url``, ``title``, ``content`` and
+        optionally ``html_content`` and the crawl fields ``etag``,
+        ``last_modified`` and ``links``; within a batch a later document with
+        the same URL replaces an earlier one. Content is tokenized and its
+        terms encoded in a process pool while the previous batch is written.
+        Documents whose
+        title and content are unchanged only have their crawl fields updated;
+        with one worker they are not even tokenized. Near-duplicates of
+        indexed documents, or of earlier documents in the batch, are recorded
+        without storing or indexing their tokens. Returns document, token,
+        unchanged and near-duplicate counts with docs/sec and tokens/sec
+        throughput.
+        """
+        batch_size = batch_size or settings.ingest_batch_size
+        workers = settings.ingest_workers if workers is None else workers
+        workers = workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        analyze = partial(analyze_content, fingerprint=settings.near_duplicate_detection)
+        
+        def tokenize(batch):
+            if batch is None or pool is None:
+                # In-process: _store_batch tokenizes changed documents only
+                return None
+            contents = [document.get("content") or "" for document in batch]
+            return pool.map(analyze, contents, chunksize=max(1, len(contents) // (4 * workers)))
+        
+        totals = {"documents": 0, "tokens": 0, "unchanged": 0, "near_duplicates": 0, "near_duplicate_tokens": 0}
+        start = time.perf_counter()
         try:
-            # Remove existing tokens for this document
-            self.db.query(Token).filter(Token.document_id == doc_id).delete()
-            
-            # Tokenize content
-            tokens = tokenize_text(content)
-            
-            # Store tokens with positions
-            token_records = []
-            token_freq = {}
-            
-            for position, token in enumerate(tokens):
-                token_freq[token] = token_freq.get(token, 0) + 1
-                token_records.append(Token(
-                    document_id=doc_id,
-                    token=token,
-                    position=position,
-                    frequency=token_freq[token]
-                ))
-            
-            self.db.add_all(token_records)
-            self.db.commit()
-            
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Error storing tokens for document {doc_id}: {e}")
-            raise
+            batches = _batches(documents, batch_size)
+            batch = next(batches, None)
+            pending = tokenize(batch)
+            while batch is not None:
+                # Queue the next batch's tokenization before writing this one
+                next_batch = next(batches, None)
+                next_pending = tokenize(next_batch)
+                
+                analyzed = list(pending) if pending is not None else None
+                try:
+                    counts, replaced_ordinals = self._store_batch(batch, analyzed)
+                    self.db.commit()
+                except Exception:
+                    self.db.rollback()
+                    raise
+                _unpublish(replaced_ordinals)
+                if counts["documents"] > counts["unchanged"]:
+                    invalidate_results()
+                for name, count in counts.items():
+                    totals[name] += count
+                logger.info(f"Ingested {totals['documents']} documents, {totals['tokens']} tokens")
+                
+                batch, pending = next_batch, next_pending
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        
+        elapsed = time.perf_counter() - start
+        return {
+            **totals,
+            "seconds": elapsed,
+            "docs_per_sec": totals["documents"] / elapsed if elapsed else 0.0,
+            "tokens_per_sec": totals["tokens"] / elapsed if elapsed else 0.0,
+        }
+    
+    def _store_batch(self, documents: List[Dict],
+                     analyzed: Optional[List[AnalyzedContent]]) -> Tuple[Dict[str, int], List[int]]:
+        """Write a batch of documents, their terms and index deltas; the caller commits
+        
+        ``analyzed`` holds each document's analyze_content result, or is None
+        to analyze the changed documents here. Returns the number of documents, of
+        tokens written, of documents whose content was unchanged and of
+        near-duplicates with the tokens they would have added, and the
+        ordinals the changed documents were indexed under: they are
+        re-indexed under new ones.
+        """
+        batch = {}
+        for offset, document in enumerate(documents):
+            content = analyzed[offset] if analyzed is not None else None
+            batch[hashlib.md5(document["url"].encode()).hexdigest()] = (document, content)
+        content_hashes = {
+            doc_id: content_fingerprint(document.get("title"), document.get("content"), document.get("html_content"))
+            for doc_id, (document, _) in batch.items()
+        }
+        stored = len(batch)
+        
+        # Existing documents and near-duplicates with unchanged content keep
+        # their tokens and postings; only their crawl fields are brought up
+        # to date
+        ordinals, old_field_freqs, old_lengths, known_duplicates = {}, {}, {}, set()
+        for model, is_indexed in ((Document, True), (NearDuplicate, False)):
+            crawl_rows = []
+            for row in self.db.query(
+                model.id, model.content_hash, model.etag, model.last_modified, model.links,
+                *((Document.ordinal, Document.title, Document.url, Document.length,
+                   Document.title_length, Document.url_length) if is_indexed else ())
+            ).filter(model.id.in_(list(batch))):
+                if row.content_hash == content_hashes[row.id]:
+                    document, _ = batch.pop(row.id)
+                    crawl_row = {"id": row.id, **_crawl_fields(document)}
+                    if crawl_row != {"id": row.id, "etag": row.etag, "last_modified": row.last_modified,
+                                     "links": row.links}:
+                        crawl_rows.append(crawl_row)
+                elif is_indexed:
+                    ordinals[row.id] = row.ordinal
+                    old_field_freqs[row.id] = _field_term_freqs(row.title, row.url)
+                    old_lengths[row.id] = document_lengths(row)
+                else:
+                    known_duplicates.add(row.id)
+            if crawl_rows:
+                self.db.execute(update(model), crawl_rows)
+        unchanged = stored - len(batch)
+        
+        for doc_id, (document, content) in batch.items():
+            if content is None:
+                batch[doc_id] = (document, analyze_content(document.get("content"), settings.near_duplicate_detection))
+        fingerprints, duplicates = self._find_near_duplicates(
+            {doc_id: content for doc_id, (_, content) in batch.items()}
+        )
+        
+        # Changed documents: note their indexed terms, then drop them
+        old_term_freqs = {}
+        if ordinals:
+            doc_ids = {ordinal: doc_id for doc_id, ordinal in ordinals.items()}
+            for ordinal, term, frequency in self.db.query(
+                DocumentTerm.document_ordinal, DocumentTerm.term, DocumentTerm.frequency
+            ).filter(DocumentTerm.document_ordinal.in_(list(doc_ids))):
+                old_term_freqs.setdefault(doc_ids[ordinal], {})[term] = frequency
+            self.db.query(DocumentTerm).filter(
+                DocumentTerm.document_ordinal.in_(list(doc_ids))
+            ).delete(synchronize_session=False)
+        
+        new_rows, updated_rows, indexed, new_term_freqs, new_field_freqs = [], [], {}, {}, {}
+        duplicate_rows, body_rows = [], []
+        codec = get_codec()
+        for doc_id, (document, content) in batch.items():
+            if doc_id in duplicates:
+                canonical_id, distance = duplicates[doc_id]
+                duplicate_rows.append({
+                    "id": doc_id,
+                    "url": document["url"],
+                    "canonical_id": canonical_id,
+                    "distance": distance,
+                    "length": content.length,
+                    "content_hash": content_hashes[doc_id],
+                    **_crawl_fields(document),
+                })
+                # A document collapsing onto another leaves the index
+                new_term_freqs[doc_id] = {}
+                new_field_freqs[doc_id] = {field: {} for field in SHORT_FIELDS}
+                continue
+            indexed[doc_id] = content
+            new_term_freqs[doc_id] = _term_frequencies(content)
+            field_tokens = short_field_tokens(document.get("title"), document["url"])
+            new_field_freqs[doc_id] = {field: term_frequencies(terms) for field, terms in field_tokens.items()}
+            row = {
+                "id": doc_id,
+                "title": document.get("title"),
+                "length": content.length,
+                "title_length": len(field_tokens[TITLE]),
+                "url_length": len(field_tokens[URL]),
+                "snippet": make_snippet(document.get("content") or ""),
+                "content_hash": content_hashes[doc_id],
+                "simhash": to_signed(fingerprints[doc_id]) if doc_id in fingerprints else None,
+                **_crawl_fields(document),
+            }
+            body_rows.append(_body_row(doc_id, document.get("content"), document.get("html_content"), codec))
+            if doc_id in ordinals:
+                updated_rows.append(row)
+            else:
+                new_rows.append({**row, "url": document["url"]})
+        
+        # Pages collapsed onto documents whose content changed are fetched
+        # and compared afresh on their next crawl
+        replaced = list(ordinals)
+        if replaced or known_duplicates:
+            self.db.query(NearDuplicate).filter(
+                NearDuplicate.canonical_id.in_(replaced) | NearDuplicate.id.in_(list(known_duplicates))
+            ).delete(synchronize_session=False)
+        if duplicate_rows:
+            self.db.execute(insert(NearDuplicate), duplicate_rows)
+        
+        old_ordinals = dict(ordinals)
+        if updated_rows:
+            for row, ordinal in zip(updated_rows, next_ordinals(self.db.connection(), len(updated_rows))):
+                row["ordinal"] = ordinals[row["id"]] = ordinal
+            self.db.execute(update(Document), updated_rows)
+        if new_rows:
+            if not self.db.get_bind().dialect.supports_sequences:
+                # No documents_ordinal_seq to draw from
+                next_ordinal = allocate_ordinals(self.db.connection(), len(new_rows))
+                for offset, row in enumerate(new_rows):
+                    row["ordinal"] = next_ordinal + offset
+            ordinals.update(self.db.execute(
+                insert(Document).returning(Document.id, Document.ordinal), new_rows
+            ).all())
+        # Bodies of changed documents are replaced, those collapsed dropped
+        if replaced:
+            self.db.query(DocumentBody).filter(
+                DocumentBody.document_id.in_(replaced)
+            ).delete(synchronize_session=False)
+        if body_rows:
+            self.db.execute(insert(DocumentBody), body_rows)
+        # New documents' terms are keyed by the ordinals just assigned
+        self._write_terms([
+            row for doc_id, content in indexed.items() for row in _term_rows(ordinals[doc_id], content)
+        ])
+        self._store_fingerprints(fingerprints, replaced)
+        
+        # One index update per field for the whole batch
+        index_service = IndexService(self.db)
+        index_service.apply_index_deltas(_index_changes(old_ordinals, ordinals, old_term_freqs, new_term_freqs),
+                                         surfaces=_term_surfaces(indexed.values()))
+        for field in SHORT_FIELDS:
+            index_service.apply_index_deltas(_index_changes(
+                old_ordinals, ordinals,
+                {doc_id: freqs[field] for doc_id, freqs in old_field_freqs.items()},
+                {doc_id: freqs[field] for doc_id, freqs in new_field_freqs.items()}
+            ), field)
+        
+        # New documents join the corpus stats, replaced ones leave them
+        # with their old lengths and changed ones rejoin with the new
+        length_deltas = {field: 0 for field in FIELDS}
+        for row in new_rows + updated_rows:
+            for field, length in document_lengths(row).items():
+                length_deltas[field] += length
+        for lengths in old_lengths.values():
+            for field, length in lengths.items():
+                length_deltas[field] -= length
+        index_service.apply_length_deltas(len(new_rows) + len(updated_rows) - len(old_lengths), length_deltas)
+        
+        collapsed = [doc_id for doc_id in replaced if doc_id in duplicates]
+        if collapsed:
+            self.db.query(Document).filter(Document.id.in_(collapsed)).delete(synchronize_session=False)
+        
+        duplicate_tokens = sum(row["length"] for row in duplicate_rows)
+        _count_near_duplicates(len(duplicate_rows), duplicate_tokens)
+        return {
+            "documents": stored,
+            "tokens": sum(content.length for content in indexed.values()),
+            "unchanged": unchanged,
+            "near_duplicates": len(duplicate_rows),
+            "near_duplicate_tokens": duplicate_tokens,
+        }, list(old_ordinals.values())
     
     def get_document(self, doc_id: str) -> Optional[Document]:
         """Get document by ID"""
         return self.db.query(Document).filter(Document.id == doc_id).first()
     
+    def get_document_body(self, doc_id: str) -> Optional[Dict[str, Optional[str]]]:
+        """Extracted ``content`` and raw ``html_content`` of a document, decompressed
+        
+        Documents are loaded without them; this is the only reader of whole
+        bodies. None when the document has no stored body.
+        """
+        row = self.db.query(
+            DocumentBody.codec, DocumentBody.content, DocumentBody.html_content
+        ).filter(DocumentBody.document_id == doc_id).first()
+        if row is None:
+            return None
+        return {
+            "content": decompress_text(row.content, row.codec),
+            "html_content": decompress_text(row.html_content, row.codec),
+        }
+    
     def get_document_by_url(self, url: str) -> Optional[Document]:
         """Get document by URL"""
         return self.db.query(Document).filter(Document.url == url).first()
@@ -98,16 +755,20 @@ class DocumentService:
     def delete_document(self, doc_id: str) -> bool:
         """Delete document and its tokens"""
         try:
-            # Delete tokens first
-            self.db.query(Token).filter(Token.document_id == doc_id).delete()
-            
-            # Delete document
             document = self.db.query(Document).filter(Document.id == doc_id).first()
             if document:
-                self.db.delete(document)
+                # Remove the document from the index, then delete it and its tokens
+                ordinal = document.ordinal
+                self._remove_document(document)
                 self.db.commit()
+                _unpublish([ordinal])
+                invalidate_results()
                 logger.info(f"Deleted document: {doc_id}")
                 return True
+            if self.db.query(NearDuplicate).filter(NearDuplicate.id == doc_id).delete():
+                self.db.commit()
+                logger.info(f"Deleted near-duplicate: {doc_id}")
+                return True
             return False
             
         except Exception as e:
@@ -121,25 +782,33 @@ class DocumentService:
     
     def search_documents_by_tokens(self, tokens: List[str]) -> List[Document]:
         """Search documents containing specific tokens"""
-        from sqlalchemy import and_
-        
-        # Find documents that contain all tokens
-        query = self.db.query(Document).join(Token, Document.id == Token.document_id)
+        terms = set(tokens)
         
-        for token in tokens:
-            query = query.filter(Token.token == token)
+        # Find documents that contain all tokens: one row per term they have
+        matching = select(DocumentTerm.document_ordinal)
+        if terms:
+            matching = matching.filter(DocumentTerm.term.in_(terms)).group_by(
+                DocumentTerm.document_ordinal
+            ).having(func.count() == len(terms))
         
-        return query.distinct().all()
+        return self.db.query(Document).filter(Document.ordinal.in_(matching)).all()
     
     def get_document_tokens(self, doc_id: str) -> List[str]:
-        """Get all tokens for a document"""
-        tokens = self.db.query(Token).filter(
-            Token.document_id == doc_id
-        ).order_by(Token.position).all()
-        return [token.token for token in tokens]
+        """Get all tokens for a document, in order"""
+        ordinal = select(Document.ordinal).filter(Document.id == doc_id).scalar_subquery()
+        tokens = {}
+        for term, positions in self.db.query(DocumentTerm.term, DocumentTerm.positions).filter(
+            DocumentTerm.document_ordinal == ordinal
+        ):
+            for position in decode_positions(positions):
+                tokens[position] = term
+        return [tokens[position] for position in sorted(tokens)]
 
 
 def get_document_service():
-    """Dependency to get document service"""
-    db = next(get_db())
-    return DocumentService(db) 
\ No newline at end of file
+    """Dependency to get document service, closing its session after the request"""
+    db = SessionLocal()
+    try:
+        yield DocumentService(db)
+    finally:
+        db.close() 
\ No newline at end of file
@@ -1,26 +1,552 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-from app.database import SearchIndex, Token, Document, get_db
-from app.utilts.tokenizer import tokenize_text
-import json
-import math
-from typing import List, Dict, Tuple
+from anyio import from_thread
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import bindparam, create_engine, func, select, text, insert, update
+from sqlalchemy.pool import NullPool
+from app.config import settings
+from app.database import CorpusStats, SearchIndex, DocumentTerm, Document, SessionLocal, get_async_session_factory
+from app.index.fields import (
+    BODY, FIELDS, SHORT_FIELDS, TITLE, URL, field_key, field_tokens, short_field_tokens, term_frequencies
+)
+from app.index.postings import (
+    PositionsView, TermInfo, concat_positions, decode_positions, encode_positions, encode_postings,
+    decode_postings
+)
+from app.index.runs import merge_runs, write_run
+from app.metrics import INDEX_BUILD_SECONDS, SearchTimer, mark_stage
+from app.index.segment import get_current_segment, publish_lock, write_segment
+from app.search.result_cache import cache_key, get_result_cache, index_generation, invalidate_results
+from app.search.query_parser import Node, parse_query, positive_terms
+from app.search.query_plan import PlanSource, PositionsReader, compile_plan, top_k
+from app.search.snippets import SnippetBuilder
+from app.search.ranking import (
+    RANKINGS, bm25_idf, bm25_tf_weights, doc_norm, impact_scale, quantize_impacts, tfidf_idf
+)
+from app.search.wand import TermCursor
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from typing import List, Dict, FrozenSet, Iterable, Optional, Sequence, Tuple
 import logging
+import os
+import shutil
+import tempfile
+import time
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per cursor round trip and inserted per executemany batch
+INDEX_BUILD_BATCH_SIZE = 5000
+# Document shards per worker in a partitioned build, to even out skew
+SHARDS_PER_WORKER = 4
+
+# Collations that order strings like Python (by code point / UTF-8 bytes),
+# which the k-way merge of postings runs relies on
+_BINARY_COLLATIONS = {"postgresql": "C", "sqlite": "BINARY"}
+# Postings per token positions query on the database fallback path
+POSITIONS_QUERY_BATCH_SIZE = 1000
+
+
+# Document column holding each field's token count
+FIELD_LENGTHS = {BODY: Document.length, TITLE: Document.title_length, URL: Document.url_length}
+
+
+def document_lengths(document) -> Dict[str, int]:
+    """Field -> token count of a document, or of a row or dict with its length columns"""
+    if isinstance(document, dict):
+        return {field: document.get(column.key) or 0 for field, column in FIELD_LENGTHS.items()}
+    return {field: getattr(document, column.key) or 0 for field, column in FIELD_LENGTHS.items()}
+
+
+def _count_field_lengths(db: Session, field: str) -> Tuple[int, int]:
+    return tuple(db.query(
+        func.count(Document.ordinal), func.coalesce(func.sum(FIELD_LENGTHS[field]), 0)
+    ).one())
+
+
+def corpus_length_stats(db: Session, field: str = BODY) -> Tuple[int, int]:
+    """Return the document count and total token count of a field
+    
+    Read from the corpus_stats table; counted from the documents table when
+    no index build has recorded them yet.
+    """
+    row = db.query(CorpusStats.document_count, CorpusStats.total_length).filter(
+        CorpusStats.field == field
+    ).first()
+    return tuple(row) if row is not None else _count_field_lengths(db, field)
+
+
+def load_doc_norms(db: Session, field: str = BODY,
+                   ordinals: Optional[Sequence[int]] = None) -> Tuple[Dict[int, float], float]:
+    """Return ordinal -> BM25 length norm of a field and its average length
+    
+    Norms are computed for ``ordinals`` only, or for every document, against
+    the average length in the stored corpus stats.
+    """
+    document_count, total_length = corpus_length_stats(db, field)
+    avg_length = total_length / document_count if document_count else 0.0
+    length = func.coalesce(FIELD_LENGTHS[field], 0)
+    if ordinals is None or len(ordinals) > document_count // 4:
+        # A large share of the corpus is cheaper to read in one scan
+        lengths = db.query(Document.ordinal, length).all()
+    else:
+        ordinals = list(ordinals)
+        lengths = [
+            row for start in range(0, len(ordinals), INDEX_BUILD_BATCH_SIZE)
+            for row in db.query(Document.ordinal, length).filter(
+                Document.ordinal.in_(ordinals[start:start + INDEX_BUILD_BATCH_SIZE])
+            )
+        ]
+    doc_norms = {
+        ordinal: doc_norm(length, avg_length, settings.bm25_k1, settings.bm25_b)
+        for ordinal, length in lengths
+    }
+    return doc_norms, avg_length
+
+
+# Columns needed to render a search result
+RESULT_COLUMNS = (Document.ordinal, Document.id, Document.title, Document.url, Document.snippet)
+
+
+def result_metadata(row) -> Dict:
+    return {"id": row.id, "title": row.title, "url": row.url, "snippet": row.snippet or ""}
+
+
+def _merge_postings(doc_ordinals: Sequence[int], term_freqs: Sequence[int],
+                    changes: Dict[int, int]) -> Tuple[List[int], List[int]]:
+    """Merge ordinal -> new frequency changes into a sorted postings list"""
+    merged_ordinals, merged_freqs = [], []
+    pending = sorted(changes.items())
+    i = 0
+    for ordinal, tf in zip(doc_ordinals, term_freqs):
+        while i < len(pending) and pending[i][0] < ordinal:
+            if pending[i][1]:
+                merged_ordinals.append(pending[i][0])
+                merged_freqs.append(pending[i][1])
+            i += 1
+        if i < len(pending) and pending[i][0] == ordinal:
+            tf = pending[i][1]
+            i += 1
+        if tf:
+            merged_ordinals.append(ordinal)
+            merged_freqs.append(tf)
+    for ordinal, tf in pending[i:]:
+        if tf:
+            merged_ordinals.append(ordinal)
+            merged_freqs.append(tf)
+    return merged_ordinals, merged_freqs
+
+
+def _postings_through(postings: bytes, max_ordinal: int) -> Tuple[Sequence[int], Sequence[int], bytes]:
+    """Decoded postings up to ``max_ordinal``, and their encoding
+    
+    Documents indexed while a segment is written are left to the next delta.
+    """
+    doc_ordinals, term_freqs = decode_postings(postings)
+    if len(doc_ordinals) and doc_ordinals[-1] > max_ordinal:
+        cut = bisect_right(doc_ordinals, max_ordinal)
+        doc_ordinals, term_freqs = doc_ordinals[:cut], term_freqs[:cut]
+        postings = encode_postings(doc_ordinals, term_freqs)
+    return doc_ordinals, term_freqs, postings
+
+
+def _published_through(reader) -> int:
+    """Highest document ordinal the current segments cover"""
+    return max(
+        segment.stats.get("max_ordinal", segment.doc_ordinals()[-1] if segment.doc_count else 0)
+        for segment in reader.segments
+    )
+
+
+def _should_merge(reader) -> bool:
+    """Whether the next publish should be a new base rather than another delta"""
+    base, *deltas = reader.segments
+    if len(deltas) >= settings.max_delta_segments:
+        return True
+    changed = sum(delta.doc_count for delta in deltas) + len(reader.deleted)
+    return changed > settings.delta_merge_ratio * base.doc_count
+
+
+def _binary_order(db: Session, column):
+    """Order strings by code point, as Python compares them"""
+    collation = _BINARY_COLLATIONS.get(db.get_bind().dialect.name)
+    return column.collate(collation) if collation else column
+
+
+def _term_positions(db: Session) -> Iterable[Tuple[str, Dict[int, Sequence[int]]]]:
+    """Stream (term, {doc ordinal: positions}) for every term, in term order"""
+    rows = (
+        db.query(DocumentTerm.term, DocumentTerm.document_ordinal, DocumentTerm.positions)
+        .order_by(_binary_order(db, DocumentTerm.term), DocumentTerm.document_ordinal)
+        .execution_options(stream_results=True, yield_per=INDEX_BUILD_BATCH_SIZE)
+    )
+    for term, postings in groupby(rows, key=itemgetter(0)):
+        yield term, {ordinal: decode_positions(positions) for _, ordinal, positions in postings}
+
+
+class _StoredPositions:
+    """Positions of one term from the document_terms table, for an index without stored positions
+    
+    Positions are read for a batch of documents per query: those the plan
+    is about to check (``prefetch``), otherwise the next
+    POSITIONS_QUERY_BATCH_SIZE postings from the cursor.
+    """
+    
+    def __init__(self, db: Session, term: str, doc_ordinals: Sequence[int]):
+        self.db = db
+        self.term = term
+        self.doc_ordinals = doc_ordinals
+        self.batch: Dict[int, List[int]] = {}
+    
+    def prefetch(self, doc_ordinals: Sequence[int]):
+        self.batch = {ordinal: [] for ordinal in doc_ordinals}
+        for start in range(0, len(doc_ordinals), POSITIONS_QUERY_BATCH_SIZE):
+            rows = self.db.query(DocumentTerm.document_ordinal, DocumentTerm.positions).filter(
+                DocumentTerm.term == self.term,
+                DocumentTerm.document_ordinal.in_(doc_ordinals[start:start + POSITIONS_QUERY_BATCH_SIZE])
+            )
+            for ordinal, positions in rows:
+                self.batch[ordinal] = decode_positions(positions)
+    
+    def __call__(self, cursor: TermCursor) -> Sequence[int]:
+        if cursor.doc not in self.batch:
+            self.prefetch(list(self.doc_ordinals[cursor.pos:cursor.pos + POSITIONS_QUERY_BATCH_SIZE]))
+        return self.batch[cursor.doc]
+
+
+class _FieldPositions:
+    """Positions of terms in a short field, re-tokenized from the documents
+    
+    Titles and URLs are short and their tokens are not stored, so the
+    documents about to be checked are loaded from the index reader's
+    doc-store in one batch and tokenized.
+    """
+    
+    def __init__(self, reader, field: str):
+        self.reader = reader
+        self.field = field
+        self.batch: Dict[int, Dict[str, List[int]]] = {}
+    
+    def prefetch(self, doc_ordinals: Sequence[int]):
+        self.batch = {ordinal: {} for ordinal in doc_ordinals}
+        for ordinal, document in self.reader.get_documents(doc_ordinals).items():
+            tokens = field_tokens(self.field, document.get("title"), document.get("url"))
+            for position, token in enumerate(tokens):
+                self.batch[ordinal].setdefault(token, []).append(position)
+    
+    def term(self, term: str) -> PositionsReader:
+        def positions(cursor: TermCursor) -> List[int]:
+            if cursor.doc not in self.batch:
+                self.prefetch(list(cursor.ordinals[cursor.pos:cursor.pos + POSITIONS_QUERY_BATCH_SIZE]))
+            return self.batch[cursor.doc].get(term, [])
+        positions.prefetch = self.prefetch
+        return positions
+
+
+class _IndexPlanSource(PlanSource):
+    """Opens the cursors of a query plan on a segment or database index reader"""
+    
+    fields = FIELDS
+    
+    def __init__(self, service: "IndexService", reader, ranking: str):
+        self.service = service
+        self.reader = reader
+        self.ranking = ranking
+        self.term_infos: Dict[Tuple[str, str], TermInfo] = {}
+        self.field_positions: Dict[str, _FieldPositions] = {}
+    
+    def term_cursor(self, term: str, field: str) -> Optional[TermCursor]:
+        term_info = self.term_infos.get((term, field)) or self.reader.lookup(term, field)
+        if not term_info:
+            logger.debug(f"No {field} index record found for token '{term}'")
+            return None
+        self.term_infos[(term, field)] = term_info
+        return self.service._term_cursor(self.reader, term_info, self.ranking, field)
+    
+    def positions(self, term: str, field: str, cursor: TermCursor) -> PositionsReader:
+        if field != BODY:
+            if field not in self.field_positions:
+                self.field_positions[field] = _FieldPositions(self.reader, field)
+            return self.field_positions[field].term(term)
+        term_info = self.term_infos[(term, field)]
+        if not term_info.positions:
+            return _StoredPositions(self.service.db, term, cursor.ordinals)
+        _, term_freqs = decode_postings(term_info.postings)
+        view = PositionsView(term_freqs, term_info.positions)
+        return lambda cursor: view.positions(cursor.pos)
+    
+    def all_docs(self) -> Sequence[int]:
+        return self.reader.doc_ordinals()
+
+
+def _write_postings_run(db: Session, first_ordinal: int, last_ordinal: int, path: str) -> int:
+    """Index documents with ordinals in [first, last] into a postings run file
+    
+    The database sorts the shard's postings by term, so only one term's
+    postings are held in memory at a time. Returns the number of terms written.
+    """
+    postings = (
+        db.query(DocumentTerm.term, DocumentTerm.document_ordinal, DocumentTerm.frequency)
+        .filter(DocumentTerm.document_ordinal.between(first_ordinal, last_ordinal))
+        .order_by(_binary_order(db, DocumentTerm.term), DocumentTerm.document_ordinal)
+        .execution_options(stream_results=True, yield_per=INDEX_BUILD_BATCH_SIZE)
+    )
+    
+    def terms():
+        for term, term_postings in groupby(postings, key=itemgetter(0)):
+            _, doc_ordinals, term_freqs = zip(*term_postings)
+            yield term, TermInfo(
+                len(doc_ordinals), max(term_freqs), encode_postings(doc_ordinals, term_freqs)
+            )
+    
+    return write_run(path, terms())
+
+
+def _write_postings_run_in_worker(database_url: str, first_ordinal: int, last_ordinal: int,
+                                  path: str) -> int:
+    """Process pool entry point: _write_postings_run on a fresh connection"""
+    engine = create_engine(database_url, poolclass=NullPool)
+    db = sessionmaker(bind=engine)()
+    try:
+        return _write_postings_run(db, first_ordinal, last_ordinal, path)
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _ordinal_ranges(first: int, last: int, shards: int) -> List[Tuple[int, int]]:
+    """Split [first, last] into up to ``shards`` contiguous, ascending ranges"""
+    step = max(1, -(-(last - first + 1) // shards))
+    return [(start, min(start + step - 1, last)) for start in range(first, last + 1, step)]
+
+
+class DatabaseIndexReader:
+    """Index reader backed by the search_indices and documents tables"""
+    
+    # The tables are always current, with no deleted documents left to skip
+    deleted: FrozenSet[int] = frozenset()
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self._doc_count = None
+        self._doc_norms: Dict[str, Dict[int, float]] = {}
+    
+    @property
+    def doc_count(self) -> int:
+        if self._doc_count is None:
+            self._doc_count, _ = corpus_length_stats(self.db)
+        return self._doc_count
+    
+    def doc_norms(self, field: str, doc_ordinals: Sequence[int]) -> Dict[int, float]:
+        """BM25 length norms of a field for the documents of a postings list
+        
+        The database has no precomputed impacts, so BM25 on this fallback
+        path reads the lengths of the documents it scores, each once per
+        request, and the average length from the stored corpus stats.
+        """
+        norms = self._doc_norms.setdefault(field, {})
+        missing = [ordinal for ordinal in doc_ordinals if ordinal not in norms]
+        if missing:
+            norms.update(load_doc_norms(self.db, field, missing)[0])
+        return norms
+    
+    def doc_ordinals(self) -> Sequence[int]:
+        """Ascending ordinals of every document, for queries that only exclude"""
+        return array("I", self.db.scalars(select(Document.ordinal).order_by(Document.ordinal)))
+    
+    def lookup(self, term: str, field: str = BODY) -> Optional[TermInfo]:
+        """Return the dictionary entry for a term in a field"""
+        row = self.db.query(
+            SearchIndex.document_frequency, SearchIndex.max_term_frequency, SearchIndex.postings
+        ).filter(SearchIndex.field == field, SearchIndex.term == term).first()
+        return TermInfo(*row) if row else None
+    
+    def get_documents(self, ordinals: Iterable[int]) -> Dict[int, Dict]:
+        """Return result metadata and snippets for the given document ordinals
+        
+        One query for the whole page, loading only the result columns and
+        never the page bodies.
+        """
+        ordinals = list(ordinals)
+        if not ordinals:
+            return {}
+        rows = self.db.query(*RESULT_COLUMNS).filter(Document.ordinal.in_(ordinals)).all()
+        return {row.ordinal: result_metadata(row) for row in rows}
+
 
 class IndexService:
     def __init__(self, db: Session):
         self.db = db
     
-    def build_tfidf_index(self) -> Tuple[Dict[str, Dict[str, float]], Dict[str, int]]:
-        """Build TF-IDF index from database"""
+    def build_tfidf_index(self, mode: Optional[str] = None,
+                          workers: Optional[int] = None) -> Dict[str, int]:
+        """Build TF-IDF index from database and return term -> document frequency
+
+        ``grouped`` streams the (term, document, frequency) rows of
+        ``document_terms`` in term order from a server-side cursor, so build
+        time is linear in the number of postings.
+        ``partitioned`` runs the same scan per document shard in
+        ``workers`` processes and k-way merges their sorted runs.
+        ``per_document`` is the original one-query-per-document build, kept
+        for benchmarking. ``mode`` defaults to settings.index_build_mode.
+        """
+        mode = mode or settings.index_build_mode
+        if mode == "per_document":
+            _, term_doc_freq = self._build_tfidf_index_per_document()
+            return term_doc_freq
+        if mode == "partitioned":
+            return self._build_tfidf_index_partitioned(workers)
+        if mode != "grouped":
+            raise ValueError(f"Unknown index build mode: {mode}")
+        
+        try:
+            logger.info("Building TF-IDF index from document term frequencies...")
+            
+            total_docs = self.db.query(func.count(Document.id)).scalar()
+            if total_docs == 0:
+                logger.warning("No documents found for indexing")
+                return {}
+            
+            # One row per (term, document) posting, ordered by term so each
+            # term's postings arrive contiguously from the cursor
+            postings = (
+                self.db.query(DocumentTerm.term, DocumentTerm.document_ordinal, DocumentTerm.frequency)
+                .order_by(DocumentTerm.term, DocumentTerm.document_ordinal)
+                .execution_options(stream_results=True, yield_per=INDEX_BUILD_BATCH_SIZE)
+            )
+            
+            # Clear existing indices
+            self.db.query(SearchIndex).delete()
+            
+            term_doc_freq = {}
+            batch = []
+            for term, term_postings in groupby(postings, key=itemgetter(0)):
+                _, doc_ordinals, term_freqs = zip(*term_postings)
+                doc_freq = len(doc_ordinals)
+                
+                batch.append({
+                    "term": term,
+                    "document_frequency": doc_freq,
+                    "max_term_frequency": max(term_freqs),
+                    "postings": encode_postings(doc_ordinals, term_freqs),
+                })
+                term_doc_freq[term] = doc_freq
+                
+                if len(batch) >= INDEX_BUILD_BATCH_SIZE:
+                    self.db.execute(insert(SearchIndex), batch)
+                    batch = []
+            
+            if batch:
+                self.db.execute(insert(SearchIndex), batch)
+            self._insert_field_index()
+            self._store_surface_forms()
+            self.db.commit()
+            
+            logger.info(f"TF-IDF index built with {len(term_doc_freq)} terms")
+            return term_doc_freq
+            
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error building TF-IDF index: {e}")
+            raise
+    
+    def _build_tfidf_index_partitioned(self, workers: Optional[int] = None) -> Dict[str, int]:
+        """Build the index from per-shard postings runs merged on disk
+        
+        Documents are sharded by ordinal range. Each worker process writes
+        its shard's postings, sorted by term, to a run file under
+        settings.index_dir; the runs are then k-way merged into the
+        search_indices table. Peak memory is one term's postings per process
+        plus one insert batch, whatever the corpus size.
+        """
+        workers = settings.index_build_workers if workers is None else workers
+        workers = workers or os.cpu_count() or 1
+        
+        try:
+            logger.info(f"Building TF-IDF index with {workers} worker processes...")
+            
+            first_ordinal, last_ordinal = self.db.query(
+                func.min(Document.ordinal), func.max(Document.ordinal)
+            ).one()
+            if first_ordinal is None:
+                logger.warning("No documents found for indexing")
+                return {}
+            shards = _ordinal_ranges(first_ordinal, last_ordinal, workers * SHARDS_PER_WORKER)
+            
+            os.makedirs(settings.index_dir, exist_ok=True)
+            run_dir = tempfile.mkdtemp(prefix=".build-", dir=settings.index_dir)
+            try:
+                started = time.perf_counter()
+                run_paths = [os.path.join(run_dir, f"run-{i:05d}") for i in range(len(shards))]
+                url = self.db.get_bind().url
+                if workers > 1 and url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+                    logger.warning("In-memory database is not visible to worker processes; building in-process")
+                    workers = 1
+                
+                if workers > 1:
+                    database_url = url.render_as_string(hide_password=False)
+                    with ProcessPoolExecutor(max_workers=workers) as pool:
+                        run_terms = list(pool.map(
+                            _write_postings_run_in_worker,
+                            [database_url] * len(shards),
+                            [first for first, _ in shards],
+                            [last for _, last in shards],
+                            run_paths
+                        ))
+                else:
+                    run_terms = [
+                        _write_postings_run(self.db, first, last, path)
+                        for (first, last), path in zip(shards, run_paths)
+                    ]
+                logger.info(f"Wrote {len(run_paths)} postings runs with {sum(run_terms)} partial terms "
+                            f"in {time.perf_counter() - started:.2f}s")
+                started = time.perf_counter()
+                
+                # Clear existing indices
+                self.db.query(SearchIndex).delete()
+                
+                term_doc_freq = {}
+                batch = []
+                for term, info in merge_runs(run_paths):
+                    batch.append({
+                        "term": term,
+                        "document_frequency": info.document_frequency,
+                        "max_term_frequency": info.max_term_frequency,
+                        "postings": info.postings,
+                    })
+                    term_doc_freq[term] = info.document_frequency
+                    
+                    if len(batch) >= INDEX_BUILD_BATCH_SIZE:
+                        self.db.execute(insert(SearchIndex), batch)
+                        batch = []
+                
+                if batch:
+                    self.db.execute(insert(SearchIndex), batch)
+                self._insert_field_index()
+                self._store_surface_forms()
+                self.db.commit()
+                logger.info(f"Merged runs into {len(term_doc_freq)} terms in {time.perf_counter() - started:.2f}s")
+            finally:
+                shutil.rmtree(run_dir, ignore_errors=True)
+            
+            logger.info(f"TF-IDF index built with {len(term_doc_freq)} terms")
+            return term_doc_freq
+            
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error building TF-IDF index: {e}")
+            raise
+    
+    def _build_tfidf_index_per_document(self) -> Tuple[Dict[str, Dict[int, int]], Dict[str, int]]:
+        """Build TF-IDF index with one term query per document"""
         try:
             logger.info("Building TF-IDF index...")
             
-            # Get all documents and their tokens
-            documents = self.db.query(Document).all()
+            # Get all documents; their terms are read one document at a time
+            documents = self.db.query(Document.id, Document.ordinal).all()
             total_docs = len(documents)
             
             if total_docs == 0:
@@ -32,47 +558,40 @@ class IndexService:
             doc_term_freq = {}
             
             for doc in documents:
-                tokens = self.db.query(Token).filter(Token.document_id == doc.id).all()
-                doc_terms = {}
+                # Term frequencies in this document
+                doc_terms = dict(self.db.query(DocumentTerm.term, DocumentTerm.frequency).filter(
+                    DocumentTerm.document_ordinal == doc.ordinal
+                ).all())
                 
-                for token in tokens:
-                    term = token.token
-                    # Count term frequency in this document
-                    doc_terms[term] = doc_terms.get(term, 0) + 1
-                    # Count how many documents contain this term
+                # Count how many documents contain each term
+                for term in doc_terms:
                     term_doc_freq[term] = term_doc_freq.get(term, 0) + 1
                 
-                doc_term_freq[doc.id] = doc_terms
+                doc_term_freq[doc.ordinal] = doc_terms
             
-            # Calculate TF-IDF scores
-            tfidf_index = {}
+            # Collect term frequency postings; IDF is applied at query time
+            tf_index = {}
             
-            for term, doc_freq in term_doc_freq.items():
-                # IDF = log(total_docs / doc_freq)
-                idf = math.log(total_docs / doc_freq)
-                tfidf_scores = {}
+            for term in term_doc_freq:
+                term_freqs = {}
                 
-                for doc_id, term_freqs in doc_term_freq.items():
-                    if term in term_freqs:
-                        # TF = term frequency in document
-                        tf = term_freqs[term]
-                        # TF-IDF = TF * IDF
-                        tfidf_score = tf * idf
-                        tfidf_scores[doc_id] = tfidf_score
+                for doc_ordinal, doc_terms in doc_term_freq.items():
+                    if term in doc_terms:
+                        term_freqs[doc_ordinal] = doc_terms[term]
                 
-                tfidf_index[term] = tfidf_scores
+                tf_index[term] = term_freqs
             
             # Store in database
-            self._store_search_index(tfidf_index, term_doc_freq)
+            self._store_search_index(tf_index, term_doc_freq)
             
-            logger.info(f"TF-IDF index built with {len(tfidf_index)} terms")
-            return tfidf_index, term_doc_freq
+            logger.info(f"TF-IDF index built with {len(tf_index)} terms")
+            return tf_index, term_doc_freq
             
         except Exception as e:
             logger.error(f"Error building TF-IDF index: {e}")
             raise
     
-    def _store_search_index(self, tfidf_index: Dict[str, Dict[str, float]], 
+    def _store_search_index(self, tf_index: Dict[str, Dict[int, int]], 
                            term_doc_freq: Dict[str, int]):
         """Store search index in database"""
         try:
@@ -80,21 +599,21 @@ class IndexService:
             self.db.query(SearchIndex).delete()
             
             # Store each term's data
-            for term, tfidf_scores in tfidf_index.items():
+            for term, term_freqs in tf_index.items():
                 doc_freq = term_doc_freq.get(term, 0)
-                
-                # Create inverted index (list of document IDs)
-                doc_ids = list(tfidf_scores.keys())
+                doc_ordinals = sorted(term_freqs)
                 
                 index_record = SearchIndex(
                     term=term,
                     document_frequency=doc_freq,
-                    tfidf_data=json.dumps(tfidf_scores),
-                    inverted_index_data=json.dumps(doc_ids)
+                    max_term_frequency=max(term_freqs.values()),
+                    postings=encode_postings(doc_ordinals, [term_freqs[o] for o in doc_ordinals])
                 )
                 
                 self.db.add(index_record)
             
+            self._insert_field_index()
+            self._store_surface_forms()
             self.db.commit()
             logger.info("Search index stored in database")
             
@@ -103,117 +622,467 @@ class IndexService:
             logger.error(f"Error storing search index: {e}")
             raise
     
-    def search(self, query: str, operation: str = "AND", limit: int = 10) -> List[Dict]:
-        """Search documents using the index"""
-        try:
-            # Tokenize query
-            query_tokens = tokenize_text(query)
-            logger.info(f"Query tokens: {query_tokens}")
-            if not query_tokens:
-                logger.warning("No tokens found in query")
-                return []
-            
-            # Get search results for each token
-            token_results = {}
-            for token in query_tokens:
-                index_record = self.db.query(SearchIndex).filter(
-                    SearchIndex.term == token
-                ).first()
-                
-                if index_record:
-                    tfidf_data = json.loads(index_record.tfidf_data)
-                    token_results[token] = tfidf_data
-                    logger.info(f"Found index record for token '{token}' with {len(tfidf_data)} documents")
-                else:
-                    logger.info(f"No index record found for token '{token}'")
+    def _insert_field_index(self) -> int:
+        """Index the title and URL fields of every document; the caller commits
+        
+        Titles and URL paths are short, so they are re-tokenized from the
+        documents table and their postings collected in memory as arrays, in
+        ordinal order. Stored field lengths that disagree with the tokens,
+        such as those of documents ingested before the fields were indexed,
+        are corrected on the way, then the corpus stats of every field are
+        recounted. Returns the number of field terms written.
+        """
+        started = time.perf_counter()
+        postings = {field: {} for field in SHORT_FIELDS}
+        length_updates = []
+        documents = self.db.query(
+            Document.id, Document.ordinal, Document.title, Document.url,
+            Document.title_length, Document.url_length
+        ).order_by(Document.ordinal).execution_options(stream_results=True, yield_per=INDEX_BUILD_BATCH_SIZE)
+        for row in documents:
+            tokens = short_field_tokens(row.title, row.url)
+            for field, field_terms in tokens.items():
+                for term, tf in term_frequencies(field_terms).items():
+                    doc_ordinals, term_freqs = postings[field].setdefault(term, (array("I"), array("I")))
+                    doc_ordinals.append(row.ordinal)
+                    term_freqs.append(tf)
+            lengths = {"title_length": len(tokens[TITLE]), "url_length": len(tokens[URL])}
+            if (row.title_length, row.url_length) != (lengths["title_length"], lengths["url_length"]):
+                length_updates.append({"id": row.id, **lengths})
+        
+        rows = [
+            {
+                "field": field,
+                "term": term,
+                "document_frequency": len(doc_ordinals),
+                "max_term_frequency": max(term_freqs),
+                "postings": encode_postings(doc_ordinals, term_freqs),
+            }
+            for field, field_postings in postings.items()
+            for term, (doc_ordinals, term_freqs) in field_postings.items()
+        ]
+        for start in range(0, len(rows), INDEX_BUILD_BATCH_SIZE):
+            self.db.execute(insert(SearchIndex), rows[start:start + INDEX_BUILD_BATCH_SIZE])
+        for start in range(0, len(length_updates), INDEX_BUILD_BATCH_SIZE):
+            self.db.execute(update(Document), length_updates[start:start + INDEX_BUILD_BATCH_SIZE])
+        stats = []
+        for field in FIELDS:
+            document_count, total_length = _count_field_lengths(self.db, field)
+            stats.append({"field": field, "document_count": document_count, "total_length": total_length})
+        self.db.query(CorpusStats).delete()
+        self.db.execute(insert(CorpusStats), stats)
+        logger.info(f"Indexed {len(rows)} title and URL terms in {time.perf_counter() - started:.2f}s")
+        return len(rows)
+    
+    def apply_document_delta(self, doc_ordinal: int, old_term_freqs: Dict[str, int],
+                             new_term_freqs: Dict[str, int], field: str = BODY,
+                             surfaces: Optional[Dict[str, str]] = None,
+                             old_ordinal: Optional[int] = None):
+        """Update the postings of the terms a single document added or removed
+        
+        Only the terms in either frequency map are touched, so the cost is
+        proportional to the document, not the corpus. A document re-indexed
+        under a new ordinal leaves the postings under ``old_ordinal``. Runs
+        inside the caller's transaction; the caller commits.
+        """
+        old_ordinal = doc_ordinal if old_ordinal is None else old_ordinal
+        changes = {term: {old_ordinal: 0} for term in old_term_freqs}
+        for term, frequency in new_term_freqs.items():
+            changes.setdefault(term, {})[doc_ordinal] = frequency
+        self.apply_index_deltas(changes, field, surfaces)
+    
+    def _store_surface_forms(self) -> int:
+        """Give every body term its most frequent surface form; the caller commits
+        
+        Sums each term's occurrences per surface form recorded in
+        document_terms. Returns the number of terms updated.
+        """
+        started = time.perf_counter()
+        occurrences = self.db.query(
+            DocumentTerm.term, DocumentTerm.surface, func.sum(DocumentTerm.frequency)
+        ).filter(DocumentTerm.surface.isnot(None)).group_by(DocumentTerm.term, DocumentTerm.surface).order_by(
+            DocumentTerm.term
+        ).execution_options(stream_results=True, yield_per=INDEX_BUILD_BATCH_SIZE)
+        statement = update(SearchIndex).where(
+            SearchIndex.field == BODY, SearchIndex.term == bindparam("term_key")
+        ).values(surface=bindparam("surface_value"))
+        
+        updated, batch = 0, []
+        for term, forms in groupby(occurrences, key=itemgetter(0)):
+            batch.append({"term_key": term, "surface_value": max(forms, key=itemgetter(2))[1]})
+            if len(batch) >= INDEX_BUILD_BATCH_SIZE:
+                self.db.connection().execute(statement, batch)
+                updated, batch = updated + len(batch), []
+        if batch:
+            self.db.connection().execute(statement, batch)
+            updated += len(batch)
+        logger.info(f"Stored surface forms of {updated} terms in {time.perf_counter() - started:.2f}s")
+        return updated
+    
+    def apply_length_deltas(self, documents: int, lengths: Dict[str, int]):
+        """Add documents and field -> token counts to the stored corpus stats
+        
+        Negative values remove them. Atomic increments, so concurrent writers
+        cannot lose updates; runs inside the caller's transaction.
+        """
+        for field, length in lengths.items():
+            self.db.query(CorpusStats).filter(CorpusStats.field == field).update({
+                CorpusStats.document_count: CorpusStats.document_count + documents,
+                CorpusStats.total_length: CorpusStats.total_length + length,
+            }, synchronize_session=False)
+    
+    def apply_index_deltas(self, changes: Dict[str, Dict[int, int]], field: str = BODY,
+                           surfaces: Optional[Dict[str, str]] = None):
+        """Apply term -> {doc ordinal: new term frequency} changes to a field's index
+        
+        A frequency of 0 removes the document from the term's postings. Each
+        affected term is decoded and re-encoded once however many documents
+        changed it, which lets bulk ingestion update the index per batch.
+        ``surfaces`` gives the surface forms of terms that have none yet;
+        the most frequent ones are only worked out by index builds. Runs
+        inside the caller's transaction; the caller commits.
+        """
+        surfaces = surfaces or {}
+        affected_terms = sorted(changes)
+        if not affected_terms:
+            return
+        
+        # Lock the affected rows in term order so concurrent deltas cannot deadlock
+        index_rows = {}
+        for start in range(0, len(affected_terms), INDEX_BUILD_BATCH_SIZE):
+            chunk = affected_terms[start:start + INDEX_BUILD_BATCH_SIZE]
+            for row in self.db.query(
+                SearchIndex.id, SearchIndex.term, SearchIndex.postings, SearchIndex.surface
+            ).filter(
+                SearchIndex.field == field, SearchIndex.term.in_(chunk)
+            ).order_by(SearchIndex.term).with_for_update():
+                index_rows[row.term] = row
+        
+        inserts, updates, deletes = [], [], []
+        for term in affected_terms:
+            row = index_rows.get(term)
+            doc_ordinals, term_freqs = _merge_postings(
+                *decode_postings(row.postings if row else b""), changes[term]
+            )
             
-            logger.info(f"Token results: {list(token_results.keys())}")
-            if not token_results:
-                logger.warning("No token results found")
-                return []
+            if not doc_ordinals:
+                if row:
+                    deletes.append(row.id)
+                continue
             
-            # Combine results based on operation
-            if operation == "AND":
-                # Find documents that contain ALL tokens
-                doc_sets = [set(scores.keys()) for scores in token_results.values()]
-                if not doc_sets:
-                    return []
-                matched_docs = set.intersection(*doc_sets)
-            elif operation == "OR":
-                # Find documents that contain ANY token
-                matched_docs = set()
-                for scores in token_results.values():
-                    matched_docs.update(scores.keys())
+            values = {
+                "document_frequency": len(doc_ordinals),
+                "max_term_frequency": max(term_freqs),
+                "postings": encode_postings(doc_ordinals, term_freqs),
+            }
+            surface = row.surface if row else None
+            values["surface"] = surface or surfaces.get(term)
+            if row:
+                updates.append({"id": row.id, **values})
             else:
-                # Default to OR
-                matched_docs = set()
-                for scores in token_results.values():
-                    matched_docs.update(scores.keys())
-            
-            # Calculate combined scores
-            doc_scores = {}
-            for doc_id in matched_docs:
-                score = 0
-                for token_scores in token_results.values():
-                    score += token_scores.get(doc_id, 0)
-                doc_scores[doc_id] = score
-            
-            # Sort by score and get top results
-            sorted_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)
-            
-            # Get document details
-            results = []
-            for doc_id, score in sorted_docs[:limit]:
-                document = self.db.query(Document).filter(Document.id == doc_id).first()
-                if document:
-                    # Get snippet
-                    tokens = self.db.query(Token).filter(
-                        Token.document_id == doc_id
-                    ).order_by(Token.position).limit(20).all()
-                    
-                    snippet_tokens = [token.token for token in tokens]
-                    snippet = " ".join(snippet_tokens)
-                    if len(snippet) > 200:
-                        snippet = snippet[:200] + "..."
-                    
-                    results.append({
-                        "id": doc_id,
-                        "title": document.title,
-                        "url": document.url,
-                        "snippet": snippet,
-                        "score": score
-                    })
-            
-            return results
+                inserts.append({"field": field, "term": term, **values})
+        
+        # Write back with executemany batches rather than one ORM object per term
+        for start in range(0, len(deletes), INDEX_BUILD_BATCH_SIZE):
+            self.db.query(SearchIndex).filter(
+                SearchIndex.id.in_(deletes[start:start + INDEX_BUILD_BATCH_SIZE])
+            ).delete(synchronize_session=False)
+        for statement, rows in ((update(SearchIndex), updates), (insert(SearchIndex), inserts)):
+            for start in range(0, len(rows), INDEX_BUILD_BATCH_SIZE):
+                self.db.execute(statement, rows[start:start + INDEX_BUILD_BATCH_SIZE])
+    
+    def search(self, query: str, operation: str = "AND", limit: int = 10,
+               ranking: Optional[str] = None, highlight: Optional[bool] = None) -> List[Dict]:
+        """Search documents using the index, ranked by TF-IDF or BM25
+        
+        ``"quoted phrases"`` and ``term NEAR/k term`` clauses must match in
+        every result; the remaining terms are combined with ``operation``.
+        With ``highlight`` each result's snippet is centred on the query
+        terms and comes with highlight spans; it defaults to
+        settings.highlight_snippets, and when that is None to whether the
+        database rather than a segment is searched.
+        """
+        ranking = ranking or settings.default_ranking
+        if highlight is None:
+            highlight = settings.highlight_snippets
+        if highlight is None:
+            highlight = isinstance(self.get_index_reader(), DatabaseIndexReader)
+        if ranking not in RANKINGS:
+            raise ValueError(f"Unknown ranking: {ranking}")
+        
+        try:
+            with SearchTimer("index") as timer:
+                # Parse the query into a normalized tree of terms and operators
+                query_tree = parse_query(query, operation)
+                timer.mark("parse")
+                logger.debug(f"Query: {query_tree}")
+                if query_tree is None:
+                    logger.warning("No tokens found in query")
+                    return []
+                
+                # Read the generation before searching: if the index changes
+                # mid-search the result is filed under the older generation
+                cache = get_result_cache()
+                if cache is not None:
+                    key = cache_key(query_tree, limit, ranking, highlight)
+                    generation = index_generation()
+                    cached = cache.get(key, generation)
+                    timer.mark("cache")
+                    if cached is not None:
+                        return cached
+                
+                results = self._search_tree(query_tree, limit, ranking, highlight)
+                if cache is not None:
+                    cache.put(key, generation, results)
+                    timer.mark("cache")
+                return results
             
         except Exception as e:
             logger.error(f"Error searching: {e}")
             return []
     
+    def _search_tree(self, query_tree: Node, limit: int, ranking: str, highlight: bool) -> List[Dict]:
+        """Evaluate a parsed query against the current index
+        
+        Timed stages: ``fetch`` (term lookups and postings decoding),
+        ``rank`` (top-k evaluation, including positional checks), ``hydrate``
+        (result metadata) and ``highlight``.
+        """
+        reader = self.get_index_reader()
+        
+        # Document-at-a-time top-k evaluation; plain AND/OR queries use WAND,
+        # which skips documents whose score bound cannot enter the top k
+        plan = compile_plan(query_tree, _IndexPlanSource(self, reader, ranking))
+        mark_stage("fetch")
+        if plan is None:
+            logger.debug("No token results found")
+            return []
+        top_docs = top_k(plan, limit, reader.deleted)
+        mark_stage("rank")
+        
+        # Get document details
+        documents = reader.get_documents([doc_ordinal for doc_ordinal, _ in top_docs])
+        results = []
+        for doc_ordinal, score in top_docs:
+            document = documents.get(doc_ordinal)
+            if document:
+                results.append({**document, "score": score})
+        mark_stage("hydrate")
+        
+        if highlight:
+            try:
+                self._highlight(results, positive_terms(query_tree))
+            except Exception as e:
+                # Fall back to the precomputed snippets
+                logger.warning(f"Error building snippets: {e}")
+            mark_stage("highlight")
+        
+        return results
+    
+    def _highlight(self, results: List[Dict], terms: Sequence[str]):
+        """Replace a page of results' snippets with query-aware ones"""
+        SnippetBuilder(self.db).highlight(results, terms)
+    
+    def _term_cursor(self, reader, term_info: TermInfo, ranking: str, field: str = BODY) -> TermCursor:
+        """Open a scoring cursor over a term's postings in one field
+        
+        IDF and the field boost are applied at query time so incremental
+        updates never have to rewrite the postings of unaffected terms. IDF
+        is the term's in that field; BM25 normalizes by the field's length.
+        """
+        doc_ordinals, term_freqs = decode_postings(term_info.postings)
+        total_docs = reader.doc_count
+        boost = settings.field_boosts.get(field, 1.0)
+        
+        if ranking == "bm25":
+            idf = bm25_idf(total_docs, term_info.document_frequency) * boost
+            if term_info.max_impact:
+                # Impacts were precomputed when the segment was published
+                multiplier = idf * impact_scale(reader.stats["bm25_k1"])
+                return TermCursor(doc_ordinals, term_info.impacts, multiplier,
+                                  term_info.max_impact * multiplier)
+            k1 = settings.bm25_k1
+            weights = bm25_tf_weights(doc_ordinals, term_freqs, reader.doc_norms(field, doc_ordinals), k1)
+            return TermCursor(doc_ordinals, weights, idf, idf * (k1 + 1))
+        
+        idf = tfidf_idf(total_docs, term_info.document_frequency) * boost
+        return TermCursor(doc_ordinals, term_freqs, idf, term_info.max_term_frequency * idf)
+    
+    def get_index_reader(self):
+        """Return the published segment if one is available, otherwise read from the database"""
+        if settings.use_segment_index:
+            segment = get_current_segment(settings.index_dir)
+            if segment is not None:
+                return segment
+        return DatabaseIndexReader(self.db)
+    
+    def publish_segment(self) -> str:
+        """Snapshot the database index into a new base segment and make it current
+        
+        Copies the already-encoded postings, adds precomputed BM25 impacts
+        and streams document metadata with the snippets stored at ingestion,
+        so the cost is linear in the index size with no re-tokenization.
+        Token positions are merged in from the document_terms table, both streams
+        sorted by term, for phrase and NEAR queries. Title and URL postings
+        get impacts normalized by their own field lengths, so multi-field
+        BM25 is as cheap at query time as body-only. Delta segments
+        published before are merged away.
+        """
+        with publish_lock(settings.index_dir):
+            return self._write_base_segment()
+    
+    def publish_changes(self) -> Optional[str]:
+        """Make the documents indexed since the last publish visible to segment readers
+        
+        They are published as a small delta segment, read from the
+        document_terms rows of those documents only. Once there are
+        settings.max_delta_segments deltas, or deltas and deleted documents
+        reach settings.delta_merge_ratio of the base, a new base segment is
+        published instead. Returns the new segment's name, None when there
+        was nothing to publish. A document committed after a publish under
+        a lower ordinal than it covers waits for the next base.
+        """
+        with publish_lock(settings.index_dir):
+            current = get_current_segment(settings.index_dir)
+            if current is None or _should_merge(current):
+                return self._write_base_segment()
+            return self._write_delta_segment(_published_through(current))
+    
+    def _segment_stats(self, max_ordinal: int) -> Dict:
+        """Collection statistics stored with a segment's impacts"""
+        avg_field_lengths = {}
+        for field in FIELDS:
+            document_count, total_length = corpus_length_stats(self.db, field)
+            avg_field_lengths[field] = total_length / document_count if document_count else 0.0
+        return {
+            "avg_doc_length": avg_field_lengths[BODY], "bm25_k1": settings.bm25_k1, "bm25_b": settings.bm25_b,
+            "avg_field_lengths": avg_field_lengths,
+            # Documents above it go to the next delta
+            "max_ordinal": max_ordinal,
+        }
+    
+    def _write_base_segment(self) -> str:
+        """publish_segment, once the publish lock is held"""
+        started = time.perf_counter()
+        k1 = settings.bm25_k1
+        max_ordinal = self.db.scalar(select(func.max(Document.ordinal))) or 0
+        doc_norms, _ = load_doc_norms(self.db)
+        
+        def field_rows(field: str):
+            return self.db.query(
+                SearchIndex.term, SearchIndex.postings, SearchIndex.surface
+            ).filter(SearchIndex.field == field).order_by(
+                _binary_order(self.db, SearchIndex.term)
+            ).execution_options(stream_results=True, yield_per=INDEX_BUILD_BATCH_SIZE)
+        
+        def terms():
+            term_positions = _term_positions(self.db)
+            pending = next(term_positions, None)
+            for term, postings, surface in field_rows(BODY):
+                doc_ordinals, term_freqs, postings = _postings_through(postings, max_ordinal)
+                if not doc_ordinals:
+                    continue
+                impacts, max_impact = quantize_impacts(doc_ordinals, term_freqs, doc_norms, k1)
+                
+                while pending is not None and pending[0] < term:
+                    pending = next(term_positions, None)
+                by_doc = pending[1] if pending is not None and pending[0] == term else {}
+                position_lists = [by_doc.get(doc_ordinal, ()) for doc_ordinal in doc_ordinals]
+                if all(len(p) == tf for p, tf in zip(position_lists, term_freqs)):
+                    positions = encode_positions(position_lists)
+                else:
+                    # Tokens out of step with the postings: leave positions
+                    # to the document_terms table rather than misalign them
+                    logger.warning(f"Positions for '{term}' do not match its postings")
+                    positions = b""
+                yield term, TermInfo(len(doc_ordinals), max(term_freqs), postings, impacts, max_impact,
+                                     positions, surface or "")
+            
+            # Short field positions are re-tokenized from the doc-store when needed
+            for field in SHORT_FIELDS:
+                field_norms, _ = load_doc_norms(self.db, field)
+                for term, postings, _ in field_rows(field):
+                    doc_ordinals, term_freqs, postings = _postings_through(postings, max_ordinal)
+                    if not doc_ordinals:
+                        continue
+                    impacts, max_impact = quantize_impacts(doc_ordinals, term_freqs, field_norms, k1)
+                    yield field_key(field, term), TermInfo(len(doc_ordinals), max(term_freqs), postings,
+                                                           impacts, max_impact)
+        
+        documents = self.db.query(*RESULT_COLUMNS).filter(Document.ordinal <= max_ordinal).order_by(
+            Document.ordinal
+        ).execution_options(stream_results=True, yield_per=INDEX_BUILD_BATCH_SIZE)
+        doc_store = ((row.ordinal, result_metadata(row)) for row in documents)
+        
+        name = write_segment(settings.index_dir, terms(), doc_store, self._segment_stats(max_ordinal))
+        invalidate_results()
+        INDEX_BUILD_SECONDS.labels("publish").observe(time.perf_counter() - started)
+        return name
+    
+    def _write_delta_segment(self, published_through: int) -> Optional[str]:
+        """Publish the documents with ordinals above ``published_through`` as a delta segment"""
+        started = time.perf_counter()
+        k1 = settings.bm25_k1
+        max_ordinal = self.db.scalar(select(func.max(Document.ordinal))) or 0
+        in_delta = Document.ordinal.between(published_through + 1, max_ordinal)
+        documents = self.db.query(*RESULT_COLUMNS).filter(in_delta).order_by(Document.ordinal).all()
+        if not documents:
+            return None
+        ordinals = [row.ordinal for row in documents]
+        
+        def terms():
+            doc_norms, _ = load_doc_norms(self.db, BODY, ordinals)
+            rows = self.db.query(
+                DocumentTerm.term, DocumentTerm.document_ordinal, DocumentTerm.frequency,
+                DocumentTerm.positions, DocumentTerm.surface
+            ).filter(
+                DocumentTerm.document_ordinal.between(published_through + 1, max_ordinal)
+            ).order_by(
+                _binary_order(self.db, DocumentTerm.term), DocumentTerm.document_ordinal
+            ).execution_options(stream_results=True, yield_per=INDEX_BUILD_BATCH_SIZE)
+            for term, postings in groupby(rows, key=itemgetter(0)):
+                _, doc_ordinals, term_freqs, positions, surfaces = zip(*postings)
+                impacts, max_impact = quantize_impacts(doc_ordinals, term_freqs, doc_norms, k1)
+                forms = {}
+                for term_freq, surface in zip(term_freqs, surfaces):
+                    if surface:
+                        forms[surface] = forms.get(surface, 0) + term_freq
+                yield term, TermInfo(
+                    len(doc_ordinals), max(term_freqs), encode_postings(doc_ordinals, term_freqs),
+                    impacts, max_impact, concat_positions(positions), max(forms, key=forms.get, default="")
+                )
+            
+            for field in SHORT_FIELDS:
+                field_norms, _ = load_doc_norms(self.db, field, ordinals)
+                field_postings: Dict[str, Tuple[List[int], List[int]]] = {}
+                for row in documents:
+                    for term, frequency in term_frequencies(short_field_tokens(row.title, row.url)[field]).items():
+                        doc_ordinals, term_freqs = field_postings.setdefault(term, ([], []))
+                        doc_ordinals.append(row.ordinal)
+                        term_freqs.append(frequency)
+                for term, (doc_ordinals, term_freqs) in field_postings.items():
+                    impacts, max_impact = quantize_impacts(doc_ordinals, term_freqs, field_norms, k1)
+                    yield field_key(field, term), TermInfo(
+                        len(doc_ordinals), max(term_freqs), encode_postings(doc_ordinals, term_freqs),
+                        impacts, max_impact
+                    )
+        
+        doc_store = ((row.ordinal, result_metadata(row)) for row in documents)
+        name = write_segment(settings.index_dir, terms(), doc_store, self._segment_stats(max_ordinal), delta=True)
+        invalidate_results()
+        INDEX_BUILD_SECONDS.labels("publish_delta").observe(time.perf_counter() - started)
+        return name
+    
     def get_index_stats(self) -> Dict:
         """Get statistics about the search index"""
         try:
-            total_terms = self.db.query(SearchIndex).count()
-            total_documents = self.db.query(Document).count()
+            total_terms = self.db.scalar(_count(SearchIndex).filter(SearchIndex.field == BODY))
+            total_documents = self.db.scalar(_count(Document))
             
             # Get top terms by document frequency
-            top_terms = self.db.query(SearchIndex).order_by(
-                SearchIndex.document_frequency.desc()
-            ).limit(10).all()
+            top_terms = self.db.execute(_top_terms_query()).all()
             
-            stats = {
-                "total_terms": total_terms,
-                "total_documents": total_documents,
-                "top_terms": [
-                    {
-                        "term": term.term,
-                        "document_frequency": term.document_frequency
-                    }
-                    for term in top_terms
-                ]
-            }
-            
-            return stats
+            return _index_stats(total_terms, total_documents, top_terms)
             
         except Exception as e:
             logger.error(f"Error getting index stats: {e}")
@@ -223,17 +1092,27 @@ class IndexService:
         """Rebuild the entire search index"""
         try:
             logger.info("Starting index rebuild...")
+            started = time.perf_counter()
             
             # Build TF-IDF index (this also stores it in database)
-            tfidf_index, term_doc_freq = self.build_tfidf_index()
+            term_doc_freq = self.build_tfidf_index()
+            invalidate_results()
+            build_seconds = time.perf_counter() - started
+            INDEX_BUILD_SECONDS.labels("build").observe(build_seconds)
+            
+            # Swap the new index in for API workers
+            self.publish_segment()
+            rebuild_seconds = time.perf_counter() - started
+            INDEX_BUILD_SECONDS.labels("rebuild").observe(rebuild_seconds)
             
             # Get statistics
             stats = self.get_index_stats()
             
-            logger.info("Index rebuild completed")
+            logger.info(f"Index rebuild completed in {rebuild_seconds:.1f}s "
+                        f"(build {build_seconds:.1f}s, publish {rebuild_seconds - build_seconds:.1f}s)")
             return {
                 "status": "success",
-                "terms_indexed": len(tfidf_index),
+                "terms_indexed": len(term_doc_freq),
                 "stats": stats
             }
             
@@ -245,17 +1124,24 @@ class IndexService:
             }
 
     def get_search_suggestions(self, query: str, limit: int = 5) -> List[str]:
-        """Get search suggestions based on indexed terms"""
+        """Get search suggestions based on indexed terms
+        
+        Served from the current segment's term dictionary when one is
+        published, so suggestions match the index /search is answering from.
+        Terms are stems, so each is suggested as its most frequent surface
+        form in the indexed text.
+        """
         try:
-            if not query.strip():
+            query = query.strip().lower()
+            if not query:
                 return []
             
-            # Get terms that start with the query
-            suggestions = self.db.query(SearchIndex.term).filter(
-                SearchIndex.term.ilike(f"{query}%")
-            ).order_by(SearchIndex.document_frequency.desc()).limit(limit).all()
+            suggestions = _segment_suggestions(query, limit)
+            if suggestions is not None:
+                return suggestions
             
-            return [suggestion.term for suggestion in suggestions]
+            # Get terms that start with the query
+            return list(self.db.scalars(_suggestions_query(query, limit)))
             
         except Exception as e:
             logger.error(f"Error getting suggestions: {e}")
@@ -290,7 +1176,127 @@ class IndexService:
             return {"total_documents": 0, "unique_domains": 0, "domains": []}
 
 
+class _ThreadedIndexService(IndexService):
+    """IndexService running in a threadpool thread for an AsyncIndexService
+    
+    ``db`` is a session of the thread's own, which only checks out a
+    connection if the database index is searched. Highlighting reads go
+    through the request's async session on the event loop.
+    """
+    
+    def __init__(self, db: Session, async_db: AsyncSession):
+        super().__init__(db)
+        self.async_db = async_db
+    
+    def _highlight(self, results: List[Dict], terms: Sequence[str]):
+        from_thread.run(self.async_db.run_sync, lambda session: SnippetBuilder(session).highlight(results, terms))
+
+
+class AsyncIndexService:
+    """Async counterpart of IndexService for the request path
+    
+    Statistics and suggestions run as native async queries. Search reuses
+    IndexService's evaluation in the threadpool, since parsing, top-k
+    evaluation and hydrating from a segment are CPU-bound and would stall
+    the event loop; only its highlighting queries run on the async session.
+    Cache hits and segment-served queries without highlighting never check
+    out a connection at all.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def search(self, query: str, operation: str = "AND", limit: int = 10,
+                     ranking: Optional[str] = None, highlight: Optional[bool] = None) -> List[Dict]:
+        """See IndexService.search"""
+        return await run_in_threadpool(self._search, query, operation, limit, ranking, highlight)
+    
+    def _search(self, query: str, operation: str, limit: int, ranking: Optional[str],
+                highlight: Optional[bool]) -> List[Dict]:
+        db = SessionLocal()
+        try:
+            return _ThreadedIndexService(db, self.db).search(query, operation, limit, ranking, highlight)
+        finally:
+            db.close()
+    
+    async def get_index_stats(self) -> Dict:
+        """Get statistics about the search index"""
+        try:
+            total_terms = await self.db.scalar(_count(SearchIndex).filter(SearchIndex.field == BODY))
+            total_documents = await self.db.scalar(_count(Document))
+            top_terms = (await self.db.execute(_top_terms_query())).all()
+            return _index_stats(total_terms, total_documents, top_terms)
+        except Exception as e:
+            logger.error(f"Error getting index stats: {e}")
+            return {}
+    
+    async def get_search_suggestions(self, query: str, limit: int = 5) -> List[str]:
+        """Get search suggestions based on indexed terms"""
+        try:
+            query = query.strip().lower()
+            if not query:
+                return []
+            suggestions = _segment_suggestions(query, limit)
+            if suggestions is not None:
+                return suggestions
+            return list(await self.db.scalars(_suggestions_query(query, limit)))
+        except Exception as e:
+            logger.error(f"Error getting suggestions: {e}")
+            return []
+
+
+def _count(model):
+    return select(func.count()).select_from(model)
+
+
+def _top_terms_query(limit: int = 10):
+    return select(SearchIndex.term, SearchIndex.document_frequency).filter(SearchIndex.field == BODY).order_by(
+        SearchIndex.document_frequency.desc()
+    ).limit(limit)
+
+
+def _segment_suggestions(prefix: str, limit: int) -> Optional[List[str]]:
+    """Prefix suggestions from the current segment, None when no segment is served"""
+    if not settings.use_segment_index:
+        return None
+    segment = get_current_segment(settings.index_dir)
+    if segment is None:
+        return None
+    return [segment.surface(term) for term, _ in segment.suggest(prefix, limit)]
+
+
+def _suggestions_query(query: str, limit: int):
+    # The prefix is matched literally: LIKE wildcards in it are escaped
+    prefix = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return select(func.coalesce(SearchIndex.surface, SearchIndex.term)).filter(
+        SearchIndex.field == BODY, SearchIndex.term.ilike(f"{prefix}%", escape="\\")
+    ).order_by(SearchIndex.document_frequency.desc()).limit(limit)
+
+
+def _index_stats(total_terms: int, total_documents: int, top_terms) -> Dict:
+    return {
+        "total_terms": total_terms,
+        "total_documents": total_documents,
+        "top_terms": [
+            {
+                "term": term,
+                "document_frequency": document_frequency
+            }
+            for term, document_frequency in top_terms
+        ]
+    }
+
+
 def get_index_service():
-    """Dependency to get index service"""
-    db = next(get_db())
-    return IndexService(db) 
\ No newline at end of file
+    """Dependency to get index service, closing its session after the request"""
+    db = SessionLocal()
+    try:
+        yield IndexService(db)
+    finally:
+        db.close()
+
+
+async def get_async_index_service():
+    """Dependency to get the async index service for one request"""
+    async with get_async_session_factory()() as db:
+        yield AsyncIndexService(db) 
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""Compression of stored document bodies
+
+A document's extracted text and raw HTML are kept compressed in the
+``document_bodies`` table, apart from its metadata in ``documents``. Each
+row records the codec it was written with, so changing settings.body_codec
+only affects documents written afterwards and both kinds of rows stay
+readable. "zstd" needs the zstandard package and is used when it is
+installed; "zlib" is in the standard library, slower to compress and
+slightly larger.
+
+Text is compressed in independent blocks of BLOCK_CHARS characters::
+
+    varint   block count
+    varint*  compressed size of each block
+    bytes*   the compressed blocks
+
+so a character range, such as a result snippet, is read by decompressing
+only the blocks it overlaps.
+"""
+from typing import Callable, Dict, Optional, Tuple
+import logging
+import zlib
+
+from app.config import settings
+from app.index.postings import decode_varint, encode_varint
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+BLOCK_CHARS = 32768
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.compress(data, ZSTD_LEVEL)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    # Frames written by zstandard.compress record their content size
+    return zstandard.decompress(data)
+
+
+CODECS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "zstd": (_zstd_compress, _zstd_decompress),
+    "zlib": (lambda data: zlib.compress(data, ZLIB_LEVEL), zlib.decompress),
+}
+
+if zstandard is None and settings.body_codec == "zstd":
+    logger.warning("zstandard is not installed, compressing document bodies with zlib")
+
+
+def get_codec(name: Optional[str] = None) -> str:
+    """Codec to write bodies with: ``name`` (default settings.body_codec) if available"""
+    name = name or settings.body_codec
+    if name not in CODECS:
+        raise ValueError(f"Unknown body codec: {name}")
+    if name == "zstd" and zstandard is None:
+        return "zlib"
+    return name
+
+
+def compress_text(text: Optional[str], codec: str) -> Optional[bytes]:
+    if text is None:
+        return None
+    compress = CODECS[codec][0]
+    blocks = [
+        compress(text[start:start + BLOCK_CHARS].encode("utf-8", "surrogatepass"))
+        for start in range(0, len(text), BLOCK_CHARS)
+    ]
+    header = encode_varint(len(blocks)) + b"".join(encode_varint(len(block)) for block in blocks)
+    return header + b"".join(blocks)
+
+
+def decompress_text(data: Optional[bytes], codec: str,
+                    start: int = 0, end: Optional[int] = None) -> Optional[str]:
+    """Decompressed text, or only its characters [start, end)"""
+    if data is None:
+        return None
+    if codec not in CODECS:
+        raise ValueError(f"Unknown body codec: {codec}")
+    decompress = CODECS[codec][1]
+
+    count, offset = decode_varint(data)
+    sizes = []
+    for _ in range(count):
+        size, offset = decode_varint(data, offset)
+        sizes.append(size)
+    first = start // BLOCK_CHARS
+    last = count if end is None else min(count, -(-end // BLOCK_CHARS))
+    for size in sizes[:first]:
+        offset += size
+
+    parts = []
+    for size in sizes[first:last]:
+        parts.append(decompress(data[offset:offset + size]).decode("utf-8", "surrogatepass"))
+        offset += size
+    text = "".join(parts)
+    base = first * BLOCK_CHARS
+    return text[start - base:None if end is None else end - base]
@@ -0,0 +1,234 @@
+"""HTML extraction: title, indexable main text and links from a page
+
+One parse yields all three. Links are collected from the whole page,
+navigation included, since the crawler needs them to discover pages. The
+text comes from the main content only: scripts, styles and forms are always
+dropped; with boilerplate stripping, so are navigation, headers, footers,
+sidebars and cookie banners (by tag, ARIA role or class/id), and blocks
+that are mostly link text such as menus and link lists. When the page marks
+its content with <main>, role="main" or <article>, only that is indexed.
+
+Extractors are registered by name in EXTRACTORS and picked with
+settings.html_extractor. "lxml" parses with libxml2 and is several times
+faster than "html.parser", BeautifulSoup's pure-Python parser, which is used
+when lxml is not installed.
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urljoin
+import codecs
+import logging
+import re
+
+from app.config import settings
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TITLE = "No Title"
+
+# Never text: dropped wherever they are
+NON_TEXT_TAGS = ("script", "style", "noscript", "template", "svg", "iframe", "object", "canvas",
+                 "form", "select", "button", "head")
+# Page chrome around the main content
+BOILERPLATE_TAGS = ("nav", "header", "footer", "aside", "menu", "dialog")
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "menu", "menubar"}
+# Words of class and id attributes marking page chrome
+BOILERPLATE_NAMES = {
+    "nav", "navbar", "navigation", "menu", "footer", "sidebar", "breadcrumb", "breadcrumbs",
+    "cookie", "cookies", "consent", "banner", "advert", "advertisement", "ads", "share", "sharing",
+    "social", "popup", "modal", "newsletter", "subscribe", "skip", "pagination",
+}
+_NAME_WORDS = re.compile(r"[^a-z0-9]+")
+# Blocks whose text is mostly link text, and short, are menus or link lists
+LINK_BLOCK_TAGS = {"div", "section", "ul", "ol", "dl", "table", "tbody", "tr", "td", "p"}
+MAX_LINK_DENSITY = 0.5
+MAX_LINK_BLOCK_CHARS = 400
+
+
+class ExtractedPage(NamedTuple):
+    title: str
+    text: str
+    links: List[str]
+
+
+def _is_boilerplate_name(*names: Optional[str]) -> bool:
+    for name in names:
+        if name and not BOILERPLATE_NAMES.isdisjoint(_NAME_WORDS.split(name.lower())):
+            return True
+    return False
+
+
+def _join_text(strings) -> str:
+    """Join text nodes with single spaces, collapsing whitespace"""
+    return " ".join(" ".join(strings).split())
+
+
+def _absolute_links(base_url: str, hrefs) -> List[str]:
+    links = []
+    # Menus repeat the same links; urljoin is the costliest step per link
+    for href in dict.fromkeys(href.strip() for href in hrefs):
+        if not href or href.startswith(("#", "javascript:", "mailto:", "tel:")):
+            continue
+        links.append(href if href.startswith(("http://", "https://")) else urljoin(base_url, href))
+    return links
+
+
+def _drop(element):
+    """Remove an element and its subtree, keeping the text that follows it"""
+    parent = element.getparent()
+    if element.tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + element.tail
+        else:
+            parent.text = (parent.text or "") + element.tail
+    parent.remove(element)
+
+
+def extract_lxml(html: str, base_url: str, strip_boilerplate: bool = True) -> ExtractedPage:
+    """Extract with lxml, one parse and two passes over the tree
+    
+    Plain etree elements rather than lxml.html's, whose per-element Python
+    class lookup costs more than the parse itself.
+    """
+    parser = etree.HTMLParser(remove_comments=True, remove_pis=True)
+    try:
+        root = etree.fromstring(html, parser)
+    except ValueError:
+        # A str with an XML encoding declaration; let lxml decode the bytes
+        root = etree.fromstring(html.encode("utf-8"), parser)
+    if root is None:
+        return ExtractedPage(DEFAULT_TITLE, "", [])
+
+    title = root.findtext(".//title")
+    title = _join_text([title]) if title else ""
+    links = _absolute_links(base_url, root.xpath("//a/@href"))
+
+    content = root.find("body")
+    if content is None:
+        content = root
+    if strip_boilerplate:
+        marked = root.xpath("//main|//*[@role='main']") or root.xpath("//article")
+        if marked:
+            # Several articles: the one with the most text
+            content = max(marked, key=lambda element: sum(map(len, element.itertext())))
+
+    removed = []
+    for element in content.iter():
+        tag = element.tag
+        if tag in NON_TEXT_TAGS:
+            removed.append(element)
+        elif strip_boilerplate and element is not content and (
+            tag in BOILERPLATE_TAGS
+            or element.get("role") in BOILERPLATE_ROLES
+            or _is_boilerplate_name(element.get("class"), element.get("id"))
+        ):
+            removed.append(element)
+    for element in removed:
+        _drop(element)
+
+    if strip_boilerplate:
+        _drop_link_blocks(content)
+    return ExtractedPage(title or DEFAULT_TITLE, _join_text(content.itertext()), links)
+
+
+def _drop_link_blocks(content):
+    """Drop short blocks whose text is mostly inside links, innermost first"""
+    # element -> (text chars, link text chars) of its subtree, tails excluded
+    sizes = {}
+    for element in reversed(list(content.iter())):
+        text = len((element.text or "").strip())
+        link_text = 0
+        for child in element:
+            child_text, child_link_text = sizes.pop(child, (0, 0))
+            text += child_text
+            link_text += child_link_text
+            text += len((child.tail or "").strip())
+        if element.tag == "a":
+            link_text = text
+        elif (element.tag in LINK_BLOCK_TAGS and element is not content and text
+              and text <= MAX_LINK_BLOCK_CHARS and link_text > MAX_LINK_DENSITY * text):
+            _drop(element)
+            continue
+        sizes[element] = (text, link_text)
+
+
+def extract_html_parser(html: str, base_url: str, strip_boilerplate: bool = True) -> ExtractedPage:
+    """Extract with BeautifulSoup's html.parser; no link-density pruning"""
+    from bs4 import BeautifulSoup, Comment
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = _join_text([soup.title.get_text()]) if soup.title else ""
+    links = _absolute_links(base_url, (a["href"] for a in soup.find_all("a", href=True)))
+
+    content = soup.body or soup
+    if strip_boilerplate:
+        marked = soup.find_all("main") + soup.find_all(attrs={"role": "main"}) or soup.find_all("article")
+        if marked:
+            content = max(marked, key=lambda element: len(element.get_text()))
+    for element in content.find_all(NON_TEXT_TAGS):
+        element.decompose()
+    for comment in content.find_all(string=lambda string: isinstance(string, Comment)):
+        comment.extract()
+    if strip_boilerplate:
+        for element in content.find_all(True):
+            if element.decomposed:
+                continue
+            if (element.name in BOILERPLATE_TAGS
+                    or element.get("role") in BOILERPLATE_ROLES
+                    or _is_boilerplate_name(" ".join(element.get("class") or ()), element.get("id"))):
+                element.decompose()
+    return ExtractedPage(title or DEFAULT_TITLE, _join_text(content.strings), links)
+
+
+EXTRACTORS: Dict[str, Callable[..., ExtractedPage]] = {
+    "lxml": extract_lxml,
+    "html.parser": extract_html_parser,
+}
+
+if etree is None and settings.html_extractor == "lxml":
+    logger.warning("lxml is not installed, extracting HTML with html.parser")
+
+
+def get_extractor(name: Optional[str] = None) -> Callable[..., ExtractedPage]:
+    """Extractor registered as ``name`` (default settings.html_extractor)"""
+    name = name or settings.html_extractor
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown HTML extractor: {name}")
+    if name == "lxml" and etree is None:
+        return extract_html_parser
+    return EXTRACTORS[name]
+
+
+def extract_html(html: str, base_url: str, extractor: Optional[str] = None,
+                 strip_boilerplate: Optional[bool] = None) -> ExtractedPage:
+    """Title, main text and absolute links of an HTML page"""
+    if strip_boilerplate is None:
+        strip_boilerplate = settings.html_strip_boilerplate
+    return get_extractor(extractor)(html, base_url, strip_boilerplate)
+
+
+_CHARSET = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+
+
+def decode_body(body: bytes, content_type: str = "") -> str:
+    """Decode a response body with its declared charset, else UTF-8, else Windows-1252
+
+    A body cut at a byte limit may end inside a multi-byte character, so
+    decoding errors with the declared charset are replaced rather than raised.
+    """
+    match = _CHARSET.search(content_type or "")
+    if match:
+        try:
+            return body.decode(match.group(1), errors="replace")
+        except LookupError:
+            pass
+    try:
+        # Not final: a character cut off at the end is dropped, not an error
+        return codecs.getincrementaldecoder("utf-8")().decode(body, final=False)
+    except UnicodeDecodeError:
+        return body.decode("cp1252", errors="replace")
@@ -1,37 +1,37 @@
 import os, json
-import redis
+
+from app.search.redis_search import RedisIndex
+from app.services.document_service import make_snippet
 
 BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
-TOKEN_PATH = os.path.join(BASE, '../data/tokens')
 DOC_PATH = os.path.join(BASE, '../data/docs')
 TFIDF_PATH = os.path.join(BASE, '../index/tfidf_index.json')
 DF_PATH = os.path.join(BASE, '../index/doc_freq.json')
 
-r = redis.Redis(host='localhost', port=6379, decode_responses=True)
-
-# Store TF-IDF index
-with open(TFIDF_PATH) as f:
-    tfidf_index = json.load(f)
-    for term, postings in tfidf_index.items():
-        r.hset(f"tfidf:{term}", mapping=postings)
-
-# Store DF
-with open(DF_PATH) as f:
-    df = json.load(f)
-    for term, freq in df.items():
-        r.set(f"df:{term}", freq)
-
-# Store tokenized docs and metadata
-for fname in os.listdir(TOKEN_PATH):
-    with open(os.path.join(TOKEN_PATH, fname)) as f:
-        tok = json.load(f)
-        doc_id = tok["id"]
-        r.set(f"tokens:{doc_id}", json.dumps(tok["text"]))
-        r.set(f"title:{doc_id}", tok["title"])
-        r.sadd("docs", doc_id)
-
-# Store full docs
-for fname in os.listdir(DOC_PATH):
-    with open(os.path.join(DOC_PATH, fname)) as f:
-        doc = json.load(f)
-        r.set(f"doc:{doc['id']}", json.dumps(doc))
+
+def load_documents():
+    for fname in os.listdir(DOC_PATH):
+        with open(os.path.join(DOC_PATH, fname)) as f:
+            doc = json.load(f)
+        yield {"id": doc["id"], "title": doc["title"], "url": doc["url"], "snippet": make_snippet(doc["text"])}
+
+
+def main():
+    index = RedisIndex()
+
+    # Store TF-IDF postings
+    with open(TFIDF_PATH) as f:
+        tfidf_index = json.load(f)
+    terms = index.load_postings(tfidf_index.items())
+
+    # Store DF
+    with open(DF_PATH) as f:
+        index.load_doc_freqs(json.load(f))
+
+    # Store result metadata as one small hash per document
+    docs = index.load_documents(load_documents())
+    print(f"Loaded {terms} terms and {docs} documents into Redis")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import re
 import os
 import json
 import nltk
+from functools import lru_cache
+from nltk.stem import PorterStemmer
 from app.config import settings
 
 # Download NLTK data if not already present
@@ -18,25 +20,101 @@ except LookupError:
 DATA_DIR = os.path.join(settings.data_dir, 'tokens')
 os.makedirs(DATA_DIR, exist_ok=True)
 
-def tokenize_text(text: str) -> list[str]:
-    #lowercase
-    text = text.lower()
-    #remove punctuation
-    text = re.sub(r'[^\w\s]', '', text)
-    #split into words
-    words = text.split(' ')
-    
-    #remove stopwords if available
+# Copy of NLTK's English stopword list, used when the corpus cannot be downloaded
+# so that documents and queries are always tokenized the same way
+ENGLISH_STOPWORDS = (
+    "i me my myself we our ours ourselves you you're you've you'll you'd your yours "
+    "yourself yourselves he him his himself she she's her hers herself it it's its itself "
+    "they them their theirs themselves what which who whom this that that'll these those "
+    "am is are was were be been being have has had having do does did doing a an the and "
+    "but if or because as until while of at by for with about against between into through "
+    "during before after above below to from up down in out on off over under again further "
+    "then once here there when where why how all any both each few more most other some such "
+    "no nor not only own same so than too very s t can will just don don't should should've "
+    "now d ll m o re ve y ain aren aren't couldn couldn't didn didn't doesn doesn't hadn "
+    "hadn't hasn hasn't haven haven't isn isn't ma mightn mightn't mustn mustn't needn "
+    "needn't shan shan't shouldn shouldn't wasn wasn't weren weren't won won't wouldn wouldn't"
+).split()
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_CHUNK = re.compile(r'\S+')
+_WORD_CHAR = re.compile(r'\w')
+
+
+def load_stopwords() -> frozenset:
+    """English stopwords from NLTK, or the bundled copy if the corpus is missing"""
     try:
-        stopwords = nltk.corpus.stopwords.words('english')
-        words = [word for word in words if word not in stopwords]
+        return frozenset(nltk.corpus.stopwords.words('english'))
     except LookupError:
-        # If stopwords are not available, continue without filtering
-        pass
+        return frozenset(ENGLISH_STOPWORDS)
+
+
+class Tokenizer:
+    """Lowercasing, punctuation-stripping, stopword-filtering Porter tokenizer
+    
+    Text is split on any whitespace and punctuation is removed from inside
+    words ("web-scraping.dev" -> "webscrapingdev"). The stopword table is a
+    frozenset built once and stems are memoised in an LRU cache, so the
+    common words of a corpus are stemmed only once per process.
+    """
+    
+    def __init__(self, stopwords=None, stem: bool = True, stem_cache_size: int = 1 << 16):
+        self.stopwords = frozenset(load_stopwords() if stopwords is None else stopwords)
+        if stem:
+            self.stem = lru_cache(maxsize=stem_cache_size)(PorterStemmer().stem)
+        else:
+            self.stem = lambda word: word
+    
+    def tokenize(self, text: str) -> list[str]:
+        stopwords, stem = self.stopwords, self.stem
+        return [
+            stem(word) for word in _PUNCTUATION.sub('', text.lower()).split()
+            if word not in stopwords
+        ]
+    
+    def tokenize_many(self, texts) -> list[list[str]]:
+        """Tokenize a batch of texts"""
+        return [self.tokenize(text) for text in texts]
     
-    #remove empty strings
-    words = [word for word in words if word != '']
-    return words
+    def tokenize_with_offsets(self, text: str) -> list[tuple[str, int, int]]:
+        """Tokenize like tokenize(), keeping each token's character span in text"""
+        stopwords, stem = self.stopwords, self.stem
+        tokens = []
+        for match in _CHUNK.finditer(text):
+            chunk = match.group()
+            word = _PUNCTUATION.sub('', chunk.lower())
+            if word == '' or word in stopwords:
+                continue
+            start, end = match.span()
+            if len(word) != len(chunk):
+                # Trim surrounding punctuation so the span covers the word itself
+                start += _WORD_CHAR.search(chunk).start()
+                end -= _WORD_CHAR.search(chunk[::-1]).start()
+            tokens.append((stem(word), start, end))
+        return tokens
+
+
+_default_tokenizer = None
+
+
+def get_tokenizer() -> Tokenizer:
+    """Process-wide tokenizer used for both documents and queries"""
+    global _default_tokenizer
+    if _default_tokenizer is None:
+        _default_tokenizer = Tokenizer()
+    return _default_tokenizer
+
+
+def tokenize_text(text: str) -> list[str]:
+    return get_tokenizer().tokenize(text)
+
+
+def tokenize_many(texts) -> list[list[str]]:
+    return get_tokenizer().tokenize_many(texts)
+
+
+def tokenize_with_offsets(text: str) -> list[tuple[str, int, int]]:
+    return get_tokenizer().tokenize_with_offsets(text)
 
 def doc_to_tokens(doc: str) -> list[str]:
     #open doc and read text
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Measure boolean query evaluation over synthetic postings: the compiled query
+plan (df-ordered leapfrogging with galloping skips, streaming NOT) against
+set-at-a-time evaluation that materializes every document for NOT, and
+galloping against plain binary-search skips in AND
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from bisect import bisect_left
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.search.query_parser import Not, Or, Term, parse_query
+from app.search.query_plan import PlanSource, compile_plan, top_k
+from app.search.wand import END, TermCursor, top_k_and
+
+# Term -> document frequency as a fraction of the corpus
+TERMS = {"common": 0.5, "frequent": 0.1, "medium": 0.01, "rare": 0.0005}
+QUERIES = [
+    "common NOT rare",
+    "rare NOT common",
+    "common NOT (frequent OR medium)",
+    "NOT rare",
+    "rare AND common",
+    "(rare OR medium) AND frequent NOT common",
+]
+
+
+class BisectCursor(TermCursor):
+    """TermCursor skipping with a binary search over the rest of the postings"""
+
+    __slots__ = ()
+
+    def advance_to(self, target: int):
+        if self.doc >= target:
+            return
+        self.pos = bisect_left(self.ordinals, target, self.pos + 1)
+        self.doc = self.ordinals[self.pos] if self.pos < len(self.ordinals) else END
+
+
+class SyntheticSource(PlanSource):
+    def __init__(self, postings, num_docs: int, cursor_type=TermCursor):
+        self.postings = postings
+        self.num_docs = num_docs
+        self.cursor_type = cursor_type
+
+    def term_cursor(self, term: str, field: str):
+        ordinals, weights = self.postings.get(term, ((), ()))
+        if not ordinals:
+            return None
+        return self.cursor_type(ordinals, weights, 1.0, 1.0)
+
+    def all_docs(self):
+        return range(1, self.num_docs + 1)
+
+
+def generate_postings(num_docs: int, seed: int = 42):
+    rng = random.Random(seed)
+    postings = {}
+    for term, fraction in TERMS.items():
+        ordinals = sorted(rng.sample(range(1, num_docs + 1), max(1, int(num_docs * fraction))))
+        postings[term] = (ordinals, [rng.random() for _ in ordinals])
+    return postings
+
+
+def materialized(query_tree, postings, num_docs: int, limit: int):
+    """Set-at-a-time evaluation that builds the set of all documents for NOT"""
+    def evaluate(node):
+        if isinstance(node, Term):
+            ordinals, weights = postings[node.term]
+            return dict(zip(ordinals, weights))
+        if isinstance(node, Not):
+            excluded = evaluate(node.child)
+            return {doc: 0.0 for doc in set(range(1, num_docs + 1)) - excluded.keys()}
+        children = [evaluate(child) for child in node.children]
+        if isinstance(node, Or):
+            scores = {}
+            for child in children:
+                for doc, score in child.items():
+                    scores[doc] = scores.get(doc, 0.0) + score
+            return scores
+        docs = set.intersection(*(set(child) for child in children))
+        return {doc: sum(child.get(doc, 0.0) for child in children) for doc in docs}
+
+    scores = evaluate(query_tree)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def time_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    postings = generate_postings(args.docs)
+    print(f"Generated postings over {args.docs} documents in {time.perf_counter() - start:.1f}s: "
+          + ", ".join(f"{term} df={len(ordinals)}" for term, (ordinals, _) in postings.items()))
+
+    print(f"{'query':<44} {'plan ms':>9} {'sets ms':>9}")
+    for query in QUERIES:
+        query_tree = parse_query(query)
+        plan_ms = time_call(lambda: top_k(compile_plan(query_tree, SyntheticSource(postings, args.docs)), args.limit),
+                            args.repeat)
+        sets_ms = time_call(lambda: materialized(query_tree, postings, args.docs, args.limit), 1)
+        print(f"{query:<44} {plan_ms:>9.2f} {sets_ms:>9.1f}")
+
+    print(f"\n{'AND skips':<44} {'gallop ms':>9} {'bisect ms':>9}")
+    for terms in (("rare", "common"), ("medium", "common"), ("frequent", "common")):
+        def run(cursor_type):
+            source = SyntheticSource(postings, args.docs, cursor_type)
+            return top_k_and([source.term_cursor(term, "body") for term in terms], args.limit)
+        assert run(TermCursor) == run(BisectCursor)
+        print(f"{' AND '.join(terms):<44} {time_call(lambda: run(TermCursor), args.repeat):>9.2f} "
+              f"{time_call(lambda: run(BisectCursor), args.repeat):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Compare SimpleCrawler and AsyncCrawler pages/sec against local HTTP servers
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.crawler.async_crawler import AsyncCrawler
+from app.crawler.crawler import SimpleCrawler
+
+
+def make_handler(pages_per_host: int, links_per_page: int, latency: float):
+    class SiteHandler(BaseHTTPRequestHandler):
+        """Serves /page/<n> with links to other pages on the same host"""
+
+        def do_GET(self):
+            time.sleep(latency)
+            try:
+                page = int(self.path.rsplit("/", 1)[-1])
+            except ValueError:
+                page = 0
+            rng = random.Random(page)
+            links = "".join(
+                f'<a href="/page/{rng.randrange(pages_per_host)}">link</a>'
+                for _ in range(links_per_page)
+            )
+            body = (f"<html><head><title>Page {page}</title></head><body>"
+                    f"<p>{' '.join(f'word{rng.randrange(1000)}' for _ in range(200))}</p>"
+                    f"{links}</body></html>").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SiteHandler
+
+
+class UnsavedSimpleCrawler(SimpleCrawler):
+    """SimpleCrawler without the database write, to time fetching and parsing only"""
+
+    def _crawl_state(self, url):
+        return None
+
+    def _save_doc_to_db(self, url, title, text, etag=None, last_modified=None, links=None):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=400, help="Pages to crawl per run")
+    parser.add_argument("--latency", type=float, default=0.05, help="Server response delay in seconds")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--per-host", type=int, default=4)
+    parser.add_argument("--host-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    handler = make_handler(pages_per_host=1000, links_per_page=10, latency=args.latency)
+    servers = [ThreadingHTTPServer(("127.0.0.1", 0), handler) for _ in range(args.hosts)]
+    for server in servers:
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    seeds = [f"http://127.0.0.1:{server.server_address[1]}/page/0" for server in servers]
+
+    try:
+        print(f"{args.hosts} hosts, {args.latency * 1000:.0f} ms response latency, {args.pages} pages per run")
+
+        crawler = UnsavedSimpleCrawler(seeds, max_pages=args.pages, delay=0)
+        start = time.perf_counter()
+        crawler.crawl_and_store()
+        sync_seconds = time.perf_counter() - start
+        sync_pages = len(crawler.visited)
+
+        crawler = AsyncCrawler(seeds, max_pages=args.pages, concurrency=args.concurrency,
+                               per_host_concurrency=args.per_host, host_delay=args.host_delay,
+                               store=lambda documents: None, lookup=lambda url: None)
+        start = time.perf_counter()
+        async_pages = crawler.run()
+        async_seconds = time.perf_counter() - start
+
+        print(f"{'crawler':<28} {'pages':>6} {'seconds':>8} {'pages/sec':>10}")
+        print(f"{'SimpleCrawler (delay=0)':<28} {sync_pages:>6} {sync_seconds:>8.2f} {sync_pages / sync_seconds:>10.1f}")
+        label = f"AsyncCrawler (c={args.concurrency})"
+        print(f"{label:<28} {async_pages:>6} {async_seconds:>8.2f} {async_pages / async_seconds:>10.1f}")
+        print(f"speedup: {(async_pages / async_seconds) / (sync_pages / sync_seconds):.1f}x")
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
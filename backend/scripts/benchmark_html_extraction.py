@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Measure HTML extraction throughput over a corpus of saved pages: the
+registered extractors with and without boilerplate stripping, against the
+crawler's former BeautifulSoup html.parser get_text(), with the share of
+page text kept for indexing
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from app.utilts.html_cleaner import EXTRACTORS, ExtractedPage, decode_body
+
+
+def get_text_baseline(html: str, base_url: str, strip_boilerplate: bool = False) -> ExtractedPage:
+    """What SimpleCrawler did before the extraction stage"""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string if soup.title else "No Title"
+    links = [a.get("href") for a in soup.find_all("a", href=True)]
+    return ExtractedPage(title, soup.get_text(separator=" ", strip=True), links)
+
+
+def generate_corpus(directory: str, pages: int, seed: int = 42):
+    """Write pages shaped like a typical site: chrome around an article"""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(5000)]
+
+    def sentence():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(8, 25))) + "."
+
+    menu = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(40))
+    for page in range(pages):
+        paragraphs = "".join(
+            f"<p>{' '.join(sentence() for _ in range(rng.randint(2, 6)))}</p>" for _ in range(rng.randint(5, 30))
+        )
+        related = "".join(f'<li><a href="/page/{rng.randrange(pages)}">{sentence()}</a></li>' for _ in range(10))
+        html = (
+            f"<!DOCTYPE html><html><head><title>Page {page}</title>"
+            f"<style>body {{ margin: 0 }}</style><script>var page = {page};</script></head><body>"
+            f'<header class="site-header"><a href="/">Home</a><nav><ul>{menu}</ul></nav></header>'
+            f'<div class="cookie-consent">We use cookies. <button>Accept</button></div>'
+            f'<div class="layout"><div id="content"><h1>Page {page}</h1>{paragraphs}</div>'
+            f'<div class="sidebar"><ul>{related}</ul></div></div>'
+            f'<footer><p>Copyright</p><ul>{menu}</ul></footer></body></html>'
+        )
+        with open(os.path.join(directory, f"page{page}.html"), "w") as f:
+            f.write(html)
+
+
+def load_corpus(directory: str):
+    paths = sorted(
+        glob.glob(os.path.join(directory, "**", "*.html"), recursive=True)
+        + glob.glob(os.path.join(directory, "**", "*.htm"), recursive=True)
+    )
+    corpus = []
+    for path in paths:
+        with open(path, "rb") as f:
+            corpus.append(f.read())
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("corpus", nargs="?", help="Directory of saved .html/.htm files; generated when omitted")
+    parser.add_argument("--pages", type=int, default=500, help="Pages to generate without a corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as generated:
+        directory = args.corpus
+        if directory is None:
+            directory = generated
+            generate_corpus(directory, args.pages)
+        raw = load_corpus(directory)
+    if not raw:
+        sys.exit(f"No .html or .htm files under {args.corpus}")
+    pages = [decode_body(body) for body in raw]
+    megabytes = sum(len(body) for body in raw) / 1e6
+    print(f"{len(pages)} pages, {megabytes:.1f} MB")
+
+    runs = [("get_text (html.parser, before)", get_text_baseline, False)]
+    for name, extractor in EXTRACTORS.items():
+        runs.append((f"{name}, boilerplate kept", extractor, False))
+        runs.append((f"{name}, boilerplate stripped", extractor, True))
+
+    baseline_chars = None
+    print(f"{'extractor':<34} {'pages/sec':>10} {'MB/sec':>8} {'text kept':>10}")
+    for label, extractor, strip in runs:
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            extracted = [extractor(html, "https://example.com/", strip) for html in pages]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        chars = sum(len(page.text) for page in extracted)
+        baseline_chars = baseline_chars or chars
+        print(f"{label:<34} {len(pages) / best:>10.0f} {megabytes / best:>8.1f} {chars / baseline_chars:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
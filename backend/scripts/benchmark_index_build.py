@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-document, grouped and partitioned TF-IDF index builds on a synthetic corpus
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, Document, DocumentTerm, SearchIndex
+from app.index.postings import encode_positions
+from app.services.index_service import IndexService
+
+
+def generate_corpus(session, num_docs: int, doc_length: int, vocab_size: int, seed: int = 42):
+    """Insert a synthetic corpus with a Zipf-like term distribution"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+
+    for doc_num in range(num_docs):
+        doc_id = f"{doc_num:032x}"
+        session.execute(insert(Document), [{
+            "id": doc_id,
+            "ordinal": doc_num + 1,
+            "url": f"https://example.com/{doc_num}",
+            "title": f"Document {doc_num}",
+        }])
+        words = rng.choices(vocabulary, weights=weights, k=doc_length)
+        positions = {}
+        for position, word in enumerate(words):
+            positions.setdefault(word, []).append(position)
+        session.execute(insert(DocumentTerm), [
+            {"document_ordinal": doc_num + 1, "term": word, "frequency": len(word_positions),
+             "positions": encode_positions((word_positions,))}
+            for word, word_positions in positions.items()
+        ])
+    session.commit()
+
+
+def snapshot_index(session):
+    """Return the stored index as comparable tuples"""
+    return sorted(
+        (row.term, row.document_frequency, row.postings)
+        for row in session.query(SearchIndex).all()
+    )
+
+
+def time_build(session, mode: str, workers: int = None) -> float:
+    index_service = IndexService(session)
+    start = time.perf_counter()
+    index_service.build_tfidf_index(mode=mode, workers=workers)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url",
+                        help="Scratch database to build into (default: temporary SQLite file)")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--doc-length", type=int, default=300)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Processes for the partitioned build, 0 for one per CPU")
+    parser.add_argument("--skip-per-document", action="store_true")
+    args = parser.parse_args()
+
+    # Worker processes of the partitioned build need a database they can open
+    scratch_dir = tempfile.TemporaryDirectory()
+    database_url = args.database_url or f"sqlite:///{os.path.join(scratch_dir.name, 'benchmark.db')}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+
+    try:
+        if session.query(Document).count():
+            print("Refusing to benchmark against a database that already has documents")
+            sys.exit(1)
+
+        generate_corpus(session, args.docs, args.doc_length, args.vocab)
+        print(f"Corpus: {args.docs} documents, {args.docs * args.doc_length} tokens")
+
+        timings = {}
+        snapshots = {}
+        modes = ["grouped", "partitioned"]
+        if not args.skip_per_document:
+            modes.insert(0, "per_document")
+        for mode in modes:
+            timings[mode] = time_build(session, mode, args.workers)
+            snapshots[mode] = snapshot_index(session)
+
+        for mode in modes:
+            print(f"{mode + ' build:':<20}{timings[mode]:.2f}s ({timings[modes[0]] / timings[mode]:.1f}x)")
+        print(f"identical index:    {all(snapshot == snapshots[modes[0]] for snapshot in snapshots.values())}")
+    finally:
+        session.close()
+        scratch_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Compare per-document and bulk document ingestion throughput on a synthetic corpus
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, Document
+from app.services.document_service import DocumentService
+
+
+def generate_documents(prefix: str, num_docs: int, doc_length: int, vocab_size: int, seed: int = 42):
+    """Yield synthetic documents with a Zipf-like term distribution"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    for doc_num in range(num_docs):
+        yield {
+            "url": f"https://example.com/{prefix}/{doc_num}",
+            "title": f"Document {doc_num}",
+            "content": " ".join(rng.choices(vocabulary, weights=weights, k=doc_length)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default="sqlite://",
+                        help="Scratch database to ingest into (default: in-memory SQLite)")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--doc-length", type=int, default=300)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=0, help="Tokenizer processes, 0 for one per CPU")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+
+    try:
+        if session.query(Document).count():
+            print("Refusing to benchmark against a database that already has documents")
+            sys.exit(1)
+
+        document_service = DocumentService(session)
+        total_tokens = args.docs * args.doc_length
+        print(f"Corpus: {args.docs} documents, {total_tokens} tokens per run")
+
+        start = time.perf_counter()
+        for document in generate_documents("single", args.docs, args.doc_length, args.vocab):
+            document_service.create_document(document["url"], document["title"], document["content"])
+        single = time.perf_counter() - start
+
+        bulk = document_service.bulk_create_documents(
+            generate_documents("bulk", args.docs, args.doc_length, args.vocab),
+            batch_size=args.batch_size, workers=args.workers
+        )
+
+        print(f"{'mode':<14} {'seconds':>8} {'docs/sec':>10} {'tokens/sec':>12}")
+        print(f"{'create_document':<14} {single:>8.2f} {args.docs / single:>10.0f} {total_tokens / single:>12.0f}")
+        print(f"{'bulk':<14} {bulk['seconds']:>8.2f} {bulk['docs_per_sec']:>10.0f} {bulk['tokens_per_sec']:>12.0f}")
+        print(f"speedup: {single / bulk['seconds']:.1f}x")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Compare the old JSON postings columns with the binary postings encoding
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.index.postings import encode_postings, decode_postings
+
+
+def generate_postings(num_docs: int, num_terms: int, seed: int = 42):
+    """Yield (doc ordinals, term frequencies) with Zipf-distributed document frequencies"""
+    rng = random.Random(seed)
+    for rank in range(num_terms):
+        doc_freq = max(1, int(num_docs / (rank + 1)))
+        doc_ordinals = sorted(rng.sample(range(1, num_docs + 1), doc_freq))
+        term_freqs = [min(1 + int(rng.expovariate(0.7)), 200) for _ in doc_ordinals]
+        yield doc_ordinals, term_freqs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--terms", type=int, default=2000)
+    args = parser.parse_args()
+
+    doc_ids = {
+        ordinal: hashlib.md5(f"https://example.com/{ordinal}".encode()).hexdigest()
+        for ordinal in range(1, args.docs + 1)
+    }
+
+    json_rows = []
+    binary_rows = []
+    total_postings = 0
+    for doc_ordinals, term_freqs in generate_postings(args.docs, args.terms):
+        idf = math.log(args.docs / len(doc_ordinals))
+        tfidf_scores = {doc_ids[o]: tf * idf for o, tf in zip(doc_ordinals, term_freqs)}
+        json_rows.append((json.dumps(tfidf_scores), json.dumps(list(tfidf_scores.keys()))))
+        binary_rows.append(encode_postings(doc_ordinals, term_freqs))
+        total_postings += len(doc_ordinals)
+
+    json_bytes = sum(len(tfidf) + len(inverted) for tfidf, inverted in json_rows)
+    binary_bytes = sum(len(row) for row in binary_rows)
+
+    start = time.perf_counter()
+    for tfidf, _ in json_rows:
+        json.loads(tfidf)
+    json_decode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for row in binary_rows:
+        decode_postings(row)
+    binary_decode = time.perf_counter() - start
+
+    print(f"Postings: {total_postings} across {args.terms} terms, {args.docs} documents")
+    print(f"{'format':<8} {'bytes':>12} {'bytes/posting':>14} {'decode (s)':>11} {'Mpostings/s':>12}")
+    for name, size, seconds in (("json", json_bytes, json_decode), ("binary", binary_bytes, binary_decode)):
+        print(f"{name:<8} {size:>12} {size / total_postings:>14.2f} {seconds:>11.3f} "
+              f"{total_postings / seconds / 1e6:>12.2f}")
+    print(f"size ratio: {json_bytes / binary_bytes:.1f}x, decode speedup: {json_decode / binary_decode:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Compare TF-IDF and BM25 query latency and segment size on a synthetic corpus
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.index.postings import TermInfo, encode_postings
+from app.index.segment import write_segment
+from app.search.ranking import doc_norm, quantize_impacts
+from app.services.index_service import IndexService
+
+
+def generate_postings(num_docs: int, avg_length: int, vocab_size: int, seed: int = 42):
+    """Return term -> {ordinal: tf} and ordinal -> length for a Zipf-like corpus"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    postings = defaultdict(dict)
+    lengths = {}
+    for ordinal in range(1, num_docs + 1):
+        length = max(10, int(rng.lognormvariate(0, 0.6) * avg_length))
+        lengths[ordinal] = length
+        for term, tf in Counter(rng.choices(vocabulary, weights=weights, k=length)).items():
+            postings[term][ordinal] = tf
+    return postings, lengths
+
+
+def publish(index_dir: str, postings, lengths, with_impacts: bool) -> int:
+    k1, b = settings.bm25_k1, settings.bm25_b
+    avg_length = sum(lengths.values()) / len(lengths)
+    doc_norms = {o: doc_norm(length, avg_length, k1, b) for o, length in lengths.items()}
+
+    def terms():
+        for term, doc_tfs in postings.items():
+            doc_ordinals = sorted(doc_tfs)
+            term_freqs = [doc_tfs[o] for o in doc_ordinals]
+            impacts, max_impact = b"", 0
+            if with_impacts:
+                impacts, max_impact = quantize_impacts(doc_ordinals, term_freqs, doc_norms, k1)
+            yield term, TermInfo(len(doc_ordinals), max(term_freqs),
+                                 encode_postings(doc_ordinals, term_freqs), impacts, max_impact)
+
+    documents = ((o, {"id": str(o), "title": f"Document {o}", "url": f"https://example.com/{o}",
+                      "snippet": ""}) for o in sorted(lengths))
+    name = write_segment(index_dir, terms(), documents,
+                         {"avg_doc_length": avg_length, "bm25_k1": k1, "bm25_b": b})
+    return os.path.getsize(os.path.join(index_dir, name))
+
+
+def time_queries(index_service: IndexService, queries, operation: str, ranking: str) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        index_service.search(query, operation, ranking=ranking)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--avg-length", type=int, default=200)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    postings, lengths = generate_postings(args.docs, args.avg_length, args.vocab)
+    total_postings = sum(len(doc_tfs) for doc_tfs in postings.values())
+    print(f"Corpus: {args.docs} documents, {len(postings)} terms, {total_postings} postings")
+
+    rng = random.Random(7)
+    terms = list(postings)
+    queries = [" ".join(rng.sample(terms[:2000], rng.randint(2, 3))) for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as tfidf_dir, tempfile.TemporaryDirectory() as bm25_dir:
+        tfidf_size = publish(tfidf_dir, postings, lengths, with_impacts=False)
+        bm25_size = publish(bm25_dir, postings, lengths, with_impacts=True)
+        print(f"segment size, postings only:   {tfidf_size / 1e6:8.2f} MB")
+        print(f"segment size, with impacts:    {bm25_size / 1e6:8.2f} MB "
+              f"(+{(bm25_size - tfidf_size) / total_postings:.2f} B/posting)")
+
+        index_service = IndexService(None)
+        for operation in ("AND", "OR"):
+            settings.index_dir = tfidf_dir
+            tfidf_ms = time_queries(index_service, queries, operation, "tfidf")
+            settings.index_dir = bm25_dir
+            bm25_ms = time_queries(index_service, queries, operation, "bm25")
+            print(f"{operation:<3} mean latency: tfidf {tfidf_ms:6.2f} ms, bm25 {bm25_ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Compare Redis index load time and query latency: one command per key (the
+previous loader and search_redis_query) against pipelined hashes and
+server-side sorted set operations
+
+Flushes the target Redis database; point --redis-url at a scratch instance.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import redis
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.search.redis_search import RedisIndex
+from app.utilts.tokenizer import tokenize_text
+
+
+class CountingConnection(redis.Connection):
+    """Counts commands sent, batched or not, and network round trips"""
+    round_trips = 0
+
+    def send_packed_command(self, command, check_health=True):
+        CountingConnection.round_trips += 1
+        super().send_packed_command(command, check_health)
+
+
+def generate_corpus(num_docs: int, avg_length: int, vocab_size: int, seed: int = 42):
+    """Return term -> {doc_id: tfidf} and document metadata for a Zipf-like corpus"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    postings = {}
+    documents = []
+    for i in range(num_docs):
+        doc_id = f"doc{i}"
+        words = rng.choices(vocabulary, weights=weights, k=avg_length)
+        for term in set(words):
+            postings.setdefault(term, {})[doc_id] = round(rng.random(), 6)
+        documents.append({"id": doc_id, "title": f"Document {i}", "url": f"https://example.com/{i}",
+                          "snippet": " ".join(words[:30]), "text": " ".join(words)})
+    return postings, documents
+
+
+def load_one_by_one(r: redis.Redis, postings, documents):
+    for term, scores in postings.items():
+        r.hset(f"tfidf:{term}", mapping=scores)
+    for doc in documents:
+        r.set(f"tokens:{doc['id']}", json.dumps(doc["text"].split()))
+        r.set(f"title:{doc['id']}", doc["title"])
+        r.sadd("docs", doc["id"])
+        r.set(f"doc:{doc['id']}", json.dumps(doc))
+
+
+def search_one_by_one(r: redis.Redis, query: str, op: str):
+    """search_redis_query before the pipelined backend"""
+    scores, doc_sets = {}, []
+    for token in tokenize_text(query):
+        tfidf_postings = r.hgetall(f"tfidf:{token}")
+        doc_sets.append(set(tfidf_postings))
+        for doc_id, score in tfidf_postings.items():
+            scores[doc_id] = scores.get(doc_id, 0) + float(score)
+    matched = set.intersection(*doc_sets) if op == "AND" else set.union(*doc_sets)
+    results = []
+    for doc_id in sorted(matched, key=lambda d: scores.get(d, 0), reverse=True)[:10]:
+        title = r.get(f"title:{doc_id}")
+        doc_json = r.get(f"doc:{doc_id}")
+        url = json.loads(doc_json)["url"] if doc_json else None
+        snippet = r.get(f"tokens:{doc_id}")
+        results.append({"id": doc_id, "title": title, "url": url, "snippet": snippet})
+    return results
+
+
+def measure(fn, *args):
+    CountingConnection.round_trips = 0
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start, CountingConnection.round_trips
+
+
+def time_queries(search, queries, op: str):
+    CountingConnection.round_trips = 0
+    start = time.perf_counter()
+    ids = [[result["id"] for result in search(query, op)] for query in queries]
+    elapsed = (time.perf_counter() - start) / len(queries) * 1000
+    return elapsed, CountingConnection.round_trips / len(queries), ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--avg-length", type=int, default=150)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    pool = redis.ConnectionPool.from_url(args.redis_url, connection_class=CountingConnection,
+                                         decode_responses=True)
+    r = redis.Redis(connection_pool=pool)
+    postings, documents = generate_corpus(args.docs, args.avg_length, args.vocab)
+    print(f"Corpus: {args.docs} documents, {len(postings)} terms, "
+          f"{sum(len(p) for p in postings.values())} postings")
+
+    rng = random.Random(7)
+    terms = list(postings)[:2000]
+    queries = [" ".join(rng.sample(terms, rng.randint(2, 3))) for _ in range(args.queries)]
+
+    r.flushdb()
+    seconds, trips = measure(load_one_by_one, r, postings, documents)
+    print(f"load  one-by-one:  {seconds:7.2f}s {trips:8d} round trips")
+    one_by_one = {op: time_queries(lambda q, o: search_one_by_one(r, q, o), queries, op) for op in ("AND", "OR")}
+
+    modes = {}
+    for set_ops in (False, True):
+        r.flushdb()
+        index = RedisIndex(r, set_ops=set_ops)
+        name = "sorted sets" if set_ops else "hashes"
+        seconds, trips = measure(lambda: (index.load_postings(postings.items()),
+                                          index.load_documents(documents)))
+        print(f"load  {name:<12} {seconds:7.2f}s {trips:8d} round trips")
+        modes[name] = {op: time_queries(index.search, queries, op) for op in ("AND", "OR")}
+
+    for op in ("AND", "OR"):
+        ms, trips, baseline_ids = one_by_one[op]
+        print(f"{op:<3} one-by-one:   {ms:7.2f} ms/query {trips:5.1f} round trips")
+        for name, results in modes.items():
+            ms, trips, ids = results[op]
+            same = all(set(a) == set(b) for a, b in zip(ids, baseline_ids))
+            print(f"{op:<3} {name:<12}  {ms:7.2f} ms/query {trips:5.1f} round trips"
+                  f"{'' if same else '  (results differ)'}")
+    r.flushdb()
+
+
+if __name__ == "__main__":
+    main()
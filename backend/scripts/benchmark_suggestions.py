@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Measure prefix suggestion latency from a segment's rank tree against a full
+scan of the term table (what ILIKE 'q%' does), optionally in a real database
+"""
+
+import argparse
+import heapq
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, SearchIndex
+from app.index.postings import TermInfo
+from app.index.segment import SegmentReader, write_segment
+from app.services.index_service import _suggestions_query
+
+
+def generate_terms(count: int, seed: int = 42):
+    """Return {term: document frequency} with Zipf-distributed frequencies"""
+    rng = random.Random(seed)
+    letters = string.ascii_lowercase
+    terms = {}
+    rank = 1
+    while len(terms) < count:
+        term = "".join(rng.choices(letters, k=rng.randint(3, 12)))
+        if term not in terms:
+            terms[term] = max(1, int(count / rank))
+            rank += 1
+    return terms
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    p = lambda fraction: latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1e6
+    return f"mean {sum(latencies) / len(latencies) * 1e6:9.1f} us  p50 {p(0.5):9.1f} us  p99 {p(0.99):9.1f} us"
+
+
+def time_calls(fn, prefixes):
+    latencies = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        fn(prefix)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def scan(items, prefix: str, limit: int):
+    return [term for _, term in heapq.nsmallest(
+        limit, ((-df, term) for term, df in items if term.startswith(prefix))
+    )]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--terms", type=int, default=2000000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--scan-queries", type=int, default=20, help="queries for the full-scan baseline")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--database-url", help="also time the SQL ILIKE query; the table is dropped and reloaded")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    terms = generate_terms(args.terms)
+    print(f"Generated {len(terms)} terms in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(7)
+    samples = rng.sample(list(terms), min(args.queries, len(terms)))
+    prefixes = [term[:rng.randint(1, 4)] for term in samples]
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        name = write_segment(index_dir, ((term, TermInfo(df, 1, b"")) for term, df in terms.items()), [])
+        size = os.path.getsize(os.path.join(index_dir, name))
+        print(f"Published segment with rank tree in {time.perf_counter() - start:.1f}s ({size / 1e6:.1f} MB)")
+
+        start = time.perf_counter()
+        segment = SegmentReader(os.path.join(index_dir, name))
+        print(f"Opened segment in {(time.perf_counter() - start) * 1e3:.2f} ms")
+
+        cold = time_calls(lambda prefix: segment.suggest(prefix, args.limit), prefixes)
+        warm = time_calls(lambda prefix: segment.suggest(prefix, args.limit), prefixes)
+        print(f"rank tree, cold:   {summarize(cold)}")
+        print(f"rank tree, cached: {summarize(warm)}")
+
+        items = list(terms.items())
+        scan_prefixes = prefixes[:args.scan_queries]
+        print(f"full scan:         {summarize(time_calls(lambda p: scan(items, p, args.limit), scan_prefixes))}")
+        for prefix in scan_prefixes:
+            expected = scan(items, prefix, args.limit)
+            if [term for term, _ in segment.suggest(prefix, args.limit)] != expected:
+                print(f"Mismatch for {prefix!r}")
+        del segment
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+        SearchIndex.__table__.drop(engine, checkfirst=True)
+        Base.metadata.create_all(engine, tables=[SearchIndex.__table__])
+        db = sessionmaker(bind=engine)()
+        for offset in range(0, len(items), 50000):
+            db.execute(insert(SearchIndex), [
+                {"term": term, "document_frequency": df, "max_term_frequency": 1}
+                for term, df in items[offset:offset + 50000]
+            ])
+        db.commit()
+        db_prefixes = prefixes[:max(args.scan_queries, 100)]
+        latencies = time_calls(lambda p: db.scalars(_suggestions_query(p, args.limit)).all(), db_prefixes)
+        print(f"SQL ILIKE:         {summarize(latencies)}")
+        db.close()
+        SearchIndex.__table__.drop(engine)
+
+
+if __name__ == "__main__":
+    main()
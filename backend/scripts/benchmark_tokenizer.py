@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Measure tokenizer throughput on a synthetic Zipf-like corpus, with and
+without character offsets
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utilts.tokenizer import Tokenizer
+
+
+def generate_texts(num_texts: int, text_length: int, vocab_size: int):
+    vocabulary = [f"word{i}ing" for i in range(vocab_size)]
+    return [
+        " ".join(vocabulary[(i * j) % vocab_size // (j % 7 + 1)] for j in range(text_length))
+        for i in range(num_texts)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--length", type=int, default=300, help="Words per text")
+    parser.add_argument("--vocab", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = generate_texts(args.texts, args.length, args.vocab)
+    tokenizer = Tokenizer()
+    runs = [
+        ("tokenize_many", lambda: sum(len(tokens) for tokens in tokenizer.tokenize_many(texts))),
+        ("tokenize_with_offsets", lambda: sum(len(tokenizer.tokenize_with_offsets(text)) for text in texts)),
+    ]
+    print(f"{'method':<22} {'tokens/sec':>12}")
+    for label, run in runs:
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            tokens = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{label:<22} {tokens / best:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
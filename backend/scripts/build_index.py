@@ -2,13 +2,11 @@
 
 import os
 import json
-import redis
+from app.search.redis_search import RedisIndex
 from app.utilts.tokenizer import tokenize_docs
 from app.index.tfidf_indexer import build_tf_idf
 from app.index.inverted_index import build_inverted_index, load_tokenized_docs, save_index
 
-r = redis.Redis()
-
 DOC_PATH = "../../data/docs"
 TOKEN_PATH = "../../data/tokens"
 
@@ -25,13 +23,10 @@ def rebuild_index():
     save_index(inverted_index)
     tfidf_index, df = build_tf_idf()
 
-    # Step 3: Store in Redis
-    for term, postings in tfidf_index.items():
-        r.delete(f"tfidf:{term}")
-        r.hset(f"tfidf:{term}", mapping=postings)
-
-    for term, freq in df.items():
-        r.set(f"df:{term}", freq)
+    # Step 3: Store in Redis, in pipelined batches
+    redis_index = RedisIndex()
+    redis_index.load_postings(tfidf_index.items())
+    redis_index.load_doc_freqs(df)
     # Filter out terms that are empty
     filtered = [(term, freq) for term, freq in df.items() if term != '']
 
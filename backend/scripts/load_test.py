@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Load-test a running API: fire concurrent GET requests and report throughput
+and p50/p90/p99 latency per endpoint
+
+Example:
+    python scripts/load_test.py --base-url http://localhost:8000 --concurrency 64 --requests 5000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import aiohttp
+
+DEFAULT_QUERIES = [
+    "search engine", "python", "database index", "web crawler", "fast api",
+    "machine learning", "open source", "data", "network protocol", "linux kernel",
+]
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def build_requests(endpoints, queries, count: int, seed: int = 42):
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        endpoint = rng.choice(endpoints)
+        query = rng.choice(queries)
+        if endpoint == "search":
+            requests.append(("search", "/search", {"q": query, "op": rng.choice(["AND", "OR"])}))
+        elif endpoint == "suggestions":
+            requests.append(("suggestions", "/suggestions", {"q": query[:rng.randint(1, 4)]}))
+        else:
+            requests.append((endpoint, f"/{endpoint}", {}))
+    return requests
+
+
+async def run(base_url: str, requests, concurrency: int, timeout: float):
+    latencies = {}
+    errors = {}
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+
+    async def worker(session: aiohttp.ClientSession):
+        while True:
+            try:
+                name, path, params = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                async with session.get(base_url + path, params=params) as response:
+                    await response.read()
+                    ok = response.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            elapsed = time.perf_counter() - start
+            if ok:
+                latencies.setdefault(name, []).append(elapsed)
+            else:
+                errors[name] = errors.get(name, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return latencies, errors, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--endpoints", default="search,suggestions,stats",
+                        help="comma-separated mix of search, suggestions, stats, crawl-stats")
+    parser.add_argument("--queries-file", help="one query per line; defaults to a small built-in list")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--warmup", type=int, default=50)
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    base_url = args.base_url.rstrip("/")
+
+    if args.warmup:
+        asyncio.run(run(base_url, build_requests(endpoints, queries, args.warmup, seed=1),
+                        args.concurrency, args.timeout))
+    requests = build_requests(endpoints, queries, args.requests)
+    latencies, errors, wall = asyncio.run(run(base_url, requests, args.concurrency, args.timeout))
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{total} ok, {sum(errors.values())} failed in {wall:.2f}s "
+          f"({total / wall:.1f} req/s) at concurrency {args.concurrency}")
+    print(f"{'endpoint':<12} {'count':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(name, []))
+        print(f"{name:<12} {len(values):>6} {percentile(values, 0.5) * 1000:>9.1f} "
+              f"{percentile(values, 0.9) * 1000:>9.1f} {percentile(values, 0.99) * 1000:>9.1f} "
+              f"{errors.get(name, 0):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Migration script to move document text and HTML out of the documents table
+into the compressed document_bodies table, then drop the old columns
+"""
+
+import argparse
+import os
+import sys
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, insert, text
+
+from app.database import DocumentBody, engine, init_db
+from app.utilts.compression import compress_text, get_codec
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_bodies(batch_size: int = 500, drop_columns: bool = True) -> int:
+    """Compress the bodies of documents without one, batch by batch; returns the count"""
+    columns = {column["name"] for column in inspect(engine).get_columns("documents")}
+    if "content" not in columns:
+        logger.info("documents has no content column, nothing to migrate")
+        return 0
+
+    codec = get_codec()
+    migrated, last_id = 0, ""
+    while True:
+        # One transaction per batch; documents already migrated are skipped
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT d.id, d.content, d.html_content FROM documents d "
+                "LEFT JOIN document_bodies b ON b.document_id = d.id "
+                "WHERE d.id > :last_id AND b.document_id IS NULL ORDER BY d.id LIMIT :limit"
+            ), {"last_id": last_id, "limit": batch_size}).all()
+            if not rows:
+                break
+            conn.execute(insert(DocumentBody), [{
+                "document_id": doc_id,
+                "codec": codec,
+                "content": compress_text(content, codec),
+                "html_content": compress_text(html_content, codec),
+            } for doc_id, content, html_content in rows])
+        migrated += len(rows)
+        last_id = rows[-1][0]
+        logger.info(f"Migrated {migrated} document bodies")
+
+    if drop_columns:
+        with engine.begin() as conn:
+            for column in ("content", "html_content"):
+                if column in columns:
+                    conn.execute(text(f"ALTER TABLE documents DROP COLUMN {column}"))
+        logger.info("Dropped documents.content and documents.html_content; "
+                    "VACUUM FULL documents returns their space on PostgreSQL")
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--keep-columns", action="store_true",
+                        help="Copy the bodies but leave the old columns in place")
+    args = parser.parse_args()
+
+    init_db()
+    migrated = migrate_bodies(args.batch_size, drop_columns=not args.keep_columns)
+    logger.info(f"Document body migration completed. Migrated {migrated} documents.")
+
+
+if __name__ == "__main__":
+    main()
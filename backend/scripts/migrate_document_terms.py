@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Migration script to aggregate the per-occurrence tokens table into one
+document_terms row per (document, term), then drop the tokens table.
+The schema steps of migrate_schema.py run first: the rows are keyed by
+document ordinal.
+"""
+
+import argparse
+import os
+import sys
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, inspect, insert, text
+
+from app.database import DocumentTerm, engine, init_db
+from app.index.postings import encode_positions, encode_spans
+from scripts.migrate_schema import migrate_schema
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_terms(batch_size: int = 200, drop_table: bool = True) -> int:
+    """Aggregate the tokens of documents without terms, batch by batch; returns the count"""
+    if not inspect(engine).has_table("tokens"):
+        logger.info("No tokens table, nothing to migrate")
+        return 0
+
+    documents_query = text(
+        "SELECT d.id, d.ordinal FROM documents d WHERE d.ordinal > :last_ordinal "
+        "AND NOT EXISTS (SELECT 1 FROM document_terms t WHERE t.document_ordinal = d.ordinal) "
+        "ORDER BY d.ordinal LIMIT :limit"
+    )
+    # Tokens stored before character offsets were have no spans
+    offsets = "start_offset, end_offset"
+    if not {"start_offset", "end_offset"} <= {column["name"] for column in inspect(engine).get_columns("tokens")}:
+        offsets = "NULL, NULL"
+    tokens_query = text(
+        f"SELECT document_id, token, position, {offsets} FROM tokens "
+        "WHERE document_id IN :doc_ids ORDER BY document_id, position"
+    ).bindparams(bindparam("doc_ids", expanding=True))
+
+    migrated, last_ordinal = 0, 0
+    while True:
+        # One transaction per batch; documents already migrated are skipped
+        with engine.begin() as conn:
+            documents = dict(conn.execute(
+                documents_query, {"last_ordinal": last_ordinal, "limit": batch_size}
+            ).all())
+            if not documents:
+                break
+            terms = {}
+            for doc_id, token, position, start, end in conn.execute(tokens_query, {"doc_ids": list(documents)}):
+                positions, spans = terms.setdefault((documents[doc_id], token), ([], []))
+                positions.append(position)
+                spans.append((start, end))
+            rows = [{
+                "document_ordinal": ordinal,
+                "term": term,
+                "frequency": len(positions),
+                "positions": encode_positions((positions,)),
+                "spans": encode_spans(spans) if None not in spans[0] else None,
+            } for (ordinal, term), (positions, spans) in terms.items()]
+            if rows:
+                conn.execute(insert(DocumentTerm), rows)
+        migrated += len(documents)
+        last_ordinal = max(documents.values())
+        logger.info(f"Migrated the tokens of {migrated} documents")
+
+    if drop_table:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE tokens"))
+        logger.info("Dropped the tokens table")
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=200, help="Documents per transaction")
+    parser.add_argument("--keep-table", action="store_true",
+                        help="Aggregate the tokens but leave the tokens table in place")
+    args = parser.parse_args()
+
+    init_db()
+    migrate_schema()
+    migrated = migrate_terms(args.batch_size, drop_table=not args.keep_table)
+    logger.info(f"Token migration completed. Migrated {migrated} documents.")
+
+
+if __name__ == "__main__":
+    main()
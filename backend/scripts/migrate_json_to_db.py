@@ -33,6 +33,21 @@ def migrate_documents():
         logger.warning(f"Documents directory not found: {docs_dir}")
         return
     
+    def read_documents():
+        for doc_file in docs_dir.glob("*.json"):
+            try:
+                with open(doc_file, 'r', encoding='utf-8') as f:
+                    doc_data = json.load(f)
+            except Exception as e:
+                logger.error(f"Error reading document {doc_file}: {e}")
+                continue
+            yield {
+                "url": doc_data.get('url', ''),
+                "title": doc_data.get('title', ''),
+                "content": doc_data.get('content', ''),
+                "html_content": doc_data.get('html_content', ''),
+            }
+    
     db = SessionLocal()
     try:
         doc_service = DocumentService(db)
@@ -41,28 +56,13 @@ def migrate_documents():
         existing_count = doc_service.get_document_count()
         logger.info(f"Found {existing_count} existing documents in database")
         
-        # Migrate documents
-        migrated_count = 0
-        for doc_file in docs_dir.glob("*.json"):
-            try:
-                with open(doc_file, 'r', encoding='utf-8') as f:
-                    doc_data = json.load(f)
-                
-                # Create document in database
-                document = doc_service.create_document(
-                    url=doc_data.get('url', ''),
-                    title=doc_data.get('title', ''),
-                    content=doc_data.get('content', ''),
-                    html_content=doc_data.get('html_content', '')
-                )
-                
-                migrated_count += 1
-                logger.info(f"Migrated document: {doc_data.get('title', 'Unknown')}")
-                
-            except Exception as e:
-                logger.error(f"Error migrating document {doc_file}: {e}")
+        # Migrate documents in batches, tokenizing in a process pool
+        result = doc_service.bulk_create_documents(read_documents())
         
-        logger.info(f"Document migration completed. Migrated {migrated_count} documents.")
+        logger.info(
+            f"Document migration completed. Migrated {result['documents']} documents "
+            f"({result['docs_per_sec']:.0f} docs/sec, {result['tokens_per_sec']:.0f} tokens/sec)."
+        )
         
     finally:
         db.close()
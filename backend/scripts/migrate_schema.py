@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Migration script to bring the tables of an existing database up to the
+current schema: create_all only creates missing tables, so columns and
+constraints added to existing ones are added here. Documents get ordinals
+from documents_ordinal_seq and the JSON search index columns are converted
+to binary postings (app.index.postings). Every step checks the schema
+first, so the script can be re-run.
+
+The columns added to documents are backfilled from each document's text,
+batch by batch; crawl validators and links stay empty until the next crawl.
+Run this first, then migrate_document_terms.py and migrate_document_bodies.py,
+then rebuild the index (POST /rebuild-index) for the title and URL fields,
+surface forms, corpus stats and a segment.
+"""
+
+import argparse
+import os
+import sys
+from itertools import groupby
+from operator import itemgetter
+
+# Add the parent directory to the path so we can import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, inspect, insert, text
+
+from app.config import settings
+from app.database import SearchIndex, SimhashBand, engine, init_db
+from app.index.fields import TITLE, URL, short_field_tokens
+from app.index.postings import encode_postings
+from app.index.simhash import bands, simhash, to_signed
+from app.services.document_service import content_fingerprint, make_snippet
+from app.utilts.compression import decompress_text
+from app.utilts.tokenizer import tokenize_text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Postings rows inserted per statement
+BATCH_SIZE = 1000
+
+# Columns added to documents after it was first created, with their DDL types
+DOCUMENT_COLUMNS = {
+    "length": "INTEGER DEFAULT 0",
+    "title_length": "INTEGER DEFAULT 0",
+    "url_length": "INTEGER DEFAULT 0",
+    "snippet": "VARCHAR(255)",
+    "content_hash": "VARCHAR(64)",
+    "etag": "VARCHAR(255)",
+    "last_modified": "VARCHAR(64)",
+    "links": "TEXT",
+    "simhash": "BIGINT",
+}
+
+
+def _columns(conn, table: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+def add_document_columns(conn) -> bool:
+    """Add the missing documents columns; returns whether any was added"""
+    missing = [column for column in DOCUMENT_COLUMNS if column not in _columns(conn, "documents")]
+    for column in missing:
+        conn.execute(text(f"ALTER TABLE documents ADD COLUMN {column} {DOCUMENT_COLUMNS[column]}"))
+    return bool(missing)
+
+
+def migrate_ordinals(conn) -> bool:
+    """Number the documents in creation order; returns whether the column was added"""
+    if "ordinal" in _columns(conn, "documents"):
+        return False
+    postgres = conn.dialect.name == "postgresql"
+    if postgres:
+        conn.execute(text("CREATE SEQUENCE IF NOT EXISTS documents_ordinal_seq"))
+    conn.execute(text("ALTER TABLE documents ADD COLUMN ordinal INTEGER"))
+    conn.execute(text(
+        "UPDATE documents SET ordinal = numbered.n FROM ("
+        "SELECT id, row_number() OVER (ORDER BY created_at, id) AS n FROM documents"
+        ") AS numbered WHERE documents.id = numbered.id"
+    ))
+    if postgres:
+        conn.execute(text(
+            "SELECT setval('documents_ordinal_seq', max(ordinal)) FROM documents HAVING count(*) > 0"
+        ))
+        conn.execute(text("ALTER TABLE documents ALTER COLUMN ordinal SET NOT NULL"))
+        conn.execute(text("ALTER TABLE documents ADD CONSTRAINT documents_ordinal_key UNIQUE (ordinal)"))
+    else:
+        # SQLite cannot add NOT NULL to an existing column; new documents
+        # get their ordinal from app.database.allocate_ordinals
+        conn.execute(text("CREATE UNIQUE INDEX documents_ordinal_key ON documents (ordinal)"))
+    return True
+
+
+def _postings_rows(conn):
+    """(term, document ordinal, frequency) of every body posting, in term order"""
+    tables = inspect(conn).get_table_names()
+    if "tokens" in tables:
+        query = ("SELECT t.token, d.ordinal, count(*) FROM tokens t JOIN documents d ON d.id = t.document_id "
+                 "GROUP BY t.token, d.ordinal ORDER BY t.token, d.ordinal")
+    elif "document_terms" in tables:
+        query = ("SELECT term, document_ordinal, frequency FROM document_terms "
+                 "ORDER BY term, document_ordinal")
+    else:
+        return []
+    return conn.execute(text(query).execution_options(stream_results=True))
+
+
+def convert_postings(conn) -> int:
+    """Replace the JSON search index with binary postings; returns the number of terms
+
+    The JSON rows are keyed by document id, and earlier versions stored
+    tf-idf scores rather than term frequencies there, so the postings are
+    recounted from the stored tokens instead of decoded.
+    """
+    conn.execute(text("DELETE FROM search_indices"))
+    for column in ("tfidf_data", "inverted_index_data"):
+        if column in _columns(conn, "search_indices"):
+            conn.execute(text(f"ALTER TABLE search_indices DROP COLUMN {column}"))
+    conn.execute(text(f"ALTER TABLE search_indices ADD COLUMN postings {_binary_type(conn)}"))
+
+    terms, batch = 0, []
+    for term, postings in groupby(_postings_rows(conn), key=itemgetter(0)):
+        _, doc_ordinals, term_freqs = zip(*postings)
+        batch.append({
+            "term": term,
+            "document_frequency": len(doc_ordinals),
+            "max_term_frequency": max(term_freqs),
+            "postings": encode_postings(doc_ordinals, term_freqs),
+        })
+        if len(batch) >= BATCH_SIZE:
+            conn.execute(insert(SearchIndex), batch)
+            terms, batch = terms + len(batch), []
+    if batch:
+        conn.execute(insert(SearchIndex), batch)
+        terms += len(batch)
+    return terms
+
+
+def _binary_type(conn) -> str:
+    return "BYTEA" if conn.dialect.name == "postgresql" else "BLOB"
+
+
+def _add_search_index_columns(conn):
+    columns = _columns(conn, "search_indices")
+    if "surface" not in columns:
+        conn.execute(text("ALTER TABLE search_indices ADD COLUMN surface VARCHAR(255)"))
+    if "max_term_frequency" not in columns:
+        conn.execute(text("ALTER TABLE search_indices ADD COLUMN max_term_frequency INTEGER DEFAULT 0"))
+    if "field" not in columns:
+        # Every row indexed so far is a body term
+        conn.execute(text(
+            "ALTER TABLE search_indices ADD COLUMN field VARCHAR(16) NOT NULL DEFAULT 'body'"
+        ))
+
+
+def _rebuild_sqlite_search_indices(conn):
+    """Recreate search_indices from the current model, keeping its rows
+
+    SQLite cannot drop the old UNIQUE (term) constraint in place.
+    """
+    columns = _columns(conn, "search_indices")
+    conn.execute(text("DROP INDEX IF EXISTS idx_search_indices_term"))
+    conn.execute(text("ALTER TABLE search_indices RENAME TO search_indices_old"))
+    SearchIndex.__table__.create(conn)
+    kept = ", ".join(column.name for column in SearchIndex.__table__.columns if column.name in columns)
+    conn.execute(text(f"INSERT INTO search_indices ({kept}) SELECT {kept} FROM search_indices_old"))
+    conn.execute(text("DROP TABLE search_indices_old"))
+
+
+def migrate_search_indices(conn) -> bool:
+    """Convert search_indices to per-field binary postings; returns whether anything changed"""
+    columns = _columns(conn, "search_indices")
+    changed = bool({"postings", "max_term_frequency", "field", "surface"} - columns)
+    _add_search_index_columns(conn)
+    if "postings" not in columns:
+        logger.info(f"Converted the postings of {convert_postings(conn)} terms")
+
+    unique_constraints = inspect(conn).get_unique_constraints("search_indices")
+    if any(constraint["column_names"] == ["term"] for constraint in unique_constraints):
+        # A term is now unique per field only
+        if conn.dialect.name == "postgresql":
+            for constraint in unique_constraints:
+                if constraint["column_names"] == ["term"]:
+                    conn.execute(text(f'ALTER TABLE search_indices DROP CONSTRAINT "{constraint["name"]}"'))
+            conn.execute(text(
+                "ALTER TABLE search_indices ADD CONSTRAINT uq_search_indices_field_term UNIQUE (field, term)"
+            ))
+        else:
+            _rebuild_sqlite_search_indices(conn)
+        changed = True
+    return changed
+
+
+def migrate_schema() -> bool:
+    """Apply every pending step in one transaction; returns whether anything changed"""
+    with engine.begin() as conn:
+        if not inspect(conn).has_table("documents"):
+            logger.info("No documents table, nothing to migrate")
+            return False
+        changed = migrate_ordinals(conn)
+        if changed:
+            logger.info("Numbered the documents with ordinals")
+        changed = add_document_columns(conn) or changed
+        changed = migrate_search_indices(conn) or changed
+    return changed
+
+
+def _document_texts(conn, doc_ids):
+    """doc id -> (content, html_content), from documents or, once moved, document_bodies"""
+    if "content" in _columns(conn, "documents"):
+        query = text("SELECT id, content, html_content FROM documents WHERE id IN :doc_ids")
+        rows = conn.execute(query.bindparams(bindparam("doc_ids", expanding=True)), {"doc_ids": doc_ids})
+        return {doc_id: (content, html_content) for doc_id, content, html_content in rows}
+    query = text("SELECT document_id, codec, content, html_content FROM document_bodies "
+                 "WHERE document_id IN :doc_ids")
+    rows = conn.execute(query.bindparams(bindparam("doc_ids", expanding=True)), {"doc_ids": doc_ids})
+    return {doc_id: (decompress_text(content, codec), decompress_text(html_content, codec))
+            for doc_id, codec, content, html_content in rows}
+
+
+def _token_counts(conn, ordinals):
+    """doc id -> token count of the documents with ``ordinals``, from tokens or document_terms"""
+    if inspect(conn).has_table("tokens"):
+        query = text("SELECT d.id, count(*) FROM tokens t JOIN documents d ON d.id = t.document_id "
+                     "WHERE d.ordinal IN :ordinals GROUP BY d.id")
+    else:
+        query = text("SELECT d.id, sum(t.frequency) FROM document_terms t JOIN documents d "
+                     "ON d.ordinal = t.document_ordinal WHERE d.ordinal IN :ordinals GROUP BY d.id")
+    return dict(conn.execute(query.bindparams(bindparam("ordinals", expanding=True)), {"ordinals": ordinals}).all())
+
+
+def backfill_documents(batch_size: int = 200) -> int:
+    """Fill the added documents columns of documents without a content hash; returns the count
+
+    Lengths count the stored tokens, so they agree with the postings
+    recounted from them. Fingerprints are computed with the current
+    tokenizer, like those of newly crawled pages they are compared with.
+    """
+    documents_query = text(
+        "SELECT id, ordinal, title, url FROM documents WHERE content_hash IS NULL AND id > :last_id "
+        "ORDER BY id LIMIT :limit"
+    )
+    update_query = text(
+        "UPDATE documents SET length = :length, title_length = :title_length, url_length = :url_length, "
+        "snippet = :snippet, content_hash = :content_hash, simhash = :simhash WHERE id = :doc_id"
+    )
+    backfilled, last_id = 0, ""
+    while True:
+        # One transaction per batch; backfilled documents have a content hash
+        with engine.begin() as conn:
+            documents = {doc_id: (ordinal, title, url) for doc_id, ordinal, title, url in conn.execute(
+                documents_query, {"last_id": last_id, "limit": batch_size}
+            )}
+            if not documents:
+                break
+            texts = _document_texts(conn, list(documents))
+            lengths = _token_counts(conn, [ordinal for ordinal, _, _ in documents.values()])
+            rows, band_rows = [], []
+            for doc_id, (ordinal, title, url) in documents.items():
+                content, html_content = texts.get(doc_id, (None, None))
+                field_tokens = short_field_tokens(title, url)
+                fingerprint = simhash(tokenize_text(content or "")) if settings.near_duplicate_detection else None
+                rows.append({
+                    "doc_id": doc_id,
+                    "length": lengths.get(doc_id, 0),
+                    "title_length": len(field_tokens[TITLE]),
+                    "url_length": len(field_tokens[URL]),
+                    "snippet": make_snippet(content or ""),
+                    "content_hash": content_fingerprint(title, content, html_content),
+                    "simhash": to_signed(fingerprint) if fingerprint is not None else None,
+                })
+                if fingerprint is not None:
+                    band_rows.extend({"band": band, "value": value, "document_id": doc_id}
+                                     for band, value in bands(fingerprint))
+            conn.execute(update_query, rows)
+            if band_rows:
+                conn.execute(insert(SimhashBand), band_rows)
+        backfilled += len(documents)
+        last_id = max(documents)
+        logger.info(f"Backfilled {backfilled} documents")
+    return backfilled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=200, help="Documents backfilled per transaction")
+    args = parser.parse_args()
+
+    init_db()
+    if migrate_schema():
+        logger.info("Schema migration completed")
+    else:
+        logger.info("Schema is up to date")
+    backfilled = backfill_documents(args.batch_size)
+    logger.info(f"Backfilled {backfilled} documents.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,29 @@
+from app.config import settings
+from app.crawler.async_crawler import AsyncCrawler
 from app.crawler.crawler import SimpleCrawler
 
-def crawl_and_store(urls, max_pages=10, delay=1):
-    crawler = SimpleCrawler(urls, max_pages=max_pages, delay=delay)
-    crawler.crawl_and_store()
\ No newline at end of file
+def crawl_and_store(urls, max_pages=10, delay=1, mode=None):
+    """Crawl from urls and store the pages
+
+    Returns page counts: "crawled", of which "not_modified" (304 answers),
+    "unchanged" (downloaded again with the same content), "near_duplicates"
+    (collapsed onto an indexed page) and "stored" (new or changed pages
+    written to the index), plus "store_failed": pages crawled but not
+    written because storing them raised.
+    """
+    mode = mode or settings.crawler_mode
+    if mode == "async":
+        # Concurrent across hosts, with delay seconds between requests to one host
+        crawler = AsyncCrawler(urls, max_pages=max_pages, host_delay=delay)
+        crawler.run()
+    else:
+        crawler = SimpleCrawler(urls, max_pages=max_pages, delay=delay)
+        crawler.crawl_and_store()
+    return {
+        "crawled": len(crawler.visited),
+        "not_modified": crawler.not_modified,
+        "unchanged": crawler.unchanged,
+        "near_duplicates": crawler.near_duplicates,
+        "stored": crawler.stored,
+        "store_failed": crawler.store_failed,
+    }
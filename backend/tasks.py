@@ -1,5 +1,5 @@
 from celery import Celery
-from app.crawler.crawler import SimpleCrawler
+from scripts.run_crawler import crawl_and_store
 from app.services.index_service import IndexService
 from app.database import SessionLocal
 import os
@@ -27,18 +27,25 @@ def rebuild_index_task():
 @celery_app.task(name="crawl_and_index_task")
 def crawl_and_index_task(urls):
     try:
-        # Crawl and store documents to database
-        crawler = SimpleCrawler(urls, max_pages=20, delay=1)
-        crawler.crawl_and_store()
+        # Crawl and store documents to database; each stored page
+        # updates the index incrementally, so no rebuild is needed
+        crawl_stats = crawl_and_store(urls, max_pages=20, delay=1)
         
-        # Rebuild index
-        db = SessionLocal()
-        try:
-            index_service = IndexService(db)
-            result = index_service.rebuild_index()
-            return result
-        finally:
-            db.close()
+        # Publish new and changed pages to segment readers as a delta; a
+        # re-crawl that found nothing new leaves the segments in place
+        if crawl_stats["stored"]:
+            db = SessionLocal()
+            try:
+                IndexService(db).publish_changes()
+            finally:
+                db.close()
+        
+        return {
+            "status": "success",
+            "documents_crawled": crawl_stats["crawled"],
+            "documents_stored": crawl_stats["stored"],
+            "documents_failed": crawl_stats["store_failed"]
+        }
     except Exception as e:
         return {
             "status": "error",
@@ -0,0 +1,31 @@
+import pytest
+from app.utilts.compression import BLOCK_CHARS, CODECS, compress_text, decompress_text, get_codec
+
+
+def test_bodies_round_trip_with_every_codec():
+    text = "Ünïcode text, repeated. " * 200 + "\ud800"
+    for codec in CODECS:
+        data = compress_text(text, codec)
+        assert len(data) < len(text) // 10
+        assert decompress_text(data, codec) == text
+        assert compress_text(None, codec) is None
+        assert decompress_text(None, codec) is None
+
+
+def test_unknown_codecs_are_rejected():
+    with pytest.raises(ValueError):
+        get_codec("lz4")
+    with pytest.raises(ValueError):
+        decompress_text(b"", "lz4")
+    assert get_codec("zlib") == "zlib"
+
+
+def test_ranges_decompress_across_blocks():
+    text = "".join(chr(0x41 + i % 26) + "é" for i in range(BLOCK_CHARS * 2))
+    for codec in CODECS:
+        data = compress_text(text, codec)
+        for start, end in [(0, 10), (BLOCK_CHARS - 5, BLOCK_CHARS + 5), (BLOCK_CHARS * 3, BLOCK_CHARS * 4 + 7),
+                           (len(text) - 3, len(text) + 50), (len(text) + 1, len(text) + 9)]:
+            assert decompress_text(data, codec, start, end) == text[start:end]
+        assert decompress_text(data, codec, BLOCK_CHARS + 1) == text[BLOCK_CHARS + 1:]
+        assert decompress_text(compress_text("", codec), codec) == ""
@@ -4,4 +4,52 @@ def test_crawler():
     seed_urls = ["https://web-scraping.dev"]
     crawler = SimpleCrawler(seed_urls, max_pages=5, delay=1)
     crawler.crawl_and_store()
-    assert len(crawler.visited) == 5
\ No newline at end of file
+    assert len(crawler.visited) == 5
+
+def test_frontier_dedup_and_host_delay():
+    from app.crawler.async_crawler import Frontier
+
+    frontier = Frontier(host_delay=1.0)
+    assert frontier.add("http://a.test/1")
+    assert not frontier.add("http://a.test/1#section")
+    frontier.add("http://a.test/2")
+    frontier.add("http://b.test/1")
+    assert len(frontier) == 3
+
+    assert frontier.pop(0.0) == ("http://a.test/1", None)
+    assert frontier.pop(0.0) == ("http://b.test/1", None)
+    # a.test was fetched at t=0 and must wait for its delay
+    assert frontier.pop(0.5) == (None, 0.5)
+    assert frontier.pop(1.0) == ("http://a.test/2", None)
+    assert frontier.pop(1.0) == (None, None)
+
+def test_conditional_headers_and_content_fingerprint():
+    from app.crawler.crawler import conditional_headers, response_validators
+    from app.services.document_service import content_fingerprint
+
+    assert conditional_headers(None) == {}
+    assert conditional_headers({"etag": '"v1"', "last_modified": None}) == {"If-None-Match": '"v1"'}
+    assert conditional_headers({"etag": None, "last_modified": "Wed, 21 Oct 2015 07:28:00 GMT"}) == \
+        {"If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    assert response_validators({"ETag": '"v1"'}) == ('"v1"', None)
+    # Too long for the etag column: crawl unconditionally next time
+    assert response_validators({"ETag": "x" * 300}) == (None, None)
+
+    assert content_fingerprint("Title", "body") == content_fingerprint("Title", "body", None)
+    assert content_fingerprint("Title", "body") != content_fingerprint("Title", "body!")
+    # Text moved between fields is a change
+    assert content_fingerprint("ab", "c") != content_fingerprint("a", "bc")
+
+def test_async_crawler_counts_only_stored_batches():
+    import asyncio
+    from app.crawler.async_crawler import AsyncCrawler
+
+    def store(documents):
+        if documents[0]["url"].endswith("fail"):
+            raise RuntimeError("database unavailable")
+        return {"documents": len(documents), "unchanged": 1, "near_duplicates": 0}
+
+    crawler = AsyncCrawler([], store=store)
+    asyncio.run(crawler._store([{"url": "http://a.test/1"}, {"url": "http://a.test/2"}]))
+    asyncio.run(crawler._store([{"url": "http://a.test/fail"}]))
+    assert (crawler.stored, crawler.unchanged, crawler.store_failed) == (1, 1, 1)
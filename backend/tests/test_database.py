@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, Document, async_database_url, next_ordinals, pool_options
+
+
+def test_async_database_url_swaps_in_async_driver():
+    assert async_database_url("postgresql://user:secret@db:5432/search") == \
+        "postgresql+asyncpg://user:secret@db:5432/search"
+    assert async_database_url("postgresql+psycopg2://u:p@h/d") == "postgresql+asyncpg://u:p@h/d"
+    assert async_database_url("sqlite:///./search.db") == "sqlite+aiosqlite:///./search.db"
+    with pytest.raises(ValueError):
+        async_database_url("mysql://u:p@h/d")
+
+
+def test_pool_options_skip_sqlite():
+    assert pool_options("sqlite://") == {}
+    assert pool_options("postgresql://u:p@h/d")["pool_pre_ping"] is True
+
+
+def test_ordinals_allocated_without_sequences():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Document(id="a", url="http://a/", title="a"))
+    db.commit()
+    # Flushed together, so none is in the table when the next is allocated
+    db.add_all([Document(id=name, url=f"http://{name}/", title=name) for name in "bcd"])
+    db.commit()
+    assert sorted(ordinal for (ordinal,) in db.query(Document.ordinal)) == [1, 2, 3, 4]
+    # Re-indexed documents draw from the same allocator
+    assert next_ordinals(db.connection(), 2) == [5, 6]
+    assert next_ordinals(db.connection(), 1) == [7]
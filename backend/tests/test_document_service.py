@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base, Document, DocumentTerm, SearchIndex
+from app.index.postings import decode_postings
+from app.services.document_service import DocumentService
+from app.services.index_service import IndexService
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path / "index"))
+    monkeypatch.setattr(settings, "near_duplicate_detection", False)
+    session = _session()
+    yield session
+    session.close()
+
+
+def _index(db):
+    """{field: {term: {ordinal: frequency}}} of the search_indices rows, checking their counts"""
+    index = {}
+    for row in db.query(SearchIndex):
+        doc_ordinals, term_freqs = decode_postings(row.postings)
+        assert row.document_frequency == len(doc_ordinals)
+        assert row.max_term_frequency == max(term_freqs)
+        index.setdefault(row.field, {})[row.term] = dict(zip(doc_ordinals, term_freqs))
+    return index
+
+
+def test_postings_follow_document_changes(db):
+    service = DocumentService(db)
+    a = service.create_document("http://site/recipes/pie", "Apple Pie", "apple pie apple").ordinal
+    b = service.create_document("http://site/cherry", "Cherry", "cherry pie with cream").ordinal
+    assert _index(db) == {
+        "body": {"appl": {a: 2}, "pie": {a: 1, b: 1}, "cherri": {b: 1}, "cream": {b: 1}},
+        "title": {"appl": {a: 1}, "pie": {a: 1}, "cherri": {b: 1}},
+        "url": {"recip": {a: 1}, "pie": {a: 1}, "cherri": {b: 1}},
+    }
+
+    # An update re-indexes the document under a new ordinal
+    a2 = service.create_document("http://site/recipes/pie", "Apple Crumble", "apple crumble").ordinal
+    assert a2 != a
+    assert _index(db) == {
+        "body": {"appl": {a2: 1}, "crumbl": {a2: 1}, "pie": {b: 1}, "cherri": {b: 1}, "cream": {b: 1}},
+        "title": {"appl": {a2: 1}, "crumbl": {a2: 1}, "cherri": {b: 1}},
+        "url": {"recip": {a2: 1}, "pie": {a2: 1}, "cherri": {b: 1}},
+    }
+
+    assert service.delete_document(service.get_document_by_url("http://site/cherry").id)
+    incremental = _index(db)
+    assert incremental == {
+        "body": {"appl": {a2: 1}, "crumbl": {a2: 1}},
+        "title": {"appl": {a2: 1}, "crumbl": {a2: 1}},
+        "url": {"recip": {a2: 1}, "pie": {a2: 1}},
+    }
+    IndexService(db).build_tfidf_index(mode="grouped")
+    assert _index(db) == incremental
+
+
+def _stored(db):
+    """Document rows by id and document_terms rows by (document id, term), without ordinals"""
+    columns = ("url", "title", "length", "title_length", "url_length", "snippet", "content_hash",
+               "etag", "last_modified", "links", "simhash")
+    documents = {document.id: {column: getattr(document, column) for column in columns}
+                 for document in db.query(Document)}
+    ids = dict(db.query(Document.ordinal, Document.id))
+    terms = {(ids[row.document_ordinal], row.term): (row.frequency, row.positions, row.spans, row.surface)
+             for row in db.query(DocumentTerm)}
+    return documents, terms
+
+
+def test_bulk_ingestion_matches_single_documents(db):
+    first = [
+        {"url": "http://site/a", "title": "Apples", "content": "apple orchards grow apple trees"},
+        {"url": "http://site/b", "title": "Pies", "content": "apple pie with cinnamon", "etag": '"b1"'},
+        # Replaces the first document of the batch
+        {"url": "http://site/a", "title": "Apples", "content": "apple harvest in the autumn",
+         "links": ["http://site/b"]},
+        {"url": "http://site/c", "title": "Jam", "content": "cherry jam and bread"},
+    ]
+    second = [
+        # Same title and content: only the crawl fields change
+        {"url": "http://site/b", "title": "Pies", "content": "apple pie with cinnamon", "etag": '"b2"'},
+        {"url": "http://site/c", "title": "Jam", "content": "plum jam and toast"},
+    ]
+
+    service = DocumentService(db)
+    assert service.bulk_create_documents(first, batch_size=10, workers=1)["documents"] == 3
+    counts = service.bulk_create_documents(second, batch_size=10, workers=1)
+    assert (counts["documents"], counts["unchanged"]) == (2, 1)
+
+    single = _session()
+    single_service = DocumentService(single)
+    for document in first + second:
+        single_service.create_document(**document)
+
+    stored = _stored(db)
+    by_url = {document["url"]: document for document in stored[0].values()}
+    assert by_url["http://site/b"]["etag"] == '"b2"'
+    assert by_url["http://site/a"]["links"] is not None
+    stored_terms = {term for _, term in stored[1]}
+    assert {"harvest", "plum"} <= stored_terms and not {"orchard", "cherri"} & stored_terms
+    assert stored == _stored(single)
+    single.close()
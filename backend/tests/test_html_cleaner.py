@@ -0,0 +1,41 @@
+import pytest
+from app.utilts.html_cleaner import EXTRACTORS, decode_body, extract_html
+
+PAGE = """<html><head><title> Otter
+facts </title><script>var tracking = 1;</script></head><body>
+<header><a href="/">Home</a></header>
+<nav><ul><li><a href="/a">A</a></li><li><a href="/b#top">B</a></li></ul></nav>
+<div class="cookie-banner">We use cookies</div>
+<div id="content"><p>Otters are <a href="/mammals">mammals</a> living near rivers.</p>
+<ul><li><a href="https://other.test/x">Related one</a></li><li><a href="/y">Related two</a></li></ul>
+<!-- hidden --><p>They hold <b>hands</b>&nbsp;while sleeping.</p></div>
+<footer>Copyright <a href="mailto:otter@example.com">mail</a></footer></body></html>"""
+
+
+@pytest.mark.parametrize("extractor", sorted(EXTRACTORS))
+def test_extract_html_strips_boilerplate_but_keeps_every_link(extractor):
+    page = extract_html(PAGE, "https://ex.com/page", extractor, strip_boilerplate=True)
+    assert page.title == "Otter facts"
+    assert page.text.startswith("Otters are mammals living near rivers.")
+    assert page.text.endswith("They hold hands while sleeping.")
+    for boilerplate in ("Home", "cookies", "Copyright", "tracking", "hidden"):
+        assert boilerplate not in page.text
+    assert page.links == ["https://ex.com/", "https://ex.com/a", "https://ex.com/b#top",
+                          "https://ex.com/mammals", "https://other.test/x", "https://ex.com/y"]
+
+    kept = extract_html(PAGE, "https://ex.com/page", extractor, strip_boilerplate=False)
+    assert "Home" in kept.text and "Copyright" in kept.text and "tracking" not in kept.text
+
+
+def test_extract_html_prefers_marked_main_content():
+    html = "<body><nav>menu</nav><article>short</article><main><p>main text</p><nav>x</nav></main></body>"
+    assert extract_html(html, "https://ex.com/", "lxml").text == "main text"
+    assert extract_html("", "https://ex.com/", "lxml").text == ""
+
+
+def test_decode_body():
+    assert decode_body("café".encode("utf-8")) == "café"
+    assert decode_body("é".encode("latin-1"), "text/html; charset=ISO-8859-1") == "é"
+    # Cut off inside the last character by the download limit
+    assert decode_body("café".encode("utf-8")[:-1]) == "caf"
+    assert decode_body("naïve text".encode("cp1252")) == "naïve text"
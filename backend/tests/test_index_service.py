@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base, SearchIndex
+from app.index.postings import decode_postings
+from app.index.segment import SegmentSet, get_current_segment
+from app.services.document_service import DocumentService
+from app.services.index_service import IndexService
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path / "index"))
+    monkeypatch.setattr(settings, "search_cache_size", 0)
+    monkeypatch.setattr(settings, "index_build_mode", "grouped")
+    # On disk, so partitioned builds can read it from worker processes
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _decoded_index(db):
+    return {
+        (row.field, row.term): (row.document_frequency, row.max_term_frequency, row.surface,
+                                [list(values) for values in decode_postings(row.postings)])
+        for row in db.query(SearchIndex)
+    }
+
+
+def test_build_modes_agree(db):
+    DocumentService(db).bulk_create_documents([
+        {"url": f"http://site/{name}", "title": title, "content": content}
+        for name, title, content in [
+            ("apples", "Apples", "apple orchards grow apple trees and more apple trees"),
+            ("pies", "Pie recipes", "apple pie, cherry pie and a crumble"),
+            ("jam", "Cherry jam", "cherries boiled into jam with sugar"),
+            ("bread", "Bread", "bread with butter and cherry jam"),
+            ("trees", "Orchard trees", "pruning trees in the orchard in winter"),
+        ]
+    ], workers=1)
+    index = IndexService(db)
+
+    built = {}
+    for mode, workers in (("grouped", None), ("partitioned", 1), ("partitioned", 2), ("per_document", None)):
+        term_doc_freq = index.build_tfidf_index(mode=mode, workers=workers)
+        built[mode, workers] = (term_doc_freq, _decoded_index(db))
+    expected_doc_freqs, expected_index = built["grouped", None]
+    assert expected_doc_freqs["appl"] == 2 and expected_index["body", "appl"][0] == 2
+    for mode, (term_doc_freq, decoded) in built.items():
+        assert term_doc_freq == expected_doc_freqs, mode
+        assert decoded == expected_index, mode
+
+
+def test_tfidf_scores_stay_non_negative_after_update(db, monkeypatch):
+    monkeypatch.setattr(settings, "delta_merge_ratio", 10.0)
+    documents, index = DocumentService(db), IndexService(db)
+    documents.create_document("http://site/a", "Apples", "apple orchards grow apple trees")
+    documents.create_document("http://site/b", "Pies", "apple pie with cinnamon")
+    assert index.rebuild_index()["status"] == "success"
+
+    # The update keeps the term: its old postings stay in the base until a merge
+    documents.create_document("http://site/a", "Apples", "apple harvest in the autumn")
+    assert index.publish_changes() is not None
+    reader = get_current_segment(settings.index_dir)
+    assert isinstance(reader, SegmentSet) and len(reader.deleted) == 1
+    assert reader.lookup("appl").document_frequency <= reader.doc_count
+
+    results = index.search("apple", ranking="tfidf")
+    assert sorted(result["url"] for result in results) == ["http://site/a", "http://site/b"]
+    assert all(result["score"] >= 0 for result in results)
@@ -0,0 +1,33 @@
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from app.metrics import SearchTimer, mark_stage, render_metrics
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_search_timer_records_stages_and_statements():
+    engine = create_engine("sqlite://")
+    searches = _sample("search_seconds_count", backend="test")
+    statements = _sample("search_db_statements_sum", backend="test")
+    fetches = _sample("search_stage_seconds_count", backend="test", stage="fetch")
+
+    with SearchTimer("test") as timer:
+        mark_stage("parse")
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        mark_stage("fetch")
+        mark_stage("fetch")
+    # Outside a timer neither marks nor statements are recorded
+    mark_stage("fetch")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 3"))
+
+    assert set(timer.stages) == {"parse", "fetch"}
+    assert timer.statements == 2
+    assert _sample("search_seconds_count", backend="test") == searches + 1
+    assert _sample("search_db_statements_sum", backend="test") == statements + 2
+    assert _sample("search_stage_seconds_count", backend="test", stage="fetch") == fetches + 1
+    assert b'search_seconds_bucket{backend="test"' in render_metrics()[0]
@@ -0,0 +1,20 @@
+from app.search.positional import PositionalClause, near_match, phrase_match
+
+
+def test_phrase_match():
+    assert phrase_match([[0, 7], [1, 4], [2]])
+    assert not phrase_match([[0, 7], [4], [2]])
+    assert not phrase_match([[3], []])
+
+
+def test_near_match_either_order():
+    assert near_match([10], [7], 3)
+    assert near_match([2, 30], [12, 32], 2)
+    assert not near_match([2, 30], [12, 40], 3)
+
+
+
+def test_clause_matches():
+    assert PositionalClause(("quick", "fox"), ordered=True).matches([[4], [5]])
+    assert not PositionalClause(("quick", "fox"), ordered=True).matches([[5], [4]])
+    assert PositionalClause(("quick", "fox"), ordered=False, distance=1).matches([[5], [4]])
@@ -0,0 +1,54 @@
+import pytest
+from app.index.postings import (
+    BLOCK_SIZE, PositionsView, decode_positions, decode_postings, decode_spans, decode_varint,
+    encode_positions, encode_postings, encode_spans, encode_varint
+)
+
+
+def test_varint_round_trip():
+    for value in [0, 1, 127, 128, 300, 2 ** 32 + 5]:
+        encoded = encode_varint(value)
+        assert decode_varint(encoded) == (value, len(encoded))
+
+
+def test_postings_round_trip_across_blocks():
+    ordinals = [3, 4, 10, 70000, 70001] + list(range(80000, 80000 + 3 * BLOCK_SIZE, 7))
+    freqs = [(i % 300) + 1 for i in range(len(ordinals))]
+    doc_ordinals, term_freqs = decode_postings(encode_postings(ordinals, freqs))
+    assert list(doc_ordinals) == ordinals
+    assert list(term_freqs) == freqs
+
+
+def test_empty_postings():
+    doc_ordinals, term_freqs = decode_postings(encode_postings([], []))
+    assert len(doc_ordinals) == 0
+    assert len(term_freqs) == 0
+
+
+def test_dense_postings_use_one_byte_per_value():
+    ordinals = list(range(1, 1001))
+    encoded = encode_postings(ordinals, [1] * len(ordinals))
+    assert len(encoded) < 2 * len(ordinals) + len(ordinals) // BLOCK_SIZE + 4
+
+
+def test_rejects_unsorted_ordinals():
+    with pytest.raises(ValueError):
+        encode_postings([5, 5], [1, 1])
+    with pytest.raises(ValueError):
+        encode_postings([5, 2], [1, 1])
+
+
+def test_positions_view_reads_individual_postings():
+    position_lists = [[0, 5, 9], [70000], [], [2, 3]]
+    view = PositionsView([3, 1, 0, 2], encode_positions(position_lists))
+    assert [list(view.positions(i)) for i in range(4)] == position_lists
+
+
+def test_document_term_positions_and_spans_round_trip():
+    positions = [3, 17, 70000]
+    spans = [(10, 15), (80, 85), (400000, 400012)]
+    assert list(decode_positions(encode_positions((positions,)))) == positions
+    assert decode_spans(encode_spans(spans)) == spans
+    assert decode_spans(encode_spans([])) == []
+    # Small gaps and lengths take one byte each
+    assert len(encode_spans([(i * 6, i * 6 + 5) for i in range(100)])) == 1 + 200
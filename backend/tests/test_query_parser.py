@@ -0,0 +1,35 @@
+from app.search.positional import PositionalClause
+from app.search.query_parser import And, Not, Or, Term, parse_query, positive_terms
+
+
+def test_default_operation_joins_adjacent_operands():
+    assert parse_query("quick fox") == And((Term("fox"), Term("quick")))
+    assert parse_query("quick fox", "OR") == Or((Term("fox"), Term("quick")))
+    assert parse_query("quick fox", "NOT") == Not(Or((Term("fox"), Term("quick"))))
+
+
+def test_precedence_parentheses_and_not():
+    assert parse_query("quick OR fox AND dog") == Or((And((Term("dog"), Term("fox"))), Term("quick")))
+    assert parse_query("(quick OR fox) dog") == And((Or((Term("fox"), Term("quick"))), Term("dog")))
+    assert parse_query("fox NOT dog", "OR") == And((Not(Term("dog")), Term("fox")))
+    assert parse_query("fox dog NOT cat", "OR") == And((Not(Term("cat")), Or((Term("dog"), Term("fox")))))
+    assert parse_query("cat OR NOT fish") == Or((Not(Term("fish")), Term("cat")))
+
+
+def test_phrases_near_and_fields():
+    assert parse_query('"quick fox" body:(dog OR cat)') == And((
+        Or((Term("cat", "body"), Term("dog", "body"))),
+        PositionalClause(("quick", "fox"), ordered=True),
+    ))
+    assert parse_query('title:fox url:"quick fox" dog') == And((
+        PositionalClause(("quick", "fox"), ordered=True, field="url"),
+        Term("dog"),
+        Term("fox", "title"),
+    ))
+    assert parse_query("dog NEAR/3 cat") == PositionalClause(("dog", "cat"), ordered=False, distance=3)
+
+
+def test_malformed_queries_degrade():
+    assert parse_query("AND ( fox )) OR") == Term("fox")
+    assert parse_query('NOT "the"') is None
+    assert positive_terms(parse_query("fox NOT dog")) == ["fox"]
@@ -0,0 +1,109 @@
+import random
+from app.search.positional import PositionalClause
+from app.search.query_parser import And, Not, Or, Term
+from app.search.query_plan import PlanSource, compile_plan, evaluate_postings, top_k
+from app.search.wand import TermCursor
+
+
+class _Source(PlanSource):
+    def __init__(self, postings, doc_count):
+        self.postings = postings
+        self.doc_count = doc_count
+
+    def term_cursor(self, term, field):
+        p = self.postings.get(term)
+        if not p:
+            return None
+        ordinals = sorted(p)
+        return TermCursor(ordinals, [p[o] for o in ordinals], 1.0, max(p.values()))
+
+    def positions(self, term, field, cursor):
+        return lambda cursor: self.doc_positions[cursor.doc][term]
+
+    def all_docs(self):
+        return range(1, self.doc_count + 1)
+
+
+def _random_tree(rng, terms, depth=0):
+    if depth >= 2 or rng.random() < 0.3:
+        return Term(rng.choice(terms))
+    children = tuple(_random_tree(rng, terms, depth + 1) for _ in range(rng.randint(2, 3)))
+    if rng.random() < 0.5:
+        return And(children + (Not(Term(rng.choice(terms))),))
+    return Or(children)
+
+
+def test_plan_matches_set_evaluation():
+    rng = random.Random(3)
+    terms = ["a", "b", "c", "d", "e"]
+    for _ in range(300):
+        postings = {
+            term: {o: float(rng.randint(1, 5)) for o in rng.sample(range(1, 201), rng.randint(1, 120))}
+            for term in terms
+        }
+        tree = _random_tree(rng, terms)
+        scores = evaluate_postings(tree, postings, lambda: range(1, 201))
+        expected = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:10]
+        assert top_k(compile_plan(tree, _Source(postings, 200)), 10) == expected
+
+
+def test_not_only_query_stops_after_k():
+    postings = {"a": {o: 1.0 for o in range(1, 100, 2)}}
+    assert top_k(compile_plan(Not(Term("a")), _Source(postings, 100)), 3) == [(2, 0.0), (4, 0.0), (6, 0.0)]
+
+
+def test_evaluate_postings_excludes_from_the_positive_clause():
+    postings = {"a": {"x": 1.0, "y": 0.5, "z": 0.25}, "b": {"y": 1.0, "z": 2.0}, "c": {"z": 1.0}}
+    assert evaluate_postings(And((Term("a"), Term("b"))), postings, None) == {"y": 1.5, "z": 2.25}
+    assert evaluate_postings(And((Not(Term("c")), Term("a"))), postings, None) == {"x": 1.0, "y": 0.5}
+    assert evaluate_postings(Not(Term("a")), postings, lambda: "xyzw") == {"w": 0.0}
+
+
+def test_phrases_are_checked_best_candidates_first():
+    rng = random.Random(11)
+    for _ in range(100):
+        doc_positions = {o: {} for o in range(1, 101)}
+        for o in doc_positions:
+            for position, term in enumerate(rng.choices("abc", k=rng.randint(0, 8))):
+                doc_positions[o].setdefault(term, []).append(position)
+        postings = {
+            term: {o: float(len(p[term])) for o, p in doc_positions.items() if term in p} for term in "abc"
+        }
+        source = _Source(postings, 100)
+        source.doc_positions = doc_positions
+        phrase = PositionalClause(("a", "b"), ordered=True)
+        tree = Or((phrase, And((Term("c"), Not(PositionalClause(("b", "c"), ordered=False, distance=2))))))
+
+        def matches(o, clause):
+            p = doc_positions[o]
+            return all(t in p for t in clause.terms) and clause.matches([p[t] for t in clause.terms])
+
+        scores = {}
+        for o, p in doc_positions.items():
+            if matches(o, phrase):
+                scores[o] = postings["a"][o] + postings["b"][o]
+            if "c" in p and not matches(o, tree.children[1].children[1].child):
+                scores[o] = scores.get(o, 0.0) + postings["c"][o]
+        expected = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:5]
+        assert top_k(compile_plan(tree, source), 5) == expected
+
+
+def test_unqualified_terms_sum_their_field_scores():
+    fields = {
+        "body": {"a": {1: 1.0, 2: 1.0, 3: 1.0}, "b": {1: 1.0, 3: 2.0}},
+        "title": {"a": {3: 4.0, 4: 4.0}, "b": {2: 3.0, 4: 1.0}},
+    }
+
+    class FieldSource(_Source):
+        fields = ("body", "title")
+
+        def term_cursor(self, term, field):
+            self.postings = fields[field]
+            return super().term_cursor(term, field)
+
+    source = FieldSource({}, 4)
+    assert top_k(compile_plan(Term("a"), source), 2) == [(3, 5.0), (4, 4.0)]
+    assert top_k(compile_plan(And((Term("a"), Term("b"))), source), 10) == [(3, 7.0), (4, 5.0), (2, 4.0), (1, 2.0)]
+    assert top_k(compile_plan(Or((Term("a", "title"), Term("b"))), source), 10) == [
+        (3, 6.0), (4, 5.0), (2, 3.0), (1, 1.0)
+    ]
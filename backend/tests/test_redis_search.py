@@ -0,0 +1,18 @@
+import pytest
+from app.search.redis_search import RedisIndex, top_scores
+
+
+def test_top_scores_breaks_ties_like_zrevrange():
+    scores = {"a": 1.0, "b": 2.0, "c": 1.0, "d": 0.5}
+    assert top_scores(scores, 3) == [("b", 2.0), ("c", 1.0), ("a", 1.0)]
+
+
+def test_single_term_phrase_reads_postings_without_scratch_keys():
+    fakeredis = pytest.importorskip("fakeredis")
+    index = RedisIndex(fakeredis.FakeRedis(decode_responses=True), set_ops=True)
+    index.load_postings([("python", {"a": 1.0, "b": 2.0})])
+    index.load_documents([{"id": "a", "title": "A"}, {"id": "b", "title": "B"}])
+
+    assert [result["id"] for result in index.search('"python python"')] == ["b", "a"]
+    assert [result["id"] for result in index.search("python python")] == ["b", "a"]
+    assert not index.client.keys("search:*")
@@ -0,0 +1,28 @@
+from app.index.generation import bump_generation, current_generation
+from app.search.query_parser import parse_query
+from app.search.result_cache import ResultCache, cache_key
+
+
+def test_result_cache_is_keyed_by_generation_and_evicts_lru():
+    cache = ResultCache(max_entries=2)
+    fox = cache_key(parse_query("fox quick fox"), 10, "tfidf", True)
+    assert fox == cache_key(parse_query("quick AND fox"), 10, "tfidf", True)
+    assert fox != cache_key(parse_query("quick OR fox"), 10, "tfidf", True)
+
+    cache.put(fox, 1, [{"id": "a"}])
+    cache.get(fox, 1)[0]["id"] = "changed"
+    assert cache.get(fox, 1) == [{"id": "a"}]
+    assert cache.get(fox, 2) is None
+
+    cache.put("dog", 1, [])
+    cache.put("cat", 1, [])
+    assert cache.get(fox, 1) is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_bump_generation(tmp_path):
+    index_dir = str(tmp_path)
+    assert current_generation(index_dir) == 0
+    assert bump_generation(index_dir) == 1
+    assert bump_generation(index_dir) == 2
+    assert current_generation(index_dir) == 2
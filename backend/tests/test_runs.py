@@ -0,0 +1,37 @@
+import pytest
+from app.index.postings import TermInfo, decode_postings, encode_postings
+from app.index.runs import merge_runs, read_run, write_run
+
+
+def _info(postings):
+    ordinals = sorted(postings)
+    freqs = [postings[o] for o in ordinals]
+    return TermInfo(len(ordinals), max(freqs), encode_postings(ordinals, freqs))
+
+
+def test_merge_runs_concatenates_shards_in_order(tmp_path):
+    shards = [
+        {"apple": {1: 2, 3: 1}, "zebra": {2: 1}},
+        {"apple": {5: 4}, "café": {6: 1}},
+        {"banana": {9: 1}, "zebra": {8: 3}},
+    ]
+    paths = []
+    for i, shard in enumerate(shards):
+        path = str(tmp_path / f"run-{i}")
+        write_run(path, [(term, _info(postings)) for term, postings in sorted(shard.items())])
+        paths.append(path)
+
+    assert [term for term, _ in read_run(paths[1])] == ["apple", "café"]
+
+    merged = {term: info for term, info in merge_runs(paths)}
+    assert list(merged) == ["apple", "banana", "café", "zebra"]
+    ordinals, freqs = decode_postings(merged["apple"].postings)
+    assert (list(ordinals), list(freqs)) == ([1, 3, 5], [2, 1, 4])
+    assert merged["apple"].document_frequency == 3
+    assert merged["apple"].max_term_frequency == 4
+    assert merged["zebra"].max_term_frequency == 3
+
+
+def test_write_run_rejects_unsorted_terms(tmp_path):
+    with pytest.raises(ValueError):
+        write_run(str(tmp_path / "run"), [("b", _info({1: 1})), ("a", _info({2: 1}))])
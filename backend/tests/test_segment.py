@@ -0,0 +1,135 @@
+import os
+from app.index.fields import field_key
+from app.index.postings import PositionsView, TermInfo, encode_positions, encode_postings, decode_postings
+from app.index.segment import (
+    CURRENT_FILE, SegmentSet, delete_from_segments, get_current_segment, write_segment
+)
+
+
+def _publish(index_dir, terms, documents):
+    return write_segment(
+        str(index_dir),
+        [(term, TermInfo(len(postings), 1, encode_postings(list(postings), [1] * len(postings)),
+                         bytes(range(1, len(postings) + 1)), len(postings)))
+         for term, postings in terms.items()],
+        [(ordinal, {"id": doc_id}) for ordinal, doc_id in documents],
+    )
+
+
+def test_segment_lookup_and_doc_store(tmp_path):
+    _publish(tmp_path, {"zebra": [2], "apple": [1, 3], "café": [3]},
+             [(1, "a"), (2, "b"), (3, "c")])
+    segment = get_current_segment(str(tmp_path))
+
+    assert segment.doc_count == 3
+    term_info = segment.lookup("apple")
+    assert term_info.document_frequency == 2
+    assert term_info.max_term_frequency == 1
+    assert list(decode_postings(term_info.postings)[0]) == [1, 3]
+    assert bytes(term_info.impacts) == b"\x01\x02"
+    assert term_info.max_impact == 2
+    assert segment.lookup("café").document_frequency == 1
+    assert segment.lookup("banana") is None
+    assert segment.get_documents([3, 1, 7]) == {1: {"id": "a"}, 3: {"id": "c"}}
+
+
+def test_publish_swaps_current_segment(tmp_path):
+    first = _publish(tmp_path, {"apple": [1]}, [(1, "a")])
+    old_reader = get_current_segment(str(tmp_path))
+    second = _publish(tmp_path, {"banana": [2]}, [(2, "b")])
+    third = _publish(tmp_path, {"cherry": [3]}, [(3, "c")])
+
+    with open(os.path.join(tmp_path, CURRENT_FILE)) as f:
+        assert f.read() == third
+    reader = get_current_segment(str(tmp_path))
+    assert reader.generation == old_reader.generation + 2
+    assert reader.lookup("cherry") is not None
+    # The segment an open reader maps stays readable after being replaced
+    assert old_reader.lookup("apple") is not None
+    assert not os.path.exists(os.path.join(tmp_path, first))
+    assert os.path.exists(os.path.join(tmp_path, second))
+
+
+def test_no_segment_published(tmp_path):
+    assert get_current_segment(str(tmp_path)) is None
+
+
+def test_segment_suggest(tmp_path):
+    _publish(tmp_path, {"apple": [1, 2, 3], "applet": [1], "apply": [1, 2], "banana": [1, 2, 3, 4]},
+             [(1, "a"), (2, "b"), (3, "c"), (4, "d")])
+    segment = get_current_segment(str(tmp_path))
+
+    assert segment.suggest("app", 2) == [("apple", 3), ("apply", 2)]
+    assert segment.suggest("a", 5) == [("apple", 3), ("apply", 2), ("applet", 1)]
+    assert segment.suggest("", 1) == [("banana", 4)]
+    assert segment.suggest("c", 5) == []
+
+
+def test_field_terms_are_looked_up_per_field_and_never_suggested(tmp_path):
+    _publish(tmp_path, {"apple": [1, 2], field_key("title", "apple"): [2], field_key("url", "apricot"): [1, 2]},
+             [(1, "a"), (2, "b")])
+    segment = get_current_segment(str(tmp_path))
+
+    assert segment.lookup("apple").document_frequency == 2
+    assert segment.lookup("apple", "title").document_frequency == 1
+    assert segment.lookup("apricot") is None and segment.lookup("apricot", "url") is not None
+    assert segment.suggest("ap", 5) == [("apple", 2)]
+
+
+def test_segment_surface_forms(tmp_path):
+    write_segment(
+        str(tmp_path),
+        [(term, TermInfo(1, 1, encode_postings([1], [1]), b"\x01", 1, surface=surface))
+         for term, surface in (("apple", "apple"), ("languag", "language"), ("run", ""))],
+        [(1, {"id": "a"})],
+    )
+    segment = get_current_segment(str(tmp_path))
+
+    assert segment.surface("languag") == "language"
+    assert segment.surface("apple") == "apple"
+    assert segment.surface("run") == "run"
+    assert segment.surface("missing") == "missing"
+
+
+def _positional(postings):
+    """TermInfo of {ordinal: positions}"""
+    ordinals = sorted(postings)
+    return TermInfo(len(ordinals), 2, encode_postings(ordinals, [len(postings[o]) for o in ordinals]),
+                    bytes([1] * len(ordinals)), 1, encode_positions([postings[o] for o in ordinals]))
+
+
+def test_delta_segments_and_deletions(tmp_path):
+    write_segment(str(tmp_path), [("apple", _positional({1: [0], 2: [3, 300]}))],
+                  [(1, {"id": "a"}), (2, {"id": "b"})])
+    delete_from_segments(str(tmp_path), [2])
+    write_segment(str(tmp_path), [("apple", _positional({3: [1, 2]})), ("banana", _positional({3: [0]}))],
+                  [(3, {"id": "b"})], delta=True)
+    reader = get_current_segment(str(tmp_path))
+
+    assert isinstance(reader, SegmentSet) and reader.deleted == {2}
+    assert reader.doc_count == 3
+    apple = reader.lookup("apple")
+    ordinals, term_freqs = decode_postings(apple.postings)
+    assert list(ordinals) == [1, 2, 3] and apple.document_frequency == 3
+    assert bytes(apple.impacts) == b"\x01\x01\x01"
+    view = PositionsView(term_freqs, apple.positions)
+    assert [list(view.positions(i)) for i in range(3)] == [[0], [3, 300], [1, 2]]
+    assert reader.lookup("banana").document_frequency == 1
+    assert reader.get_documents([1, 2, 3]) == {1: {"id": "a"}, 3: {"id": "b"}}
+    assert list(reader.doc_ordinals()) == [1, 3]
+    assert reader.suggest("", 5) == [("apple", 3), ("banana", 1)]
+
+
+def test_new_base_keeps_only_its_own_deletions(tmp_path):
+    _publish(tmp_path, {"apple": [1, 2]}, [(1, "a"), (2, "b")])
+    delete_from_segments(str(tmp_path), [1, 2])
+    _publish(tmp_path, {"apple": [2, 3]}, [(2, "b"), (3, "c")])
+
+    reader = get_current_segment(str(tmp_path))
+    assert reader.deleted == {2}
+    assert reader.get_documents([2, 3]) == {3: {"id": "c"}}
+    _publish(tmp_path, {"apple": [3]}, [(3, "c")])
+    reader = get_current_segment(str(tmp_path))
+    assert not isinstance(reader, SegmentSet) and reader.doc_count == 1
+    with open(os.path.join(tmp_path, CURRENT_FILE)) as f:
+        assert len(f.read().split()) == 1
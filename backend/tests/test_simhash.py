@@ -0,0 +1,42 @@
+import random
+from app.index.simhash import (
+    MAX_DISTANCE, BandIndex, bands, from_signed, hamming_distance, nearest, simhash, to_signed
+)
+
+
+def _text(rng, length):
+    return [f"w{rng.randrange(5000)}" for _ in range(length)]
+
+
+def test_simhash_separates_near_duplicates_from_other_pages():
+    rng = random.Random(7)
+    page = _text(rng, 500)
+    edited = list(page)
+    edited[100] = "changed"
+    other = _text(rng, 500)
+
+    assert simhash([]) is None
+    assert simhash(page) == simhash(list(page))
+    assert hamming_distance(simhash(page), simhash(edited)) <= MAX_DISTANCE
+    assert hamming_distance(simhash(page), simhash(other)) > MAX_DISTANCE
+
+    for fingerprint in (simhash(page), 0, (1 << 64) - 1):
+        assert -(1 << 63) <= to_signed(fingerprint) < (1 << 63)
+        assert from_signed(to_signed(fingerprint)) == fingerprint
+
+
+def test_band_index_finds_every_fingerprint_within_max_distance():
+    rng = random.Random(3)
+    index = BandIndex()
+    stored = rng.getrandbits(64)
+    index.add("doc", stored)
+
+    for _ in range(200):
+        near = stored
+        for bit in rng.sample(range(64), MAX_DISTANCE):
+            near ^= 1 << bit
+        assert nearest(near, index.candidates(near)) == ("doc", MAX_DISTANCE)
+
+    far = stored ^ 0xFFFF  # one whole band differs
+    assert nearest(far, index.candidates(far)) is None
+    assert len(bands(stored)) == MAX_DISTANCE + 1
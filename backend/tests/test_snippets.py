@@ -0,0 +1,37 @@
+from app.search.snippets import Match, densest_window, render_snippet, snippet_range
+from app.utilts.tokenizer import tokenize_with_offsets
+
+
+def _matches(text, terms):
+    return [
+        Match(position, token, start, end)
+        for position, (token, start, end) in enumerate(tokenize_with_offsets(text))
+        if token in terms
+    ]
+
+
+def test_densest_window_prefers_distinct_terms():
+    matches = [Match(0, "a", 0, 1), Match(1, "a", 2, 3), Match(50, "a", 0, 0), Match(52, "b", 0, 0)]
+    assert densest_window(matches, window=10) == (2, 4)
+    assert densest_window(matches[:2], window=10) == (0, 2)
+
+
+def test_render_snippet_highlights_query_terms():
+    text = " ".join(["filler"] * 100) + " The quick brown fox, jumps. " + " ".join(["filler"] * 100)
+    matches = _matches(text, {"quick", "fox"})
+    first, last = densest_window(matches)
+    window = matches[first:last]
+    start, end = snippet_range(window, max_chars=60)
+    snippet, highlights = render_snippet(text[start:end], start, window, end >= len(text))
+
+    assert snippet.startswith("...filler") and snippet.endswith("filler...")
+    assert [snippet[s:e] for s, e in highlights] == ["quick", "fox"]
+
+
+def test_render_snippet_whole_document():
+    text = "Foxes? No: the fox, quick!"
+    window = _matches(text, {"fox"})
+    snippet, highlights = render_snippet(text, 0, window, True)
+    assert snippet == text
+    # Both occurrences stem to "fox"
+    assert [snippet[s:e] for s, e in highlights] == ["Foxes", "fox"]
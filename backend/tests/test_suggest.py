@@ -0,0 +1,34 @@
+import random
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, SearchIndex
+from app.search.suggest import build_rank_tree, top_k_range
+from app.services.index_service import _suggestions_query
+
+
+def test_top_k_range_matches_sorting():
+    rng = random.Random(5)
+    for n in (1, 2, 7, 64, 101):
+        doc_freqs = [rng.randint(1, 20) for _ in range(n)]
+        tree = build_rank_tree(doc_freqs)
+        for _ in range(50):
+            lo = rng.randrange(n)
+            hi = rng.randint(lo, n)
+            expected = sorted(range(lo, hi), key=lambda i: (-doc_freqs[i], i))[:5]
+            assert top_k_range(tree, doc_freqs, lo, hi, 5) == expected
+
+
+def test_database_suggestions_match_prefix_literally():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        SearchIndex(field="body", term=term, document_frequency=df)
+        for term, df in [("50%", 1), ("500", 4), ("a_b", 2), ("axb", 3), ("c\\d", 1), ("cd", 2)]
+    ])
+    db.commit()
+    assert list(db.scalars(_suggestions_query("50%", 5))) == ["50%"]
+    assert list(db.scalars(_suggestions_query("a_", 5))) == ["a_b"]
+    assert list(db.scalars(_suggestions_query("c\\", 5))) == ["c\\d"]
+    assert list(db.scalars(_suggestions_query("a", 5))) == ["axb", "a_b"]
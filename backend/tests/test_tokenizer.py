@@ -1,4 +1,4 @@
-from app.utilts.tokenizer import tokenize_text, tokenize_docs
+from app.utilts.tokenizer import Tokenizer, tokenize_text, tokenize_docs
 def test_tokenize_text():
     text = "Hello, world! This is a test sentence. Runinng should be run"
     expected = ["hello", "world", "test", "sentenc", "runinng", "run"]
@@ -12,6 +12,16 @@ def test_tokenize_docs():
     assert tokens[1]['id'] == 1
     assert tokens[1]['url'] == 'https://web-scraping.dev/blocked'
     assert tokens[1]['title'] == 'web-scraping.dev - You\'ve been blocked'
-    assert tokens[1]['text'] == ["webscrapingdev","","youv","block","webscrapingdev","youv","block","","weve","detect","unusu","connect","ip","address","10011236","refer","id","8l0ck1ng15l4m3","unblock","block","persist","continu","brows","webscrapingdev","","enabl","persist","block","persist","flag","mock","page","your","actual","block","scrapfli","academi","v130","made","scrapfli"
+    assert tokens[1]['text'] == ["webscrapingdev","youv","block","webscrapingdev","youv","block","weve","detect","unusu","connect","ip","address","10011236","refer","id","8l0ck1ng15l4m3","unblock","block","persist","continu","brows","webscrapingdev","enabl","persist","block","persist","flag","mock","page","your","actual","block","scrapfli","academi","v130","made","scrapfli"
   ]
-    
\ No newline at end of file
+    
+
+def test_tokenize_splits_on_any_whitespace():
+    assert tokenize_text("first line\nsecond\tline") == ["first", "line", "second", "line"]
+
+
+def test_tokenize_many_matches_tokenize():
+    tokenizer = Tokenizer()
+    texts = ["Running tests", "", "Punctuation, everywhere!"]
+    assert tokenizer.tokenize_many(texts) == [tokenizer.tokenize(text) for text in texts]
+    assert [token for token, _, _ in tokenizer.tokenize_with_offsets(texts[2])] == tokenizer.tokenize(texts[2])
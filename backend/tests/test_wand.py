@@ -0,0 +1,55 @@
+import random
+from app.search.wand import TermCursor, top_k_and, top_k_or
+
+
+def _cursors(postings, idfs):
+    return [
+        TermCursor(sorted(p), [p[o] for o in sorted(p)], idf, max(p.values()) * idf)
+        for p, idf in zip(postings, idfs)
+    ]
+
+
+def _brute_force(postings, idfs, k, require_all):
+    scores = {}
+    for p, idf in zip(postings, idfs):
+        for ordinal, tf in p.items():
+            scores.setdefault(ordinal, []).append(tf * idf)
+    ranked = [
+        (ordinal, sum(parts)) for ordinal, parts in scores.items()
+        if not require_all or len(parts) == len(postings)
+    ]
+    ranked.sort(key=lambda item: (-item[1], item[0]))
+    return ranked[:k]
+
+
+def test_top_k_matches_exhaustive_scoring():
+    rng = random.Random(7)
+    for _ in range(50):
+        postings = [
+            {o: rng.randint(1, 9) for o in rng.sample(range(1, 500), rng.randint(1, 300))}
+            for _ in range(rng.randint(1, 4))
+        ]
+        idfs = [rng.uniform(0.1, 3.0) for _ in postings]
+        k = rng.randint(1, 20)
+        for require_all, top_k in ((False, top_k_or), (True, top_k_and)):
+            expected = _brute_force(postings, idfs, k, require_all)
+            actual = top_k(_cursors(postings, idfs), k)
+            assert [o for o, _ in actual] == [o for o, _ in expected]
+            assert all(abs(a - e) < 1e-9 for (_, a), (_, e) in zip(actual, expected))
+
+
+def test_zero_weight_terms_still_match():
+    postings = [{1: 3, 2: 1}]
+    assert top_k_or(_cursors(postings, [0.0]), 10) == [(1, 0.0), (2, 0.0)]
+
+
+def test_and_with_disjoint_terms():
+    postings = [{1: 1, 3: 1}, {2: 1, 4: 1}]
+    assert top_k_and(_cursors(postings, [1.0, 1.0]), 10) == []
+
+
+
+def test_deleted_documents_never_enter_the_top_k():
+    postings = [{1: 5, 2: 1, 3: 4}, {1: 1, 3: 1}]
+    assert top_k_or(_cursors(postings, [1.0, 1.0]), 2, {1}) == [(3, 5.0), (2, 1.0)]
+    assert top_k_and(_cursors(postings, [1.0, 1.0]), 2, {3}) == [(1, 6.0)]